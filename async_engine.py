@@ -0,0 +1,359 @@
+# -*- coding: utf-8 -*-
+"""
+Режим asyncio (ENGINE=async): один event loop замість пулів потоків.
+
+- AsyncClient — ті самі методи, що й у tg_client.OutboundClient (send_message,
+  edit_message_text, answer_callback_query, call), але запити йдуть через
+  AsyncTeleBot (aiohttp): тисячі викликів у польоті без потоку на кожен
+- ліміти ті самі: глобальний bucket з пріоритетами, bucket на чат,
+  в одному чаті — строго по черзі, 429 -> retry_after
+- хендлери не переписуються: функції з @bot.message_handler / @bot.callback_query_handler
+  переносяться в AsyncTeleBot (install_handlers) і виконуються прямо в event loop —
+  вони не блокують, бо відповіді лише ставляться в AsyncClient
+- вебхук — aiohttp.web (make_app / run_webhook), polling — AsyncTeleBot.infinity_polling
+
+    ENGINE=async python bot.py
+    ENGINE=async python bot_ai_master_v1.py
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+
+import aiohttp
+from aiohttp import web
+from telebot import ExceptionHandler, asyncio_helper, types
+from telebot.async_telebot import AsyncTeleBot
+from telebot.asyncio_helper import ApiTelegramException, RequestTimeout
+
+from metrics import CONTENT_TYPE
+from tg_client import PRIORITY_USER, EditCache, TokenBucket, _ClientMethods
+
+logger = logging.getLogger(__name__)
+
+HANDLER_LISTS = ("message_handlers", "edited_message_handlers", "callback_query_handlers")
+
+
+class AsyncClient(_ClientMethods):
+    """call() викликається з event loop (з хендлера) і повертає asyncio.Task."""
+
+    def __init__(self, bot: AsyncTeleBot, global_rate=30.0, chat_rate=1.0, chat_burst=3,
+                 max_retries=3, chat_buckets=10000, edit_cache=10000, metrics=None):
+        self.bot = bot
+        self.metrics = metrics
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.chat_buckets = chat_buckets
+        self.edits = EditCache(edit_cache) if edit_cache else None
+
+        self._seq = itertools.count()
+        self._global = TokenBucket(global_rate, global_rate)
+        self._waiters = []        # (priority, seq, future) — чекають глобальний токен
+        self._pacer = None
+        self._chats = {}          # chat_id -> TokenBucket (найстаріші викидаються)
+        self._tails = {}          # chat_id -> остання Task чату
+        self._tasks = set()
+        self._pending = 0
+
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.throttled = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def call(self, method, args=(), kwargs=None, chat_id=None, priority=PRIORITY_USER) -> asyncio.Task:
+        """
+        Будь-який метод AsyncTeleBot: call("send_photo", (chat_id, photo), chat_id=chat_id).
+        chat_id=None -> без лімітів на чат і глобального bucket (напр. answer_callback_query).
+        """
+        previous = self._tails.get(chat_id) if chat_id is not None else None
+        task = asyncio.get_running_loop().create_task(
+            self._run(method, args, kwargs or {}, chat_id, priority, previous))
+        self._pending += 1
+        self._tasks.add(task)
+        task.add_done_callback(self._forget_task)
+        if chat_id is not None:
+            self._tails[chat_id] = task
+            task.add_done_callback(lambda t: self._tails.get(chat_id) is t and self._tails.pop(chat_id))
+        return task
+
+    def _forget_task(self, task):
+        self._tasks.discard(task)
+        self._pending -= 1
+        if not task.cancelled():
+            task.exception()  # помилку вже залоговано; інакше asyncio скаржиться "never retrieved"
+
+    def _done(self, result):
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(result)
+        return future
+
+    def __len__(self):
+        return self._pending
+
+    def stats(self) -> dict:
+        done = self.sent + self.failed
+        return {
+            "pending": self._pending,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "queue_wait_avg": self.wait_total / done if done else 0.0,
+            "queue_wait_max": self.wait_max,
+            "edits_skipped": self.edits.hits if self.edits is not None else 0,
+            "edit_cache_hit_rate": self.edits.hit_rate if self.edits is not None else 0.0,
+        }
+
+    # ---- ліміти ----
+    def _chat_bucket(self, chat_id):
+        bucket = self._chats.pop(chat_id, None)
+        if bucket is None:
+            bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            if len(self._chats) >= self.chat_buckets:
+                del self._chats[next(iter(self._chats))]
+        self._chats[chat_id] = bucket
+        return bucket
+
+    async def _global_slot(self, priority):
+        if not self._waiters and self._global.delay(time.monotonic()) == 0:
+            self._global.take()
+            return
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), waiter))
+        if self._pacer is None or self._pacer.done():
+            self._pacer = loop.create_task(self._pace())
+        await waiter
+
+    async def _pace(self):
+        # токени роздаються за пріоритетом: answer/відповіді в чат раніше за розсилки
+        while self._waiters:
+            wait = self._global.delay(time.monotonic())
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            _, _, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                self._global.take()
+                waiter.set_result(None)
+
+    # ---- виконання ----
+    async def _run(self, method, args, kwargs, chat_id, priority, previous):
+        enqueued = time.monotonic()
+        if previous is not None:
+            # порядок у чаті; результат попереднього запиту нас не стосується
+            await asyncio.wait((previous,))
+        attempts = 0
+        while True:
+            attempts += 1
+            if chat_id is not None:
+                bucket = self._chat_bucket(chat_id)
+                wait = bucket.delay(time.monotonic())
+                while wait > 0:
+                    await asyncio.sleep(wait)
+                    wait = bucket.delay(time.monotonic())
+                bucket.take()
+                await self._global_slot(priority)
+            if attempts == 1:
+                waited = time.monotonic() - enqueued
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+
+            started = time.perf_counter()
+            try:
+                result = await getattr(self.bot, method)(*args, **kwargs)
+            except Exception as e:
+                if self.metrics is not None:
+                    self.metrics.api_call(method, time.perf_counter() - started, e)
+                retry_in = self._retry_delay(attempts, e)
+                if retry_in is None:
+                    self.failed += 1
+                    logger.warning("telegram %s failed: %s", method, e)
+                    raise
+                self.retries += 1
+                if chat_id is not None:
+                    self._chat_bucket(chat_id).pause(time.monotonic() + retry_in)
+                await asyncio.sleep(retry_in)
+                continue
+            if self.metrics is not None:
+                self.metrics.api_call(method, time.perf_counter() - started)
+            self.sent += 1
+            return result
+
+    def _retry_delay(self, attempts, error):
+        if isinstance(error, ApiTelegramException):
+            if error.error_code != 429:
+                return None
+            self.throttled += 1
+            if attempts > self.max_retries:
+                return None
+            return float((error.result_json or {}).get("parameters", {}).get("retry_after", 1))
+        if isinstance(error, (RequestTimeout, aiohttp.ClientError)) and attempts <= self.max_retries:
+            return 0.5 * 2 ** (attempts - 1)
+        return None
+
+    async def aclose(self, timeout=10.0):
+        """Дочікується відправки всього, що вже в черзі, і закриває aiohttp-сесію."""
+        if self._tasks:
+            await asyncio.wait(set(self._tasks), timeout=timeout)
+        await self.bot.close_session()
+
+
+def async_client_from_env(token, parse_mode=None, metrics=None) -> AsyncClient:
+    """
+    Ті самі змінні, що й tg_client.client_from_env: TG_GLOBAL_RATE, TG_CHAT_RATE, TG_CHAT_BURST, TG_EDIT_CACHE;
+    TG_ASYNC_CONNECTIONS — скільки зʼєднань до API одночасно (замість TG_SEND_WORKERS);
+    TG_API_URL — інший сервер Bot API, як у tg_client.client_from_env.
+    """
+    api_url = os.getenv("TG_API_URL", "").strip()
+    if api_url:
+        asyncio_helper.API_URL = api_url
+    # пул aiohttp у telebot один на процес і налаштовується глобально (як apihelper.session)
+    asyncio_helper.REQUEST_LIMIT = int(os.getenv("TG_ASYNC_CONNECTIONS", "100"))
+    return AsyncClient(
+        AsyncTeleBot(token, parse_mode=parse_mode),
+        metrics=metrics,
+        global_rate=float(os.getenv("TG_GLOBAL_RATE", "30")),
+        chat_rate=float(os.getenv("TG_CHAT_RATE", "1")),
+        chat_burst=int(os.getenv("TG_CHAT_BURST", "3")),
+        edit_cache=int(os.getenv("TG_EDIT_CACHE", "10000")),
+    )
+
+
+# =========================
+# Хендлери: TeleBot -> AsyncTeleBot
+# =========================
+def _coroutine(fn):
+    async def handler(update):
+        return fn(update)
+    handler.__name__ = fn.__name__
+    return handler
+
+
+def install_handlers(source, target: AsyncTeleBot):
+    """Переносить хендлери з TeleBot у AsyncTeleBot: ті самі фільтри, функція — в обгортці-корутині."""
+    for name in HANDLER_LISTS:
+        handlers = getattr(target, name)
+        for handler in getattr(source, name):
+            handlers.append(dict(handler, function=_coroutine(handler["function"])))
+
+
+# =========================
+# Вебхук (aiohttp.web) і polling
+# =========================
+def make_app(module, path="/webhook") -> web.Application:
+    """
+    aiohttp-застосунок з тими самими маршрутами, що й Flask app у bot.py: /, /webhook, /metrics
+    (+ /funnel, якщо в модуля є FUNNEL — див. funnel.py).
+    module — імпортований модуль бота, запущений з ENGINE=async (module.api — AsyncClient).
+    """
+    client = module.api
+    abot = client.bot
+    install_handlers(module.bot, abot)
+    dedup = getattr(module, "DEDUP", None)
+    flood = getattr(module, "FLOOD", None)
+    recorder = getattr(module, "RECORDER", None)
+    metrics = getattr(module, "METRICS", None)
+    funnel = getattr(module, "FUNNEL", None)
+
+    async def handle(request):
+        body = await request.read()
+        if recorder is not None:
+            recorder.record(body)
+        try:
+            update = types.Update.de_json(body.decode("utf-8"))
+        except (ValueError, KeyError):
+            return 400
+        if update is None:
+            return 400
+        if dedup is not None and dedup.seen(update.update_id):
+            return 200
+        if flood is not None and not flood.allow(update):
+            return 200
+        # хендлери не чекають на мережу — апдейт обробляється тут же, відповіді йдуть у AsyncClient
+        await abot.process_new_updates([update])
+        return 200
+
+    async def webhook(request):
+        started = time.perf_counter()
+        status = await handle(request)
+        if metrics is not None:
+            metrics.webhook_latency.observe(time.perf_counter() - started, str(status))
+        return web.Response(text="OK" if status == 200 else "Bad Request", status=status)
+
+    async def health(request):
+        return web.Response(text="OK")
+
+    async def metrics_view(request):
+        return web.Response(body=metrics.registry.render().encode("utf-8"),
+                            headers={"Content-Type": CONTENT_TYPE})
+
+    async def funnel_view(request):
+        try:
+            content_type, body = funnel.http_view(request.query)
+        except ValueError:
+            return web.Response(text="Bad Request", status=400)
+        return web.Response(body=body.encode("utf-8"), headers={"Content-Type": content_type})
+
+    async def on_cleanup(app):
+        await client.aclose()
+
+    app = web.Application()
+    app.router.add_get("/", health)
+    app.router.add_post(path, webhook)
+    if metrics is not None:
+        app.router.add_get("/metrics", metrics_view)
+    if funnel is not None:
+        app.router.add_get("/funnel", funnel_view)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+def run_webhook(module, host="0.0.0.0", port=10000):
+    web.run_app(make_app(module), host=host, port=port, print=None)
+
+
+class _WebhookConflict(ExceptionHandler):
+    """getUpdates -> 409: у бота ще стоїть вебхук — знімаємо його лише тоді, а не на кожному старті."""
+
+    def __init__(self, abot, fallback=None):
+        self.abot = abot
+        self.fallback = fallback
+
+    async def handle(self, exception):
+        if isinstance(exception, ApiTelegramException) and exception.error_code == 409:
+            logger.info("webhook is set, removing it for polling")
+            await self.abot.delete_webhook()
+            return True
+        if self.fallback is None:
+            return False
+        handled = self.fallback.handle(exception)
+        return await handled if asyncio.iscoroutine(handled) else handled
+
+
+async def polling(module, timeout=60):
+    abot = module.api.bot
+    install_handlers(module.bot, abot)
+    flood = getattr(module, "FLOOD", None)
+    if flood is not None:
+        # infinity_polling сам викликає process_new_updates — фільтруємо на вході в нього
+        process = abot.process_new_updates
+
+        async def process_allowed(updates):
+            await process([update for update in updates if flood.allow(update)])
+        abot.process_new_updates = process_allowed
+    abot.exception_handler = _WebhookConflict(abot, abot.exception_handler)
+    try:
+        await abot.infinity_polling(timeout=timeout)
+    finally:
+        await module.api.aclose()
+
+
+def run_polling(module, **kwargs):
+    asyncio.run(polling(module, **kwargs))
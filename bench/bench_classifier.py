@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Класифікатор діагнозу: тисячі правил проти довгих описів.
+
+    python bench/bench_classifier.py [--rules 10,100,1000,5000] [--chars 4000]
+
+Порівнюється скомпільований автомат (diagnosis.RuleSet) з наївним
+перебором `stem in text` по кожному правилу.
+"""
+
+import argparse
+import random
+import time
+
+import common  # noqa: F401  (додає корінь репозиторію в sys.path)
+from diagnosis import RuleSet
+
+ALPHABET = "абвгдеєжзиіїйклмнопрстуфхцчшщьюя"
+
+
+def _word(rng, lo=4, hi=9):
+    return "".join(rng.choice(ALPHABET) for _ in range(rng.randint(lo, hi)))
+
+
+def make_rules(count, rng):
+    return {
+        "default": {"summary": "default"},
+        "rules": [
+            {"id": f"r{i}", "stems": [_word(rng) for _ in range(3)], "keywords": [_word(rng)],
+             "weight": rng.randint(1, 3), "summary": f"rule {i}"}
+            for i in range(count)
+        ],
+    }
+
+
+def make_text(chars, rng):
+    words = []
+    while sum(len(w) + 1 for w in words) < chars:
+        words.append(_word(rng, 2, 10))
+    return " ".join(words)
+
+
+def naive(data, text):
+    text = text.lower()
+    best, best_score = None, 0
+    for rule in data["rules"]:
+        score = sum(rule["weight"] for s in rule["stems"] + rule["keywords"] if s in text)
+        if score > best_score:
+            best, best_score = rule["id"], score
+    return best
+
+
+def _time(fn, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat * 1000
+
+
+def run(rule_counts, chars, repeat):
+    rng = random.Random(42)
+    text = make_text(chars, rng)
+    print(f"description: {len(text)} chars")
+    print(f"{'rules':>7} {'compile ms':>11} {'automaton ms':>13} {'naive ms':>9}")
+    for count in rule_counts:
+        data = make_rules(count, rng)
+        t0 = time.perf_counter()
+        rules = RuleSet(data)
+        compile_ms = (time.perf_counter() - t0) * 1000
+        fast = _time(lambda: rules.classify(text), repeat)
+        slow = _time(lambda: naive(data, text), repeat)
+        print(f"{count:>7} {compile_ms:>11.1f} {fast:>13.3f} {slow:>9.3f}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rules", default="10,100,1000,5000")
+    ap.add_argument("--chars", type=int, default=4000)
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+    run([int(x) for x in args.rules.split(",")], args.chars, args.repeat)
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+Мікробенчмарк dispatch: скільки коштує маршрутизація одного апдейта.
+
+    python bench/bench_dispatch.py [--n 20000] [--menu 1000]
+
+Виклики Telegram API підмінені на no-op, тож міряється лише CPU хендлерів.
+--menu додає N фіктивних пунктів меню, щоб показати, що час не росте.
+"""
+
+import argparse
+import time
+
+from common import callback_json, load_bot, message_json, to_update
+
+
+def _noop(*args, **kwargs):
+    return None
+
+
+def _silence(bot):
+    for name in ("send_message", "edit_message_text", "answer_callback_query", "reply_to"):
+        setattr(bot, name, _noop)
+
+
+def _bench(label, fn, items, n):
+    t0 = time.perf_counter()
+    for i in range(n):
+        fn(items[i % len(items)])
+    dt = time.perf_counter() - t0
+    print(f"  {label:<38} {dt / n * 1e6:8.2f} us/update")
+
+
+def _grow_menu(router, size):
+    for i in range(size):
+        router.callback(f"extra_{i}")(_noop)
+        router.text(starts=[f"#{i}#"], contains=[f"Пункт меню {i}"])(_noop)
+
+
+def run(n, menu):
+    deals = load_bot("bot")
+    master = load_bot("bot_ai_master_v1")
+    _silence(deals.bot)
+    _silence(master.bot)
+
+    deals_calls = [to_update(callback_json(7, d)).callback_query
+                   for d in ("how_it_works", "prices", "help", "task", "order", "back", "???")]
+    master_calls = [to_update(callback_json(8, d)).callback_query
+                    for d in ("diag_start", "pkg_PRO", "back", "how_it_works", "prices", "help", "???")]
+    master_texts = [to_update(message_json(9, t)).message
+                    for t in ("🧰 Почати діагностику", "💰 Вартість / пакети", "привіт", "🆘 Допомога")]
+
+    for size in (0, menu):
+        if size:
+            _grow_menu(deals.ROUTER, size)
+            _grow_menu(master.ROUTER, size)
+        print(f"menu +{size} items:")
+        _bench("bot.callbacks", deals.callbacks, deals_calls, n)
+        _bench("bot_ai_master_v1.on_cb", master.on_cb, master_calls, n)
+        _bench("bot_ai_master_v1.on_text", master.on_text, master_texts, n)
+        _bench("Router.resolve_callback (pkg_PRO)",
+               master.ROUTER.resolve_callback, ["pkg_PRO"], n)
+        _bench("Router.match_text (no match)",
+               master.ROUTER.match_text, ["просто довгий текст без тригерів " * 4], n)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=20000)
+    ap.add_argument("--menu", type=int, default=1000)
+    args = ap.parse_args()
+    run(args.n, args.menu)
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+ENGINE=sync проти ENGINE=async на однаковому синтетичному навантаженні (loadgen.py).
+
+    python bench/bench_engines.py [--bot bot] [--mode webhook] [--users 500] [--latency 0.05]
+
+Кожен рушій запускається в окремому процесі (модуль бота читає ENGINE під час імпорту).
+З затримкою API sync-режим упирається в TG_SEND_WORKERS потоків,
+async тримає всі запити в польоті в одному event loop.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+COLUMNS = ("engine", "steps", "errors", "elapsed_s", "updates_per_s", "p50_ms", "p95_ms", "p99_ms", "rss_growth_mb")
+
+
+def run_engine(engine, args) -> dict:
+    cmd = [
+        sys.executable, os.path.join(HERE, "loadgen.py"), "--json",
+        "--engine", engine, "--bot", args.bot, "--mode", args.mode,
+        "--users", str(args.users), "--journeys", str(args.journeys),
+        "--latency", str(args.latency),
+    ]
+    out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--bot", default="bot")
+    ap.add_argument("--mode", choices=["webhook", "polling", "direct"], default="webhook")
+    ap.add_argument("--users", type=int, default=500)
+    ap.add_argument("--journeys", type=int, default=1000)
+    ap.add_argument("--latency", type=float, default=0.05, help="затримка фейкового API, с")
+    args = ap.parse_args()
+
+    print(f"bot={args.bot} mode={args.mode} users={args.users} journeys={args.journeys} latency={args.latency}s")
+    print(" ".join(f"{c:>13}" for c in COLUMNS))
+    for engine in ("sync", "async"):
+        report = run_engine(engine, args)
+        print(" ".join(f"{report[c]:>13}" for c in COLUMNS))
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Флуд-ліміт (flood.py): скільки викликів Telegram API і часу зʼїдає спам з/без обмеження.
+
+    python bench/bench_flood.py [--users 50] [--spammers 5] [--spam 300]
+
+--users звичайних користувачів проходять сценарій (/start, кнопки, заявка),
+--spammers надсилають по --spam повідомлень і стільки ж натискань однієї кнопки.
+Усе йде через /webhook bot.py (Flask test client) до фейкового Bot API.
+Кожен режим — окремий процес: FLOOD_* читаються під час імпорту бота.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from common import FAKE_TOKEN, callback_json, load_bot, message_json
+
+MODES = {
+    "no limit": {"FLOOD_LIMITS": "", "FLOOD_REPEAT": "0"},
+    "flood.py": {"FLOOD_LIMITS": "message=12/10,edited_message=6/10,callback_query=20/10", "FLOOD_REPEAT": "1"},
+}
+
+
+def journey(uid):
+    return [message_json(uid, "/start"), callback_json(uid, "how_it_works"), callback_json(uid, "back"),
+            callback_json(uid, "order"), message_json(uid, f"Заявка від {uid}")]
+
+
+def run(users, spammers, spam) -> dict:
+    from fake_api import FakeBotAPI
+
+    fake = FakeBotAPI().start()
+    os.environ.update(TG_API_URL=fake.api_url, TG_GLOBAL_RATE="100000", TG_CHAT_RATE="100000",
+                      TG_CHAT_BURST="100000")
+    module = load_bot("bot")
+    client = module.app.test_client()
+
+    updates = []
+    for uid in range(1, users + 1):
+        updates.extend(journey(uid))
+    for uid in range(10**6, 10**6 + spammers):
+        for i in range(spam):
+            updates.append(message_json(uid, f"spam {i}"))
+            updates.append(callback_json(uid, "prices"))
+
+    started = time.perf_counter()
+    for update in updates:
+        client.post("/webhook", data=json.dumps(update), content_type="application/json")
+    while len(module.api):
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - started
+
+    dropped = sum(module.FLOOD.dropped.values()) if module.FLOOD is not None else 0
+    report = {
+        "updates": len(updates),
+        "dropped": dropped,
+        "api_calls": sum(fake.calls.values()),
+        "normal_user_replies": sum(fake.replies(uid) for uid in range(1, users + 1)),
+        "elapsed_s": round(elapsed, 2),
+    }
+    fake.stop()
+    return report
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=50)
+    ap.add_argument("--spammers", type=int, default=5)
+    ap.add_argument("--spam", type=int, default=300)
+    ap.add_argument("--mode", choices=list(MODES))
+    args = ap.parse_args()
+
+    if args.mode:
+        print(json.dumps(run(args.users, args.spammers, args.spam)))
+        sys.exit(0)
+
+    columns = ("updates", "dropped", "api_calls", "normal_user_replies", "elapsed_s")
+    print(f"users={args.users} spammers={args.spammers} spam={args.spam} (messages + taps each)")
+    print(f"{'mode':<10}" + "".join(f"{c:>21}" for c in columns))
+    for mode, env in MODES.items():
+        cmd = [sys.executable, __file__, "--mode", mode, "--users", str(args.users),
+               "--spammers", str(args.spammers), "--spam", str(args.spam)]
+        out = subprocess.run(cmd, check=True, capture_output=True, text=True,
+                             env=dict(os.environ, BOT_TOKEN=FAKE_TOKEN, **env)).stdout
+        report = json.loads(out.strip().splitlines()[-1])
+        print(f"{mode:<10}" + "".join(f"{report[c]:>21}" for c in columns))
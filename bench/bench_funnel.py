@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Воронка (funnel.py): ціна record() у хендлері, точність HyperLogLog проти точного set,
+час запиту /funnel під навантаженням і наскрізна перевірка на bot_ai_master_v1.
+
+    python bench/bench_funnel.py [--events 200000] [--threads 4]
+
+1) record(): нс на подію, поки N потоків пишуть, і скільки триває summary() паралельно
+2) точність: оцінка унікальних користувачів проти len(set) і памʼять скетча проти set
+3) bot_ai_master_v1 проти фейкового Bot API: користувачі доходять до різних кроків,
+   GET /funnel (serve_metrics) має показати стільки ж подій і ~стільки ж користувачів
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.request
+
+from common import callback_json, load_bot, message_json, to_update
+
+from funnel import Funnel, HyperLogLog
+
+STEPS = ("diag_start", "description", "package", "consent", "access", "working", "payment")
+
+
+def bench_record(events, threads):
+    funnel = Funnel(STEPS, bucket_seconds=1)
+    per_thread = events // threads
+    queries = []
+    stop = threading.Event()
+
+    def writer(seed):
+        rng = random.Random(seed)
+        for _ in range(per_thread):
+            funnel.record(STEPS[rng.randrange(len(STEPS))], rng.randrange(10**7))
+
+    def reader():
+        while not stop.is_set():
+            started = time.perf_counter()
+            funnel.summary(hours=1, series=True)
+            queries.append(time.perf_counter() - started)
+
+    writers = [threading.Thread(target=writer, args=(i,)) for i in range(threads)]
+    query_thread = threading.Thread(target=reader)
+    started = time.perf_counter()
+    query_thread.start()
+    for t in writers:
+        t.start()
+    for t in writers:
+        t.join()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    query_thread.join()
+    queries.sort()
+    return {
+        "events": per_thread * threads,
+        "record_ns_per_event": round(elapsed / (per_thread * threads) * 1e9),
+        "queries_during_run": len(queries),
+        "query_p50_ms": round(queries[len(queries) // 2] * 1000, 2) if queries else 0,
+        "query_max_ms": round(queries[-1] * 1000, 2) if queries else 0,
+    }
+
+
+def bench_accuracy():
+    rows = []
+    for users in (100, 1000, 10000, 100000, 1000000):
+        sketch, exact = HyperLogLog(11), set()
+        for uid in random.Random(users).sample(range(10**10), users):
+            sketch.add(uid)
+            exact.add(uid)
+        rows.append((users, sketch.count(), len(sketch.registers), sys.getsizeof(exact)))
+    return rows
+
+
+def check_bot(users):
+    from fake_api import FakeBotAPI
+
+    fake = FakeBotAPI().start()
+    os.environ.update(TG_API_URL=fake.api_url, TG_GLOBAL_RATE="100000", TG_CHAT_RATE="100000",
+                      TG_CHAT_BURST="100000")
+    module = load_bot("bot_ai_master_v1")
+    from metrics import serve_metrics
+    from update_queue import run_handlers_inline
+    run_handlers_inline(module.bot)
+
+    path = [callback_json, message_json, callback_json, callback_json, callback_json, callback_json]
+    values = ["diag_start", "Опис: не вмикається", "pkg_PRO", "consent_yes", "access_yes", "pay"]
+    expected = {step: 0 for step in STEPS}
+    reached = {1: ("diag_start",), 2: ("description",), 3: ("package",), 4: ("consent",),
+               5: ("access", "working"), 6: ("payment",)}
+    rng = random.Random(1)
+    for uid in range(1, users + 1):
+        depth = rng.randint(1, len(path))
+        for i in range(depth):
+            # кожен апдейт окремо: telebot обробляє повідомлення пачки раніше за callback
+            module.bot.process_new_updates([to_update(path[i](uid, values[i]))])
+            for step in reached[i + 1]:
+                expected[step] += 1
+    server = serve_metrics(module.METRICS.registry, 0, host="127.0.0.1",
+                           routes={"/funnel": module.FUNNEL.http_view})
+    url = f"http://127.0.0.1:{server.server_address[1]}/funnel?hours=1"
+    with urllib.request.urlopen(url) as response:
+        report = json.load(response)
+    server.shutdown()
+    while len(module.api):
+        time.sleep(0.01)
+    fake.stop()
+    for row in report["steps"]:
+        # кожен користувач проходить крок раз: подій рівно стільки, унікальних — з похибкою скетча
+        assert row["events"] == expected[row["step"]], (row, expected)
+        assert abs(row["users"] - expected[row["step"]]) <= max(3, expected[row["step"]] * 0.05), (row, expected)
+    return report["steps"]
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--events", type=int, default=200000)
+    ap.add_argument("--threads", type=int, default=4)
+    ap.add_argument("--users", type=int, default=300)
+    args = ap.parse_args()
+
+    for key, value in bench_record(args.events, args.threads).items():
+        print(f"{key:<24} {value}")
+
+    print(f"\n{'users':>10}{'estimate':>12}{'error':>9}{'sketch B':>10}{'set B':>12}")
+    for users, estimate, sketch_bytes, set_bytes in bench_accuracy():
+        print(f"{users:>10}{estimate:>12}{(estimate - users) / users * 100:>+8.2f}%{sketch_bytes:>10}{set_bytes:>12}")
+
+    print(f"\nbot_ai_master_v1, {args.users} users, GET /funnel?hours=1:")
+    for row in check_bot(args.users):
+        print(f"  {row['step']:<12} events={row['events']:<5} users~{row['users']:<5} "
+              f"conversion={row['conversion']:<7} from_previous={row['from_previous']}")
+    sys.exit(0)
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Памʼять: процес на кожного бота проти host.py з кількома ботами в одному процесі.
+
+    python bench/bench_host.py [--bots 4]
+
+Окремо: N процесів `import bot` (кожен зі своїм інтерпретатором, Flask, telebot).
+Хост: один процес, BotHost з N ботами (модулі по черзі bot / bot_ai_master_v1).
+Звіт — RSS після імпорту/запуску (без трафіку).
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+
+from common import FAKE_TOKEN, ROOT
+
+MODULES = ("bot", "bot_ai_master_v1")
+
+_RSS = """
+import os
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+"""
+
+SINGLE = _RSS + """
+import importlib, sys
+sys.path.insert(0, {root!r})
+os.environ["BOT_TOKEN"] = {token!r}
+importlib.import_module({module!r})
+print(rss_mb())
+"""
+
+HOSTED = _RSS + """
+import sys
+sys.path.insert(0, {root!r})
+{env}
+import host
+h = host.BotHost({bots!r})
+print(rss_mb())
+"""
+
+
+def measure(code) -> float:
+    out = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout
+    return float(out.strip().splitlines()[-1])
+
+
+def bots_for(n) -> dict:
+    return {f"bot{i}": MODULES[i % len(MODULES)] for i in range(n)}
+
+
+def hosted(n) -> float:
+    bots = bots_for(n)
+    env = "\n".join(f"os.environ[{name.upper() + '_BOT_TOKEN'!r}] = {FAKE_TOKEN!r}" for name in bots)
+    return measure(HOSTED.format(root=ROOT, env=env, bots=bots))
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--bots", type=int, default=4)
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args()
+
+    separate = [measure(SINGLE.format(root=ROOT, token=FAKE_TOKEN, module=module))
+                for module in bots_for(args.bots).values()]
+    host_one = hosted(1)
+    host_all = hosted(args.bots)
+    report = {
+        "bots": args.bots,
+        "separate_total_mb": round(sum(separate), 1),
+        "separate_per_bot_mb": round(sum(separate) / len(separate), 1),
+        "host_total_mb": round(host_all, 1),
+        "host_per_extra_bot_mb": round((host_all - host_one) / max(1, args.bots - 1), 1),
+    }
+    if args.json:
+        print(json.dumps(report))
+    else:
+        for key, value in report.items():
+            print(f"{key:<24} {value}")
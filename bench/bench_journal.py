@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Журнал заявок: group commit проти fsync на кожен запис.
+
+    python bench/bench_journal.py [--threads 8] [--records 2000] [--interval 0.001]
+
+--threads потоків (як воркери UpdateQueue) пишуть по --records/threads заявок
+з паузою --interval між ними.
+fsync-per-record — той самий формат, але кожен запис окремим write + fsync під замком.
+append_us — скільки чекає хендлер (для журналу — лише постановка в чергу),
+durable_ms — від append() до fsync.
+"""
+
+import argparse
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import time
+import zlib
+
+import common  # noqa: F401  (додає корінь репозиторію в sys.path)
+from journal import Journal, scan
+
+TEXT = "Ноутбук гріється і вимикається, вентилятор шумить, потрібна діагностика"
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def run_threads(threads, per_thread, write, interval) -> float:
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(n):
+        barrier.wait()
+        for i in range(per_thread):
+            write(n * per_thread + i)
+            time.sleep(interval)
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for t in pool:
+        t.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for t in pool:
+        t.join()
+    return time.perf_counter() - started
+
+
+def bench_journal(directory, threads, per_thread, interval):
+    journal = Journal(directory)
+    append_us, durable_ms, futures = [], [], []
+    lock = threading.Lock()
+
+    def write(i):
+        started = time.perf_counter()
+        future = journal.append("order", i % 500, chat_id=i % 500, text=TEXT)
+        queued = time.perf_counter()
+        future.add_done_callback(lambda _: durable_ms.append((time.perf_counter() - started) * 1000))
+        with lock:
+            append_us.append((queued - started) * 1e6)
+            futures.append(future)
+
+    elapsed = run_threads(threads, per_thread, write, interval)
+    for future in futures:
+        future.result()
+    elapsed = max(elapsed, max(durable_ms) / 1000)
+    commits = journal.commits
+    journal.close()
+    return elapsed, commits, append_us, durable_ms
+
+
+def bench_fsync_each(directory, threads, per_thread, interval):
+    header = struct.Struct("!II")
+    lock = threading.Lock()
+    append_us = []
+    f = open(os.path.join(directory, "naive.log"), "ab", buffering=0)
+
+    def write(i):
+        started = time.perf_counter()
+        payload = f'{{"kind": "order", "user_id": {i % 500}, "text": "{TEXT}"}}'.encode("utf-8")
+        with lock:
+            f.write(header.pack(len(payload), zlib.crc32(payload)) + payload)
+            os.fsync(f.fileno())
+            append_us.append((time.perf_counter() - started) * 1e6)
+
+    elapsed = run_threads(threads, per_thread, write, interval)
+    f.close()
+    return elapsed, threads * per_thread, append_us, [us / 1000 for us in append_us]
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--records", type=int, default=2000)
+    ap.add_argument("--interval", type=float, default=0.001, help="пауза потоку між заявками, с")
+    args = ap.parse_args()
+    per_thread = args.records // args.threads
+    total = per_thread * args.threads
+
+    print(f"threads={args.threads} records={total} interval={args.interval}s")
+    print(f"{'mode':<16} {'records/s':>10} {'fsyncs':>7} {'append_p99_us':>14} {'durable_p50_ms':>15} {'durable_p99_ms':>15}")
+    for name, bench in (("fsync-per-record", bench_fsync_each), ("group-commit", bench_journal)):
+        directory = tempfile.mkdtemp(prefix="bench-journal-")
+        try:
+            elapsed, fsyncs, append_us, durable_ms = bench(directory, args.threads, per_thread, args.interval)
+            if name == "group-commit":
+                assert sum(1 for _ in scan(directory)) == total
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        print(f"{name:<16} {total / elapsed:>10.0f} {fsyncs:>7} {percentile(append_us, 99):>14.1f} "
+              f"{percentile(durable_ms, 50):>15.2f} {percentile(durable_ms, 99):>15.2f}")
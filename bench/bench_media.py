@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Вкладення до заявки (media.py) проти локального фейкового Bot API з файлами.
+
+    python bench/bench_media.py [--users 20] [--files 4] [--size-mb 1] [--big-mb 64]
+
+1) bot.py: кожен користувач натискає «Замовити», надсилає --files документів
+   (половина — однаковий вміст, ще раз той самий файл і один завеликий) і текст заявки.
+   Перевіряється: файли на диску за sha256, однаковий вміст — один файл,
+   повтор file_unique_id не завантажується, завеликий відхилено, квота тримається,
+   записи "media" в журналі мають ref своєї заявки.
+2) памʼять: файл --big-mb через MediaIntake (потоково) проти telebot download_file
+   (весь файл у памʼяті) — приріст піку RSS.
+"""
+
+import argparse
+import os
+import resource
+import sys
+import time
+
+from common import FAKE_TOKEN, callback_json, load_bot, media_json, message_json, to_update
+from fake_api import FakeBotAPI
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def wait_idle(intake, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while len(intake) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def check_bot(fake, users, files, size):
+    os.environ.update(MEDIA_MAX_MB=str(size * 3 / 2**20), MEDIA_QUOTA_FILES=str(files + 1))
+    module = load_bot("bot")
+    from journal import scan
+    from update_queue import run_handlers_inline
+    run_handlers_inline(module.bot)   # апдейти по черзі, як у доріжці одного чату
+
+    shared = fake.add_file(b"S" * size)              # однаковий файл у всіх користувачів
+    big = fake.add_file(b"B" * (size * 4))
+    started = time.perf_counter()
+    for uid in range(1, users + 1):
+        # telebot обробляє пачку: спершу повідомлення, потім callback — тому окремо
+        module.bot.process_new_updates([to_update(callback_json(uid, "order"))])
+        updates = []
+        for i in range(files):
+            if i % 2:
+                # інший file_id/unique_id, але той самий вміст (напр. переслане з іншого чату)
+                same = dict(fake.add_file(b"S" * size), file_unique_id=f"copy{uid}_{i}")
+                updates.append(media_json(uid, "document", same))
+            else:
+                updates.append(media_json(uid, "document", fake.add_file(os.urandom(size))))
+        updates.append(media_json(uid, "photo", shared))
+        updates.append(media_json(uid, "document", big))
+        updates.append(media_json(uid, "document", fake.add_file(os.urandom(16))))   # понад квоту
+        module.bot.process_new_updates([to_update(u) for u in updates])
+        wait_idle(module.MEDIA)
+        module.bot.process_new_updates([to_update(message_json(uid, f"Заявка {uid}: не вмикається"))])
+    wait_idle(module.MEDIA)
+    elapsed = time.perf_counter() - started
+    module.JOURNAL.close()
+    # відповіді ще в черзі вихідного клієнта — фейковий API не можна зупиняти раніше
+    while len(module.api):
+        time.sleep(0.01)
+
+    orders = {r["user_id"]: r["ref"] for r in scan(module.JOURNAL.directory, kind="order")}
+    media = list(scan(module.JOURNAL.directory, kind="media"))
+    stored = [os.path.join(root, name) for root, _, names in os.walk(module.MEDIA.directory)
+              if not root.endswith("tmp") for name in names]
+    assert all(orders[r["user_id"]] == r["ref"] for r in media), "media linked to a wrong order"
+    assert len(orders) == users
+    assert fake.downloads[shared["file_id"]] == 1, "same file_unique_id downloaded twice"
+    assert fake.downloads[big["file_id"]] == 0, "oversized file was downloaded"
+    assert not os.listdir(os.path.join(module.MEDIA.directory, "tmp"))
+    return {
+        "users": users,
+        "elapsed_s": round(elapsed, 2),
+        "media_records": len(media),
+        "stored_files": len(stored),
+        "downloads": sum(fake.downloads.values()),
+        "deduplicated": module.MEDIA.deduplicated,
+        "rejected": module.MEDIA.rejected,
+        "failed": module.MEDIA.failed,
+    }
+
+
+def check_memory(fake, big_mb, directory):
+    from telebot import apihelper
+
+    from media import MediaIntake
+
+    file = fake.add_file(os.urandom(big_mb * 2**20))
+    info = apihelper.get_file(FAKE_TOKEN, file["file_id"])
+    intake = MediaIntake(FAKE_TOKEN, directory, max_file=2**40, quota_bytes=2**40)
+
+    before = peak_rss_mb()
+    started = time.perf_counter()
+    intake._stream(apihelper.FILE_URL.format(FAKE_TOKEN, info["file_path"]))
+    streamed = time.perf_counter() - started
+    streaming_peak = peak_rss_mb() - before
+
+    before = peak_rss_mb()
+    started = time.perf_counter()
+    content = apihelper.download_file(FAKE_TOKEN, info["file_path"])
+    buffered = time.perf_counter() - started
+    buffered_peak = peak_rss_mb() - before
+    del content
+    return {
+        "file_mb": big_mb,
+        "streaming_peak_growth_mb": round(streaming_peak, 1),
+        "streaming_mb_s": round(big_mb / streamed),
+        "download_file_peak_growth_mb": round(buffered_peak, 1),
+        "download_file_mb_s": round(big_mb / buffered),
+    }
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=20)
+    ap.add_argument("--files", type=int, default=4)
+    ap.add_argument("--size-mb", type=float, default=1.0)
+    ap.add_argument("--big-mb", type=int, default=64)
+    args = ap.parse_args()
+
+    fake = FakeBotAPI().start()
+    os.environ.update(TG_API_URL=fake.api_url, TG_FILE_URL=fake.file_url)
+    report = check_bot(fake, args.users, args.files, int(args.size_mb * 2**20))
+    # памʼять міряємо до того, як фейковий сервер набере ще гігабайт вмісту
+    report.update(check_memory(fake, args.big_mb, os.path.join(os.environ["MEDIA_DIR"], "memory")))
+    fake.stop()
+    for key, value in report.items():
+        print(f"{key:<30} {value}")
+    sys.exit(0)
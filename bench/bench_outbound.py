@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+OutboundClient проти локального фейкового Bot API.
+
+    python bench/bench_outbound.py [--chats 50] [--per-chat 5] [--latency 0.02]
+
+Сервер відповідає 429, якщо в чат іде більше --chat-limit запитів/с,
+тож видно, що клієнт тримає ліміти, повторює після retry_after,
+а answer_callback_query не чекає за розсилкою.
+"""
+
+import argparse
+import time
+
+from common import FAKE_TOKEN
+from fake_api import FakeBotAPI
+
+
+def run(chats, per_chat, latency, chat_limit, global_rate):
+    import telebot
+    from telebot import apihelper
+    from tg_client import PRIORITY_BULK, OutboundClient
+
+    api = FakeBotAPI(latency=latency, chat_limit=chat_limit).start()
+    apihelper.API_URL = api.api_url
+    bot = telebot.TeleBot(FAKE_TOKEN, threaded=False)
+    client = OutboundClient(bot, global_rate=global_rate, chat_rate=1.0, chat_burst=1)
+
+    t0 = time.perf_counter()
+    bulk = [client.send_message(chat, f"розсилка {i}", priority=PRIORITY_BULK)
+            for i in range(per_chat) for chat in range(1, chats + 1)]
+    time.sleep(0.05)
+    t_cb = time.perf_counter()
+    client.answer_callback_query("42").result(timeout=30)
+    cb_latency = time.perf_counter() - t_cb
+
+    for f in bulk:
+        f.result(timeout=600)
+    elapsed = time.perf_counter() - t0
+    client.close()
+    api.stop()
+
+    stats = client.stats()
+    print(f"messages:            {len(bulk)} in {elapsed:.2f}s ({len(bulk) / elapsed:.1f} msg/s, limit {global_rate}/s)")
+    print(f"callback answer:     {cb_latency * 1000:.1f} ms behind {len(bulk)} queued sends")
+    print(f"queue wait avg/max:  {stats['queue_wait_avg'] * 1000:.1f} / {stats['queue_wait_max'] * 1000:.1f} ms")
+    print(f"429 from server:     {sum(api.throttled.values())}, client retries: {stats['retries']}, failed: {stats['failed']}")
+    print(f"server calls:        {dict(api.calls)}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--chats", type=int, default=50)
+    ap.add_argument("--per-chat", type=int, default=5)
+    ap.add_argument("--latency", type=float, default=0.02)
+    ap.add_argument("--chat-limit", type=float, default=2.0)
+    ap.add_argument("--global-rate", type=float, default=30.0)
+    args = ap.parse_args()
+    run(args.chats, args.per_chat, args.latency, args.chat_limit, args.global_rate)
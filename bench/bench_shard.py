@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Масштабування shard.py: скільки апдейтів/с обробляють 1, 2, 4… процеси-воркери.
+
+    python bench/bench_shard.py [--shards 1,2,4] [--updates 20000] [--chats 2000] [--kill]
+
+Фейковий Bot API працює в окремому процесі, фронт (ShardRouter) — у процесі бенчмарка
+без HTTP на вході: міряється саме обробка у воркерах. Апдейт вважається обробленим,
+коли воркер його підтвердив (хендлер відпрацював, відповіді поставлені в OutboundClient).
+--kill вбиває воркер 0 посеред прогону: усі апдейти все одно мають бути оброблені.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import time
+
+from common import FAKE_TOKEN, ROOT, callback_json, message_json
+
+STEPS = ("/start", "order", "order_template", "ЗАЯВКА: ноутбук не вмикається")
+
+
+def _serve_fake_api(conn):
+    from fake_api import FakeBotAPI
+    api = FakeBotAPI().start()
+    conn.send(api.api_url)
+    signal.pause()
+
+
+def start_fake_api():
+    ctx = multiprocessing.get_context("spawn")
+    parent, child = ctx.Pipe()
+    proc = ctx.Process(target=_serve_fake_api, args=(child,), daemon=True)
+    proc.start()
+    return proc, parent.recv()
+
+
+def workload(updates, chats):
+    for i in range(updates):
+        chat = 1_000_000 + i % chats
+        step = STEPS[(i // chats) % len(STEPS)]
+        update = callback_json(chat, step) if step in ("order", "order_template") else message_json(chat, step)
+        yield json.dumps(update, ensure_ascii=False).encode("utf-8")
+
+
+def run(shards, updates, chats, kill=False):
+    from shard import ShardRouter
+
+    router = ShardRouter("bot", shards, threads=4, maxsize=5000)
+    raws = list(workload(updates, chats))
+    t0 = time.perf_counter()
+    for i, raw in enumerate(raws):
+        while router.route(raw) == 503:
+            time.sleep(0.001)
+        if kill and i == len(raws) // 2:
+            router.shards[0].process.kill()
+    while router.processed() < updates:
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - t0
+    restarts = sum(s.restarts for s in router.shards)
+    router.close()
+    return elapsed, restarts
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--shards", default="1,2,4")
+    ap.add_argument("--updates", type=int, default=20000)
+    ap.add_argument("--chats", type=int, default=2000)
+    ap.add_argument("--kill", action="store_true", help="вбити воркер 0 посередині прогону")
+    args = ap.parse_args()
+
+    sys.path.insert(0, ROOT)
+    fake, api_url = start_fake_api()
+    os.environ.update(
+        BOT_TOKEN=FAKE_TOKEN, TG_API_URL=api_url,
+        TG_GLOBAL_RATE="1000000", TG_CHAT_RATE="1000", TG_CHAT_BURST="1000",
+    )
+
+    print(f"cpus={os.cpu_count()} updates={args.updates} chats={args.chats}")
+    base = None
+    for n in (int(x) for x in args.shards.split(",")):
+        elapsed, restarts = run(n, args.updates, args.chats, args.kill)
+        rate = args.updates / elapsed
+        base = base or rate
+        print(f"shards={n:<3} {rate:>9.0f} updates/s  speedup x{rate / base:.2f}  restarts={restarts}")
+    fake.terminate()
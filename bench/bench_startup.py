@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+Холодний старт: від запуску процесу бота до першого обробленого апдейта (відповідь
+дійшла до фейкового Bot API) і скільки викликів вебхук-API робиться на старті.
+
+    python bench/bench_startup.py [--runs 5] [--root <інша робоча копія>]
+
+Сценарії (кожен запуск — новий процес `python <бот>.py`, як після деплою):
+- polling bot.py / bot_ai_master_v1.py: апдейт уже чекає в getUpdates
+  (webhook->polling: у «Telegram» ще стоїть вебхук, getUpdates відповідає 409)
+- webhook bot.py, рестарт: вебхук у «Telegram» уже стоїть на WEBHOOK_URL/webhook
+  (як після попереднього деплою); апдейт шлеться на /webhook, щойно порт відкрився
+- import: лише `import <бот>` (без мережі) — скільки з цього часу займають імпорти
+
+--root: запустити ботів з іншої копії репозиторію (напр. `git worktree add /tmp/base HEAD~1`),
+щоб порівняти з попередньою версією тим самим скриптом.
+"""
+
+import argparse
+import json
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from common import FAKE_TOKEN, ROOT, message_json
+from fake_api import FakeBotAPI
+
+WEBHOOK_METHODS = ("getWebhookInfo", "setWebhook", "deleteWebhook")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_fake() -> FakeBotAPI:
+    fake = FakeBotAPI()
+    # бот зупиняється посеред long polling — обірване зʼєднання тут не помилка
+    fake.server.handle_error = lambda request, client_address: None
+    return fake.start()
+
+
+def bot_env(fake, **extra) -> dict:
+    scratch = tempfile.mkdtemp(prefix="bench-startup-")
+    env = dict(os.environ, BOT_TOKEN=FAKE_TOKEN, TG_API_URL=fake.api_url, WEBHOOK_URL="", ENGINE="sync",
+               JOURNAL_DIR=os.path.join(scratch, "journal"), MEDIA_DIR=os.path.join(scratch, "media"),
+               FLOOD_LIMITS="", FLOOD_REPEAT="0", METRICS_PORT="", NOTIFY_CHATS="", RECORD_DIR="",
+               PYTHONUNBUFFERED="1")
+    env.update(extra)
+    return env
+
+
+def stop(proc):
+    proc.send_signal(signal.SIGTERM)
+    try:
+        proc.wait(10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+def run_polling(root, bot_name, uid, webhook_set=False):
+    fake = start_fake()
+    if webhook_set:
+        fake.webhook.update(url="https://old.example/webhook")    # перехід з webhook на polling
+    fake.push_update(message_json(uid, "/start"))
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, f"{bot_name}.py"], cwd=root, env=bot_env(fake),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    ok = fake.wait_reply(uid, 1, timeout=60)
+    elapsed = time.perf_counter() - started
+    stop(proc)
+    fake.stop()
+    if not ok:
+        raise SystemExit(f"{bot_name}: no reply within 60s")
+    return elapsed, {m: fake.calls[m] for m in WEBHOOK_METHODS}
+
+
+def run_webhook(root, bot_name, uid):
+    fake = start_fake()
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    fake.webhook.update(url=f"{base_url}/webhook", max_connections=40)    # стоїть з попереднього деплою
+    body = json.dumps(message_json(uid, "/start")).encode("utf-8")
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, f"{bot_name}.py"], cwd=root,
+                            env=bot_env(fake, WEBHOOK_URL=base_url, PORT=str(port)),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while True:
+        try:
+            request = urllib.request.Request(f"{base_url}/webhook", data=body,
+                                             headers={"Content-Type": "application/json"})
+            with urllib.request.urlopen(request, timeout=5):
+                break
+        except OSError:
+            if time.monotonic() > deadline or proc.poll() is not None:
+                stop(proc)
+                raise SystemExit(f"{bot_name}: webhook did not come up")
+            time.sleep(0.005)
+    ok = fake.wait_reply(uid, 1, timeout=60)
+    elapsed = time.perf_counter() - started
+    stop(proc)
+    fake.stop()
+    if not ok:
+        raise SystemExit(f"{bot_name}: no reply within 60s")
+    return elapsed, {m: fake.calls[m] for m in WEBHOOK_METHODS}
+
+
+def run_import(root, bot_name, uid):
+    fake = start_fake()
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", f"import {bot_name}"], cwd=root, env=bot_env(fake), check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    elapsed = time.perf_counter() - started
+    fake.stop()
+    return elapsed, {}
+
+
+SCENARIOS = (
+    ("bot", "polling", run_polling),
+    ("bot_ai_master_v1", "polling", run_polling),
+    ("bot", "webhook->polling", lambda root, name, uid: run_polling(root, name, uid, webhook_set=True)),
+    ("bot", "webhook restart", run_webhook),
+    ("bot", "import", run_import),
+    ("bot_ai_master_v1", "import", run_import),
+)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--root", default=ROOT, help="робоча копія, з якої запускати ботів")
+    args = ap.parse_args()
+
+    print(f"root={args.root} runs={args.runs} (median / min, ms; webhook API calls per start)")
+    print(f"{'bot':<18}{'scenario':<17}{'median':>8}{'min':>8}   webhook calls")
+    uid = 1000
+    for bot_name, scenario, fn in SCENARIOS:
+        times, calls = [], {}
+        for _ in range(args.runs):
+            uid += 1
+            elapsed, calls = fn(args.root, bot_name, uid)
+            times.append(elapsed)
+        calls = " ".join(f"{m}={n}" for m, n in calls.items() if n) or "-"
+        print(f"{bot_name:<18}{scenario:<17}{statistics.median(times) * 1000:>8.0f}{min(times) * 1000:>8.0f}   {calls}")
+    sys.exit(0)
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Спільне для бенчмарків: завантаження модулів ботів з фейковим токеном
+і генерація синтетичних апдейтів Telegram.
+"""
+
+import importlib
+import itertools
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# журнал заявок (journal.py) і вкладення (media.py) у бенчмарках — у тимчасовий каталог, а не в робочий
+os.environ.setdefault("JOURNAL_DIR", tempfile.mkdtemp(prefix="bench-journal-"))
+os.environ.setdefault("MEDIA_DIR", os.path.join(os.environ["JOURNAL_DIR"], "media"))
+# синтетичні користувачі клацають швидше за людей — флуд-ліміт (flood.py) вмикає лише bench_flood.py
+os.environ.setdefault("FLOOD_LIMITS", "")
+os.environ.setdefault("FLOOD_REPEAT", "0")
+
+FAKE_TOKEN = "123456:TEST-TOKEN"
+
+_update_ids = itertools.count(1)
+_message_ids = itertools.count(1)
+
+
+def load_bot(module_name):
+    """Імпортує bot / bot_ai_master_v1 без справжнього токена."""
+    os.environ.setdefault("BOT_TOKEN", FAKE_TOKEN)
+    return importlib.import_module(module_name)
+
+
+def _user(uid):
+    return {"id": uid, "is_bot": False, "first_name": f"user{uid}"}
+
+
+def message_json(uid, text):
+    entities = []
+    if text.startswith("/"):
+        entities.append({"type": "bot_command", "offset": 0, "length": len(text.split()[0])})
+    return {
+        "update_id": next(_update_ids),
+        "message": {
+            "message_id": next(_message_ids),
+            "date": 0,
+            "chat": {"id": uid, "type": "private"},
+            "from": _user(uid),
+            "text": text,
+            "entities": entities,
+        },
+    }
+
+
+def media_json(uid, kind, file: dict, caption=""):
+    """kind: photo / video / document; file — з FakeBotAPI.add_file()."""
+    message = {
+        "message_id": next(_message_ids),
+        "date": 0,
+        "chat": {"id": uid, "type": "private"},
+        "from": _user(uid),
+        kind: [dict(file, width=1280, height=960)] if kind == "photo" else dict(file),
+    }
+    if kind == "video":
+        message[kind].update(width=1280, height=720, duration=5)
+    if caption:
+        message["caption"] = caption
+    return {"update_id": next(_update_ids), "message": message}
+
+
+def callback_json(uid, data, message_id=1):
+    return {
+        "update_id": next(_update_ids),
+        "callback_query": {
+            "id": str(next(_update_ids)),
+            "from": _user(uid),
+            "chat_instance": str(uid),
+            "data": data,
+            "message": {
+                "message_id": message_id,
+                "date": 0,
+                "chat": {"id": uid, "type": "private"},
+                "from": {"id": 1, "is_bot": True, "first_name": "bot"},
+                "text": "menu",
+            },
+        },
+    }
+
+
+def to_update(data):
+    from telebot.types import Update
+    return Update.de_json(data)
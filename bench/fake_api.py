@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""
+Локальний фейковий Telegram Bot API для бенчмарків.
+
+    api = FakeBotAPI(latency=0.02, chat_limit=1.0).start()
+    apihelper.API_URL = api.api_url
+    ...
+    api.stop(); print(api.calls)
+
+- затримка відповіді на кожен запит (latency, сек)
+- емуляція лімітів Telegram: більше chat_limit запитів/с у чат -> 429 з retry_after
+- лічильники викликів по методах
+- getUpdates з long polling: апдейти кладуться через push_update()
+- setWebhook / deleteWebhook / getWebhookInfo зберігають стан вебхука;
+  поки вебхук стоїть, getUpdates -> 409 Conflict, як у Telegram
+- wait_reply(chat_id, n): дочекатися n-ї відповіді бота в чат (sendMessage/editMessageText)
+- файли: add_file(bytes) -> file_id; getFile + GET /file/bot<token>/<path> віддає вміст
+  частинами (apihelper.FILE_URL = api.file_url)
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+
+class FakeBotAPI:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, chat_limit=None, retry_after=1):
+        self.latency = latency
+        self.chat_limit = chat_limit
+        self.retry_after = retry_after
+
+        self.calls = Counter()
+        self.throttled = Counter()
+        self._lock = threading.Lock()
+        self._chat_hits = defaultdict(list)   # chat_id -> часи останніх запитів
+        self._message_ids = 0
+
+        self._updates = []                    # черга для getUpdates
+        self._updates_cond = threading.Condition()
+        self._replies = Counter()             # chat_id -> скільки відповідей бот надіслав
+        self._replies_cond = threading.Condition()
+        self.webhook = {"url": "", "has_custom_certificate": False, "pending_update_count": 0}
+        self.files = {}                       # file_id -> вміст
+        self.downloads = Counter()            # file_id -> скільки разів завантажено
+
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def api_url(self):
+        """Значення для telebot.apihelper.API_URL"""
+        return self.base_url + "/bot{0}/{1}"
+
+    @property
+    def file_url(self):
+        """Значення для telebot.apihelper.FILE_URL"""
+        return self.base_url + "/file/bot{0}/{1}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="fake-bot-api", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    # ---- керування з бенчмарка ----
+    def push_update(self, update: dict):
+        with self._updates_cond:
+            self._updates.append(update)
+            self._updates_cond.notify_all()
+
+    def add_file(self, content: bytes) -> dict:
+        """Кладе файл на «сервер»; -> поля, як у PhotoSize/Document (file_id, file_unique_id, file_size)."""
+        unique = hashlib.md5(content).hexdigest()[:16]
+        with self._lock:
+            file_id = f"file{len(self.files) + 1}_{unique}"
+            self.files[file_id] = content
+        return {"file_id": file_id, "file_unique_id": unique, "file_size": len(content)}
+
+    def replies(self, chat_id) -> int:
+        with self._replies_cond:
+            return self._replies[chat_id]
+
+    def wait_reply(self, chat_id, count, timeout=30.0) -> bool:
+        """Чекає, поки бот надішле в чат щонайменше count відповідей."""
+        with self._replies_cond:
+            return self._replies_cond.wait_for(lambda: self._replies[chat_id] >= count, timeout)
+
+    def _get_updates(self, params):
+        offset = int(params.get("offset", 0) or 0)
+        limit = int(params.get("limit", 100) or 100)
+        timeout = float(params.get("timeout", 0) or 0)
+        with self._updates_cond:
+            # offset підтверджує все, що менше нього
+            self._updates = [u for u in self._updates if u["update_id"] >= offset]
+            if not self._updates and timeout:
+                self._updates_cond.wait(timeout)
+            return self._updates[:limit]
+
+    # ---- логіка методів ----
+    def _limited(self, chat_id):
+        if self.chat_limit is None or chat_id is None:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            hits = [t for t in self._chat_hits[chat_id] if now - t < 1.0]
+            if len(hits) >= self.chat_limit:
+                self._chat_hits[chat_id] = hits
+                return True
+            hits.append(now)
+            self._chat_hits[chat_id] = hits
+            return False
+
+    def _message(self, params):
+        with self._lock:
+            self._message_ids += 1
+            message_id = self._message_ids
+        chat_id = int(params.get("chat_id", 0) or 0)
+        return {
+            "message_id": int(params.get("message_id", message_id)),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "text": params.get("text", ""),
+        }
+
+    def handle(self, method, params):
+        """-> (http status, json dict)"""
+        with self._lock:
+            self.calls[method] += 1
+
+        if method in ("sendMessage", "editMessageText") and self._limited(params.get("chat_id")):
+            with self._lock:
+                self.throttled[method] += 1
+            return 429, {
+                "ok": False, "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }
+
+        if method == "getUpdates":
+            if self.webhook["url"]:
+                return 409, {"ok": False, "error_code": 409,
+                             "description": "Conflict: can't use getUpdates method while webhook is active"}
+            return 200, {"ok": True, "result": self._get_updates(params)}
+        if method == "setWebhook":
+            with self._lock:
+                self.webhook = dict(self.webhook, url=params.get("url", ""),
+                                    max_connections=int(params.get("max_connections", 40) or 40))
+            return 200, {"ok": True, "result": True}
+        if method == "deleteWebhook":
+            with self._lock:
+                self.webhook = dict(self.webhook, url="")
+            return 200, {"ok": True, "result": True}
+        if method == "getWebhookInfo":
+            with self._lock:
+                return 200, {"ok": True, "result": dict(self.webhook)}
+        if method == "getFile":
+            content = self.files.get(params.get("file_id", ""))
+            if content is None:
+                return 400, {"ok": False, "error_code": 400, "description": "Bad Request: invalid file_id"}
+            file_id = params["file_id"]
+            return 200, {"ok": True, "result": {
+                "file_id": file_id, "file_unique_id": file_id.split("_", 1)[-1],
+                "file_size": len(content), "file_path": f"documents/{file_id}.bin",
+            }}
+        if method == "getMe":
+            return 200, {"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "fake", "username": "fake_bot"}}
+        if method in ("sendMessage", "editMessageText"):
+            result = self._message(params)
+            with self._replies_cond:
+                self._replies[result["chat"]["id"]] += 1
+                self._replies_cond.notify_all()
+            return 200, {"ok": True, "result": result}
+        return 200, {"ok": True, "result": True}
+
+    def _handler_class(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True   # інакше keep-alive ловить 40мс delayed ACK
+
+            def log_message(self, *args):
+                pass
+
+            def _params(self):
+                url = urlsplit(self.path)
+                params = dict(parse_qsl(url.query))
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    body = self.rfile.read(length)
+                    ctype = self.headers.get("Content-Type", "")
+                    if "json" in ctype:
+                        params.update(json.loads(body))
+                    elif "x-www-form-urlencoded" in ctype:
+                        params.update(parse_qsl(body.decode("utf-8")))
+                return url.path, params
+
+            def _serve(self):
+                path, params = self._params()
+                if api.latency:
+                    time.sleep(api.latency)
+                if path.startswith("/file/"):
+                    return self._serve_file(path)
+                # /bot<token>/<method>
+                method = path.rsplit("/", 1)[-1]
+                status, payload = api.handle(method, params)
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _serve_file(self, path):
+                # /file/bot<token>/documents/<file_id>.bin
+                file_id = path.rsplit("/", 1)[-1].rsplit(".", 1)[0]
+                content = api.files.get(file_id)
+                if content is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                with api._lock:
+                    api.downloads[file_id] += 1
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                view = memoryview(content)
+                for start in range(0, len(content), 65536):
+                    self.wfile.write(view[start:start + 65536])
+
+            do_GET = _serve
+            do_POST = _serve
+
+        return Handler
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""
+Навантажувальний тест ботів проти локального фейкового Bot API.
+
+    python bench/loadgen.py --bot bot --mode webhook --users 100 --journeys 500
+    python bench/loadgen.py --bot bot --mode polling --users 100 --journeys 500
+    python bench/loadgen.py --bot bot_ai_master_v1 --mode polling --users 50
+    python bench/loadgen.py --bot bot --mode webhook --engine async --users 500 --latency 0.05
+
+Кожен віртуальний користувач проходить реалістичний сценарій
+(/start -> замовлення -> шаблон -> заявка текстом; або
+diag_start -> опис -> pkg_* -> згода -> доступ) і на кожному кроці чекає
+відповіді бота у фейковому API, як справжня людина.
+
+Звіт: кроки/с, p50/p95/p99 часу «апдейт -> відповідь бота», приріст RSS.
+
+Режими:
+  webhook — POST на /webhook Flask-застосунку (реальний HTTP-сервер у потоці)
+  polling — poller.Poller (як у __main__ ботів) забирає апдейти з фейкового getUpdates
+  direct  — bot.process_new_updates() без мережі на вході
+
+--engine async запускає бота з ENGINE=async (async_engine.py): вебхук на aiohttp,
+polling і обробка — в одному event loop в окремому потоці.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import threading
+import time
+
+from common import FAKE_TOKEN, ROOT, callback_json, message_json, to_update
+from fake_api import FakeBotAPI
+
+# Сценарії: (тип, значення). Кожен крок дає рівно одну відповідь бота в чат.
+JOURNEYS = {
+    "bot": [
+        ("text", "/start"),
+        ("callback", "order"),
+        ("callback", "order_template"),
+        ("text", "ЗАЯВКА:\n1) Ноутбук Lenovo\n2) Не вмикається\n3) Вчора\n4) Нічого\n5) -\n6) Київ, вечір"),
+    ],
+    "bot_ai_master_v1": [
+        ("text", "/start"),
+        ("callback", "diag_start"),
+        ("text", "1) все\n2) тиждень\n3) 11\n4) ні\nОпис: гальмує браузер chrome, автозапуск довгий"),
+        ("callback", "pkg_PRO"),
+        ("callback", "consent_yes"),
+        ("callback", "access_yes"),
+    ],
+}
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, int(round(p / 100 * (len(values) - 1)))))
+    return values[k]
+
+
+def prepare_env(chat_rate, extra_env=None, engine="sync"):
+    os.environ.setdefault("BOT_TOKEN", FAKE_TOKEN)
+    os.environ["ENGINE"] = engine
+    # за замовчуванням міряємо сам бот, а не ліміти Telegram на чат
+    os.environ.setdefault("TG_CHAT_RATE", str(chat_rate))
+    os.environ.setdefault("TG_CHAT_BURST", str(max(3, int(chat_rate))))
+    os.environ.setdefault("TG_GLOBAL_RATE", "100000")
+    for key, value in (extra_env or {}).items():
+        os.environ[key] = str(value)
+
+
+class Injector:
+    """Як апдейт потрапляє в бот: webhook / polling / direct."""
+
+    def __init__(self, module, mode, api):
+        self.module = module
+        self.mode = mode
+        self.api = api
+        self._local = threading.local()
+        self._server = None
+        self._poller = None
+        self._loop = None
+        self._runner = None
+
+        if getattr(module, "ENGINE", "sync") == "async":
+            self._start_async()
+        elif mode == "webhook":
+            if not hasattr(module, "app"):
+                raise SystemExit(f"{module.__name__} has no webhook app, use --mode polling")
+            import logging
+            from werkzeug.serving import make_server
+            logging.getLogger("werkzeug").setLevel(logging.ERROR)
+            self._server = make_server("127.0.0.1", 0, module.app, threaded=True)
+            threading.Thread(target=self._server.serve_forever, daemon=True).start()
+            self.url = f"http://127.0.0.1:{self._server.server_port}/webhook"
+        elif mode == "polling":
+            from poller import Poller
+            self._poller = Poller(module.bot, timeout=1, deduper=getattr(module, "DEDUP", None),
+                                  limiter=getattr(module, "FLOOD", None),
+                                  metrics=getattr(module, "METRICS", None))
+            threading.Thread(target=self._poller.run, daemon=True).start()
+
+    def _start_async(self):
+        import async_engine
+        from aiohttp import web
+
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name="async-engine", daemon=True).start()
+        if self.mode == "webhook":
+            async def start():
+                runner = web.AppRunner(async_engine.make_app(self.module))
+                await runner.setup()
+                site = web.TCPSite(runner, "127.0.0.1", 0)
+                await site.start()
+                return runner, runner.addresses[0][1]
+            self._runner, port = self._submit(start())
+            self.url = f"http://127.0.0.1:{port}/webhook"
+        elif self.mode == "polling":
+            self._poller = asyncio.run_coroutine_threadsafe(
+                async_engine.polling(self.module, timeout=1), self._loop)
+        else:
+            async_engine.install_handlers(self.module.bot, self.module.api.bot)
+
+    def _submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def send(self, update: dict):
+        if self.mode == "webhook":
+            session = getattr(self._local, "session", None)
+            if session is None:
+                import requests
+                session = self._local.session = requests.Session()
+            r = session.post(self.url, data=json.dumps(update), headers={"Content-Type": "application/json"})
+            r.raise_for_status()
+        elif self.mode == "polling":
+            self.api.push_update(update)
+        elif self._loop is not None:
+            self._submit(self.module.api.bot.process_new_updates([to_update(update)]))
+        else:
+            self.module.bot.process_new_updates([to_update(update)])
+
+    def close(self):
+        if self._loop is not None:
+            if self._runner is not None:
+                self._submit(self._runner.cleanup())
+            elif self._poller is not None:
+                self._poller.cancel()
+            else:
+                self._submit(self.module.api.aclose())
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            return
+        if self._server is not None:
+            self._server.shutdown()
+        if self._poller is not None:
+            self._poller.close()
+
+
+def run(bot_name, mode, users, journeys, latency, chat_rate, think, timeout=30.0, extra_env=None,
+        engine="sync"):
+    prepare_env(chat_rate, extra_env, engine)
+    import importlib
+    import sys
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    from telebot import apihelper
+
+    api = FakeBotAPI(latency=latency).start()
+    apihelper.API_URL = api.api_url
+    if engine == "async":
+        from telebot import asyncio_helper
+        asyncio_helper.API_URL = api.api_url
+
+    rss_before = rss_mb()
+    module = importlib.import_module(bot_name)
+    injector = Injector(module, mode, api)
+    steps = JOURNEYS[bot_name]
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    todo = itertools.count()
+    uids = itertools.count(1_000_000)
+
+    def user_loop():
+        local = []
+        while next(todo) < journeys:
+            uid = next(uids)
+            expected = api.replies(uid)
+            for kind, value in steps:
+                update = message_json(uid, value) if kind == "text" else callback_json(uid, value)
+                expected += 1
+                t0 = time.perf_counter()
+                try:
+                    injector.send(update)
+                except Exception as e:
+                    errors.append(repr(e))
+                    break
+                if not api.wait_reply(uid, expected, timeout):
+                    errors.append(f"timeout uid={uid} step={value!r}")
+                    break
+                local.append(time.perf_counter() - t0)
+                if think:
+                    time.sleep(think)
+        with lock:
+            latencies.extend(local)
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=user_loop, daemon=True) for _ in range(users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    rss_after = rss_mb()
+
+    injector.close()
+    api.stop()
+
+    report = {
+        "bot": bot_name,
+        "mode": mode,
+        "engine": engine,
+        "users": users,
+        "journeys": journeys,
+        "steps": len(latencies),
+        "errors": len(errors),
+        "elapsed_s": round(elapsed, 3),
+        "updates_per_s": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "rss_before_mb": round(rss_before, 1),
+        "rss_after_mb": round(rss_after, 1),
+        "rss_growth_mb": round(rss_after - rss_before, 1),
+        "api_calls": dict(api.calls),
+    }
+    if errors:
+        report["first_errors"] = errors[:5]
+    return report
+
+
+def print_report(report):
+    for key, value in report.items():
+        print(f"{key:<15} {value}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--bot", choices=sorted(JOURNEYS), default="bot")
+    ap.add_argument("--mode", choices=["webhook", "polling", "direct"], default="direct")
+    ap.add_argument("--engine", choices=["sync", "async"], default="sync")
+    ap.add_argument("--users", type=int, default=50, help="одночасних користувачів")
+    ap.add_argument("--journeys", type=int, default=500, help="скільки сценаріїв пройти загалом")
+    ap.add_argument("--latency", type=float, default=0.0, help="затримка фейкового API, с")
+    ap.add_argument("--chat-rate", type=float, default=1000.0, help="TG_CHAT_RATE для бота")
+    ap.add_argument("--think", type=float, default=0.0, help="пауза користувача між кроками, с")
+    ap.add_argument("--json", action="store_true", help="звіт одним рядком JSON")
+    args = ap.parse_args()
+
+    result = run(args.bot, args.mode, args.users, args.journeys, args.latency, args.chat_rate, args.think,
+                 engine=args.engine)
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False))
+    else:
+        print_report(result)
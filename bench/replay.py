@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+Відтворення записаного трафіку (recorder.py, RECORD_DIR) проти фейкового Bot API
+і порівняння двох прогонів — напр. поточна збірка проти нової.
+
+    python bench/replay.py run <RECORD_DIR або файл> --bot bot --speed 1 --out old.json
+    (git checkout нової збірки)
+    python bench/replay.py run <RECORD_DIR або файл> --bot bot --speed 1 --out new.json
+    python bench/replay.py compare old.json new.json
+
+    # синтетичний запис зі сценаріїв loadgen.py — коли проду під рукою немає
+    python bench/replay.py make-log /tmp/rec --bot bot --users 200 --rate 100
+
+--speed: 1 — з тими самими паузами, що в проді; N — у N разів швидше; max — без пауз.
+Апдейти подаються через ті самі входи, що й у loadgen.py (--mode webhook/polling/direct,
+--engine sync/async), апдейти одного чату — строго по черзі, як їх шле Telegram.
+Латентність — від подачі апдейта до кінця його обробки (process_new_updates);
+апдейти, відкинуті до хендлерів (дедуплікація, флуд), рахуються як not_handled.
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+
+from common import callback_json, message_json
+from loadgen import JOURNEYS, Injector, percentile, prepare_env, rss_mb
+
+COMPARE = ("handled", "not_handled", "elapsed_s", "updates_per_s", "p50_ms", "p95_ms", "p99_ms",
+           "max_schedule_lag_ms", "rss_growth_mb")
+
+
+def _instrument(bot, done, is_async):
+    """Фіксує час завершення обробки кожного update_id (обгортка process_new_updates екземпляра)."""
+    process = bot.process_new_updates
+
+    if is_async:
+        async def process_timed(updates):
+            await process(updates)
+            now = time.perf_counter()
+            for update in updates:
+                done[update.update_id] = now
+    else:
+        def process_timed(updates):
+            process(updates)
+            now = time.perf_counter()
+            for update in updates:
+                done[update.update_id] = now
+    bot.process_new_updates = process_timed
+
+
+def _wait_quiet(module, done, quiet=0.5, timeout=120.0):
+    """Чекає, поки обробка і вихідна черга затихнуть."""
+    deadline = time.monotonic() + timeout
+    seen, still_since = -1, time.monotonic()
+    while time.monotonic() < deadline:
+        busy = len(module.api) > 0
+        if len(done) != seen or busy:
+            seen, still_since = len(done), time.monotonic()
+        elif time.monotonic() - still_since >= quiet:
+            return
+        time.sleep(0.02)
+
+
+def run(log, bot_name, mode, engine, speed, latency, concurrency):
+    from recorder import read_log
+
+    prepare_env(1000.0, engine=engine)
+    import importlib
+    from telebot import apihelper
+    from fake_api import FakeBotAPI
+    from shard import raw_chat_id
+    from update_queue import UpdateQueue
+
+    records = [(stamp, json.loads(raw)) for stamp, raw in read_log(log)]
+    if not records:
+        raise SystemExit(f"no updates in {log}")
+
+    api = FakeBotAPI(latency=latency).start()
+    apihelper.API_URL = api.api_url
+    if engine == "async":
+        from telebot import asyncio_helper
+        asyncio_helper.API_URL = api.api_url
+
+    rss_before = rss_mb()
+    module = importlib.import_module(bot_name)
+    done, sent = {}, {}
+    _instrument(module.api.bot if engine == "async" else module.bot, done, engine == "async")
+    injector = Injector(module, mode, api)
+
+    def send(update):
+        sent[update["update_id"]] = time.perf_counter()
+        injector.send(update)
+
+    lanes = UpdateQueue(send, workers=concurrency, maxsize=len(records) + 1, key=raw_chat_id, name="replay")
+    lag_max = 0.0
+    first_stamp = records[0][0]
+    started = time.perf_counter()
+    for stamp, update in records:
+        if speed:
+            target = started + (stamp - first_stamp) / speed
+            delay = target - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                lag_max = max(lag_max, -delay)
+        lanes.put(update)
+    lanes.close(timeout=600)
+    _wait_quiet(module, done)
+    elapsed = max(done.values(), default=started) - started
+    rss_after = rss_mb()
+
+    injector.close()
+    api.stop()
+
+    latencies = [done[uid] - sent[uid] for uid in done if uid in sent]
+    return {
+        "bot": bot_name,
+        "mode": mode,
+        "engine": engine,
+        "speed": speed or "max",
+        "updates": len(records),
+        "handled": len(latencies),
+        "not_handled": len(records) - len(latencies),
+        "elapsed_s": round(elapsed, 3),
+        "updates_per_s": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_schedule_lag_ms": round(lag_max * 1000, 1),
+        "rss_growth_mb": round(rss_after - rss_before, 1),
+        "api_calls": dict(api.calls),
+    }
+
+
+def make_log(directory, bot_name, users, rate, seed=1):
+    """Сценарії loadgen.py, перемішані між користувачами, ~rate апдейтів/с — у формат recorder.py."""
+    from recorder import UpdateRecorder
+
+    rng = random.Random(seed)
+    pending = {1_000_000 + i: list(JOURNEYS[bot_name]) for i in range(users)}
+    recorder = UpdateRecorder(directory)
+    stamp = time.time()
+    count = 0
+    while pending:
+        uid = rng.choice(list(pending))
+        kind, value = pending[uid].pop(0)
+        if not pending[uid]:
+            del pending[uid]
+        update = message_json(uid, value) if kind == "text" else callback_json(uid, value)
+        stamp += rng.expovariate(rate)
+        recorder.record_update(update, stamp)
+        count += 1
+    recorder.close()
+    return count
+
+
+def compare(base, new):
+    print(f"{'':<22}{'base':>12}{'new':>12}{'change':>12}")
+    for key in COMPARE:
+        a, b = base.get(key), new.get(key)
+        change = f"{(b - a) / a * 100:+.1f}%" if isinstance(a, (int, float)) and a else ""
+        print(f"{key:<22}{a!s:>12}{b!s:>12}{change:>12}")
+    print("api calls:")
+    for method in sorted(set(base["api_calls"]) | set(new["api_calls"])):
+        a, b = base["api_calls"].get(method, 0), new["api_calls"].get(method, 0)
+        change = f"{(b - a) / a * 100:+.1f}%" if a else ""
+        print(f"  {method:<20}{a:>12}{b:>12}{change:>12}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("run", help="відтворити запис і вивести звіт")
+    p.add_argument("log", help="RECORD_DIR або один файл updates-*.jsonl.gz")
+    p.add_argument("--bot", choices=sorted(JOURNEYS), default="bot")
+    p.add_argument("--mode", choices=["webhook", "polling", "direct"], default="direct")
+    p.add_argument("--engine", choices=["sync", "async"], default="sync")
+    p.add_argument("--speed", default="1", help="1 (як у проді), N (у N разів швидше) або max")
+    p.add_argument("--latency", type=float, default=0.0, help="затримка фейкового API, с")
+    p.add_argument("--concurrency", type=int, default=16, help="одночасних доставок (різні чати)")
+    p.add_argument("--out", help="зберегти звіт у JSON для compare")
+
+    p = sub.add_parser("compare", help="порівняти два звіти run --out")
+    p.add_argument("base")
+    p.add_argument("new")
+
+    p = sub.add_parser("make-log", help="синтетичний запис зі сценаріїв loadgen.py")
+    p.add_argument("directory")
+    p.add_argument("--bot", choices=sorted(JOURNEYS), default="bot")
+    p.add_argument("--users", type=int, default=200)
+    p.add_argument("--rate", type=float, default=100.0, help="апдейтів/с у записі")
+
+    args = ap.parse_args()
+    if args.command == "run":
+        speed = 0.0 if args.speed == "max" else float(args.speed)
+        report = run(args.log, args.bot, args.mode, args.engine, speed, args.latency, args.concurrency)
+        if args.out:
+            with open(args.out, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=1)
+        for key, value in report.items():
+            print(f"{key:<22} {value}")
+    elif args.command == "compare":
+        with open(args.base, encoding="utf-8") as f:
+            base = json.load(f)
+        with open(args.new, encoding="utf-8") as f:
+            new = json.load(f)
+        compare(base, new)
+    else:
+        count = make_log(args.directory, args.bot, args.users, args.rate)
+        print(f"{count} updates -> {args.directory}")
+    sys.exit(0)
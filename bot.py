@@ -1,23 +1,66 @@
 import os
-from flask import Flask, request
+import sys
+import time
+
 import telebot
 from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
 
+from dedup import deduper_from_env
+from flood import flood_from_env
+from journal import journal_from_env
+from media import MEDIA_TYPES, media_from_env
+from metrics import CONTENT_TYPE, BotMetrics
+from notifier import notifier_from_env, user_label
+from poller import poller_from_env
+from recorder import recorder_from_env
+from router import Router
+from screens import ScreenRegistry
+from state_store import open_store
+from tg_client import client_from_env, ensure_webhook, webhook_settings_from_env
+from update_queue import UpdateQueue, drain_on_signal
+
 # =========================
 # ENV
 # =========================
 BOT_TOKEN = os.getenv("BOT_TOKEN", "").strip()
 WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").strip()  # якщо пусто -> polling (Worker)
 PORT = int(os.getenv("PORT", "10000"))
+UPDATE_WORKERS = int(os.getenv("UPDATE_WORKERS", "0"))  # >0 -> webhook лише ставить апдейт у чергу
+UPDATE_QUEUE_SIZE = int(os.getenv("UPDATE_QUEUE_SIZE", "1000"))
+SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", "25"))
+ENGINE = os.getenv("ENGINE", "sync").strip().lower()  # "async" -> asyncio + aiohttp (async_engine.py)
 
 if not BOT_TOKEN:
     raise RuntimeError("BOT_TOKEN is missing. Set it in environment variables.")
 
-bot = telebot.TeleBot(BOT_TOKEN, parse_mode="HTML")
-app = Flask(__name__)
+# З чергою хендлери виконуються у воркерах черги, тому власний пул telebot не потрібен
+bot = telebot.TeleBot(BOT_TOKEN, parse_mode="HTML", threaded=UPDATE_WORKERS <= 0)
+# Flask-застосунок (bot.app) створюється лише для webhook — див. make_app() нижче
+# Prometheus-метрики: час хендлерів, виклики Telegram API, черги (див. metrics.py, GET /metrics)
+METRICS = BotMetrics()
+# Усі виклики Telegram API — через чергу з лімітами (див. tg_client.py / async_engine.py)
+if ENGINE == "async":
+    from async_engine import async_client_from_env
+    api = async_client_from_env(BOT_TOKEN, parse_mode="HTML", metrics=METRICS)
+else:
+    api = client_from_env(bot, metrics=METRICS)
+
+# Стани користувачів: LRU-кеш + SQLite (STATE_DB), переживають рестарт
+STORE = open_store()
+USER_STATE = STORE.mapping("user_state")  # user_id -> "awaiting_order"
+ORDER_REF = STORE.mapping("order_ref")    # user_id -> ref заявки, до якої вже прикріплені файли
+
+# Заявки — в append-only журнал на диску (JOURNAL_DIR; пусто — без журналу, див. journal.py)
+JOURNAL = journal_from_env("orders")
+
+# Сповіщення операторам про заявки — дайджестами у NOTIFY_CHATS (див. notifier.py)
+NOTIFY = notifier_from_env(api, metrics=METRICS)
 
-# Проста памʼять для MVP (не зберігає дані назавжди)
-USER_STATE = {}  # user_id -> "awaiting_order"
+# Фото/відео/документи до заявки — у фоні на диск (MEDIA_DIR; пусто — не приймаються, див. media.py)
+MEDIA = media_from_env(BOT_TOKEN, journal=JOURNAL, usage=STORE.mapping("media_usage"), metrics=METRICS)
+
+# callback_data -> хендлер (див. router.py)
+ROUTER = Router()
 
 # =========================
 # TEXTS (UA для клієнтів)
@@ -117,89 +160,111 @@ def kb_order_actions() -> InlineKeyboardMarkup:
     kb.add(InlineKeyboardButton("↩️ Назад", callback_data="back"))
     return kb
 
+# =========================
+# SCREENS (текст + серіалізована клавіатура, збираються один раз — див. screens.py)
+# =========================
+SCREENS = ScreenRegistry()
+SCREENS.add("home", SCREEN_HOME, kb_main())
+SCREENS.add("how_it_works", SCREEN_HOW_DIAG, kb_back())
+SCREENS.add("prices", SCREEN_PACKAGES, kb_back())
+SCREENS.add("help", SCREEN_HELP, kb_back())
+SCREENS.add("task", SCREEN_TASK, kb_back())
+SCREENS.add("order", SCREEN_ORDER, kb_order_actions())
+SCREENS.add("order_template", f"<code>{ORDER_TEMPLATE}</code>")
+SCREENS.add("ack_order", ACK_ORDER)
+SCREENS.add("media_ok", "📎 Файл додано до заявки. Надішли ще або напиши опис — і заявка піде майстру.")
+SCREENS.add("media_too_big", "⚠️ Файл завеликий. Надішли менший (до 20 МБ) або посилання на нього.")
+SCREENS.add("media_quota", "⚠️ Ліміт файлів до заявки вичерпано. Опиши проблему текстом — майстер уточнить.")
+SCREENS.add("media_off", "📎 Файли зараз не приймаються. Опиши проблему текстом — майстер уточнить деталі.")
+SCREENS.add("flood", "⏳ Занадто часто — зачекай кілька секунд і повтори.")
+SCREENS.add("fallback", (
+    "Прийняв 👍\n"
+    "Щоб почати — натисни /start або обери пункт меню.\n"
+    "Якщо хочеш одразу замовити — натисни «🟢 Замовити / Оплата»."
+))
+
+def notify(text):
+    if NOTIFY is not None:
+        NOTIFY.notify(text)
+
+def close_order_ref(user_id):
+    """Заявка надіслана чи покинута: ref більше не потрібен, квота вкладень на нього — теж."""
+    ref = ORDER_REF.pop(user_id, None)
+    if ref is not None and MEDIA is not None:
+        MEDIA.finish(ref)
+    return ref
+
+def send_screen(chat_id, screen, **kwargs):
+    api.send_message(chat_id, screen.text, parse_mode=screen.parse_mode,
+                     reply_markup=screen.markup, **kwargs)
+
+def show_screen(call, screen):
+    api.edit_message_text(
+        text=screen.text,
+        chat_id=call.message.chat.id,
+        message_id=call.message.message_id,
+        parse_mode=screen.parse_mode,
+        reply_markup=screen.markup
+    )
+    api.answer_callback_query(call.id)
+
 # =========================
 # HANDLERS
 # =========================
 @bot.message_handler(commands=["start"])
+@METRICS.timed("cmd_start")
 def cmd_start(message):
     USER_STATE.pop(message.from_user.id, None)
-    bot.send_message(message.chat.id, SCREEN_HOME, reply_markup=kb_main())
+    close_order_ref(message.from_user.id)
+    send_screen(message.chat.id, SCREENS["home"])
+
+@ROUTER.callback("how_it_works")
+def cb_how_it_works(call):
+    show_screen(call, SCREENS["how_it_works"])
+
+@ROUTER.callback("prices")
+def cb_prices(call):
+    show_screen(call, SCREENS["prices"])
+
+@ROUTER.callback("help")
+def cb_help(call):
+    show_screen(call, SCREENS["help"])
+
+@ROUTER.callback("task")
+def cb_task(call):
+    show_screen(call, SCREENS["task"])
+
+@ROUTER.callback("order")
+def cb_order(call):
+    USER_STATE[call.from_user.id] = "awaiting_order"
+    notify(f"✍️ {user_label(call.from_user)} оформлює заявку")
+    show_screen(call, SCREENS["order"])
+
+@ROUTER.callback("order_template")
+def cb_order_template(call):
+    USER_STATE[call.from_user.id] = "awaiting_order"
+    notify(f"✍️ {user_label(call.from_user)} взяв шаблон заявки")
+    send_screen(call.message.chat.id, SCREENS["order_template"])
+    api.answer_callback_query(call.id)
+
+@ROUTER.callback("back")
+def cb_back(call):
+    USER_STATE.pop(call.from_user.id, None)
+    close_order_ref(call.from_user.id)
+    show_screen(call, SCREENS["home"])
+
+@ROUTER.default
+def cb_unknown(call):
+    api.answer_callback_query(call.id, "Ок")
 
 @bot.callback_query_handler(func=lambda call: True)
 def callbacks(call):
     data = (call.data or "").strip()
-
-    if data == "how_it_works":
-        bot.edit_message_text(
-            text=SCREEN_HOW_DIAG,
-            chat_id=call.message.chat.id,
-            message_id=call.message.message_id,
-            reply_markup=kb_back()
-        )
-        bot.answer_callback_query(call.id)
-        return
-
-    if data == "prices":
-        bot.edit_message_text(
-            text=SCREEN_PACKAGES,
-            chat_id=call.message.chat.id,
-            message_id=call.message.message_id,
-            reply_markup=kb_back()
-        )
-        bot.answer_callback_query(call.id)
-        return
-
-    if data == "help":
-        bot.edit_message_text(
-            text=SCREEN_HELP,
-            chat_id=call.message.chat.id,
-            message_id=call.message.message_id,
-            reply_markup=kb_back()
-        )
-        bot.answer_callback_query(call.id)
-        return
-
-    if data == "task":
-        bot.edit_message_text(
-            text=SCREEN_TASK,
-            chat_id=call.message.chat.id,
-            message_id=call.message.message_id,
-            reply_markup=kb_back()
-        )
-        bot.answer_callback_query(call.id)
-        return
-
-    if data == "order":
-        USER_STATE[call.from_user.id] = "awaiting_order"
-        bot.edit_message_text(
-            text=SCREEN_ORDER,
-            chat_id=call.message.chat.id,
-            message_id=call.message.message_id,
-            reply_markup=kb_order_actions()
-        )
-        bot.answer_callback_query(call.id)
-        return
-
-    if data == "order_template":
-        USER_STATE[call.from_user.id] = "awaiting_order"
-        bot.send_message(call.message.chat.id, f"<code>{ORDER_TEMPLATE}</code>")
-        bot.answer_callback_query(call.id)
-        return
-
-    if data == "back":
-        USER_STATE.pop(call.from_user.id, None)
-        bot.edit_message_text(
-            text=SCREEN_HOME,
-            chat_id=call.message.chat.id,
-            message_id=call.message.message_id,
-            reply_markup=kb_main()
-        )
-        bot.answer_callback_query(call.id)
-        return
-
-    bot.answer_callback_query(call.id, "Ок")
+    with METRICS.handler_latency.time("callbacks", ROUTER.route_label(data)):
+        ROUTER.dispatch_callback(call)
 
 @bot.message_handler(func=lambda m: True, content_types=["text"])
+@METRICS.timed("any_text")
 def any_text(message):
     # Якщо користувач у режимі "оформлення заявки" — приймаємо будь-який текст як заявку
     state = USER_STATE.get(message.from_user.id)
@@ -211,46 +276,158 @@ def any_text(message):
 
     if state == "awaiting_order":
         USER_STATE.pop(message.from_user.id, None)
-        bot.reply_to(message, ACK_ORDER)
+        # ref привʼязує до заявки файли, надіслані до тексту (записи "media" в журналі)
+        ref = close_order_ref(message.from_user.id) or f"{message.from_user.id}-{message.message_id}"
+        if JOURNAL is not None:
+            # лише ставить у чергу: fsync робить потік журналу, відповідь не чекає
+            JOURNAL.append("order", message.from_user.id, chat_id=message.chat.id,
+                           username=message.from_user.username or "", text=text, ref=ref)
+        notify(f"🆕 Заявка від {user_label(message.from_user)}:\n{text}")
+        send_screen(message.chat.id, SCREENS["ack_order"], reply_to_message_id=message.message_id)
         return
 
     # Якщо не в режимі заявки — відповідаємо нейтрально
-    bot.reply_to(
-        message,
-        "Прийняв 👍\n"
-        "Щоб почати — натисни /start або обери пункт меню.\n"
-        "Якщо хочеш одразу замовити — натисни «🟢 Замовити / Оплата»."
-    )
+    send_screen(message.chat.id, SCREENS["fallback"], reply_to_message_id=message.message_id)
+
+def awaiting_order(message) -> bool:
+    return USER_STATE.get(message.from_user.id) == "awaiting_order"
+
+if MEDIA is not None:
+    @bot.message_handler(content_types=MEDIA_TYPES)
+    @METRICS.timed("any_media")
+    def any_media(message):
+        uid = message.from_user.id
+        if not awaiting_order(message):
+            send_screen(message.chat.id, SCREENS["fallback"], reply_to_message_id=message.message_id)
+            return
+
+        ref = ORDER_REF.get(uid)
+        first = ref is None
+        if first:
+            ref = ORDER_REF[uid] = f"{uid}-{message.message_id}"
+        status = MEDIA.accept(uid, message, ref)
+        if status in ("too_big", "quota"):
+            send_screen(message.chat.id, SCREENS["media_" + status], reply_to_message_id=message.message_id)
+        elif first:
+            # на альбом з кількох файлів — одна відповідь
+            send_screen(message.chat.id, SCREENS["media_ok"], reply_to_message_id=message.message_id)
+else:
+    # вкладення вимкнені (MEDIA_DIR пусто): поза заявкою — ігноруємо, як і раніше,
+    # а під час заявки підказуємо описати все текстом
+    @bot.message_handler(content_types=MEDIA_TYPES, func=awaiting_order)
+    @METRICS.timed("any_media")
+    def media_off(message):
+        send_screen(message.chat.id, SCREENS["media_off"], reply_to_message_id=message.message_id)
 
 # =========================
 # WEBHOOK (Render Web Service)
 # =========================
-@app.get("/")
-def health():
-    return "OK", 200
-
-@app.post("/webhook")
-def webhook():
-    update = telebot.types.Update.de_json(request.data.decode("utf-8"))
+def handle_update(update):
     bot.process_new_updates([update])
+
+UPDATES = (
+    UpdateQueue(handle_update, workers=UPDATE_WORKERS, maxsize=UPDATE_QUEUE_SIZE)
+    if UPDATE_WORKERS > 0 and ENGINE != "async" else None
+)
+# Повторні доставки того самого update_id відкидаються ще до хендлерів
+DEDUP = deduper_from_env()
+# Флуд від одного користувача (FLOOD_LIMITS, FLOOD_REPEAT; типово вимкнено) — теж до хендлерів, див. flood.py.
+# Хто саме пише заявку, не обмежується: альбом фото + текст заявки не мають загубитись.
+FLOOD = flood_from_env(metrics=METRICS, answer=api.answer_callback_query,
+                       notice=lambda chat_id: api.send_message(chat_id, SCREENS["flood"].text),
+                       exempt=lambda kind, user_id: USER_STATE.get(user_id) == "awaiting_order")
+# Запис сирих апдейтів для bench/replay.py (RECORD_DIR; пусто -> вимкнено), див. recorder.py
+RECORDER = recorder_from_env(metrics=METRICS)
+
+if UPDATES is not None:
+    METRICS.watch_updates(UPDATES)
+METRICS.watch_outbound(api)
+METRICS.watch_store(STORE)
+METRICS.watch_dedup(DEDUP)
+if JOURNAL is not None:
+    METRICS.watch_journal(JOURNAL)
+
+def _webhook(data):
+    if RECORDER is not None:
+        RECORDER.record(data)
+    try:
+        update = telebot.types.Update.de_json(data.decode("utf-8"))
+    except (ValueError, KeyError):
+        return "Bad Request", 400
+    if update is None:
+        return "Bad Request", 400
+    if DEDUP.seen(update.update_id):
+        return "OK", 200
+    if FLOOD is not None and not FLOOD.allow(update):
+        return "OK", 200
+
+    if UPDATES is None:
+        handle_update(update)
+    elif not UPDATES.put(update):
+        # Черга повна -> Telegram повторить доставку пізніше; повтор не має вважатись дублем
+        DEDUP.forget(update.update_id)
+        return "Busy", 503
     return "OK", 200
 
+def make_app():
+    """Flask-застосунок: /, /metrics, /webhook. Flask імпортується лише тут — polling і async без нього."""
+    from flask import Flask, Response, request
+
+    flask_app = Flask(__name__)
+
+    @flask_app.get("/")
+    def health():
+        return "OK", 200
+
+    @flask_app.get("/metrics")
+    def metrics():
+        return Response(METRICS.registry.render(), content_type=CONTENT_TYPE)
+
+    @flask_app.post("/webhook")
+    def webhook():
+        started = time.perf_counter()
+        body, status = _webhook(request.data)
+        METRICS.webhook_latency.observe(time.perf_counter() - started, str(status))
+        return body, status
+
+    return flask_app
+
+def __getattr__(name):
+    # bot.app (gunicorn bot:app, бенчмарки) створюється при першому зверненні
+    if name == "app":
+        global app
+        app = make_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 def setup_webhook():
-    bot.remove_webhook()
     if not WEBHOOK_URL:
         raise RuntimeError("WEBHOOK_URL is missing. Set it like https://<your-render-domain>")
-    bot.set_webhook(url=f"{WEBHOOK_URL}/webhook")
+    # той самий URL і налаштування, що вже стоять у Telegram -> нічого не перереєстровуємо
+    ensure_webhook(bot, f"{WEBHOOK_URL}/webhook", **webhook_settings_from_env())
 
 # =========================
 # ENTRYPOINT
 # =========================
 if __name__ == "__main__":
+    if ENGINE == "async":
+        import async_engine
+        if WEBHOOK_URL:
+            setup_webhook()
+            async_engine.run_webhook(sys.modules[__name__], port=PORT)
+        else:
+            print("Starting bot in polling mode (asyncio)...")
+            async_engine.run_polling(sys.modules[__name__])
     # Якщо WEBHOOK_URL задано — webhook (Web Service)
-    if WEBHOOK_URL:
+    elif WEBHOOK_URL:
         setup_webhook()
-        app.run(host="0.0.0.0", port=PORT)
+        if UPDATES is not None:
+            drain_on_signal(UPDATES, SHUTDOWN_TIMEOUT)
+        make_app().run(host="0.0.0.0", port=PORT)
     else:
-        # Якщо WEBHOOK_URL нема — polling (Background Worker)
+        # Якщо WEBHOOK_URL нема — polling (Background Worker), див. poller.py
         print("Starting bot in polling mode (no WEBHOOK_URL)...")
-        bot.remove_webhook()
-        bot.infinity_polling(timeout=60, long_polling_timeout=60)
\ No newline at end of file
+        # вебхук, якщо ще стоїть, Poller зніме сам (getUpdates -> 409)
+        poller = poller_from_env(bot, deduper=DEDUP, limiter=FLOOD, recorder=RECORDER, metrics=METRICS)
+        drain_on_signal(poller, SHUTDOWN_TIMEOUT)
+        poller.run()
\ No newline at end of file
@@ -11,24 +11,73 @@ AI-Майстер — Bot V1 (окремий файл)
 """
 
 import os
+import sys
 import time
 import telebot
 from telebot import types
 
+from diagnosis import classifier_from_env
+from flood import flood_from_env
+from funnel import funnel_from_env
+from journal import journal_from_env
+from media import MEDIA_TYPES, media_from_env
+from metrics import BotMetrics, serve_metrics
+from notifier import notifier_from_env, user_label
+from poller import poller_from_env
+from recorder import recorder_from_env
+from router import Router
+from screens import ScreenRegistry
+from state_store import open_store
+from tg_client import client_from_env
+from update_queue import drain_on_signal
+
 # ======= 0) TOKEN =======
 BOT_TOKEN = os.getenv("BOT_TOKEN", "").strip()
+ENGINE = os.getenv("ENGINE", "sync").strip().lower()  # "async" -> asyncio + aiohttp (async_engine.py)
 if not BOT_TOKEN:
     raise RuntimeError("BOT_TOKEN не заданий. Додай змінну середовища BOT_TOKEN.")
 
 bot = telebot.TeleBot(BOT_TOKEN, parse_mode=None)
-
-# ======= 1) RAM-стани V1 (простий FSM) =======
-PENDING_DIAG = set()         # user_id очікуємо 1 повідомлення з описом проблеми
-CHOSEN_PACKAGE = {}          # user_id -> "STANDARD"/"PRO"/"PRO_WIN"
-DIAG_TEXT = {}               # user_id -> текст діагностики від клієнта
-HAS_CONSENT = set()          # user_id погодився з політикою/умовами
-HAS_ACCESS = set()           # user_id надав техдоступ (поки як статус, без перевірки)
-WORK_STARTED = set()         # user_id -> майстер працює
+# Prometheus-метрики (див. metrics.py); /metrics на METRICS_PORT, якщо він заданий
+METRICS = BotMetrics()
+METRICS_PORT = os.getenv("METRICS_PORT", "").strip()
+# Усі виклики Telegram API — через чергу з лімітами (див. tg_client.py / async_engine.py)
+if ENGINE == "async":
+    from async_engine import async_client_from_env
+    api = async_client_from_env(BOT_TOKEN, metrics=METRICS)
+else:
+    api = client_from_env(bot, metrics=METRICS)
+# Флуд від одного користувача відкидається до хендлерів (FLOOD_LIMITS, FLOOD_REPEAT; типово вимкнено) — див. flood.py.
+# Хто саме описує проблему (PENDING_DIAG, нижче), не обмежується — опис не має загубитись.
+FLOOD = flood_from_env(metrics=METRICS, answer=api.answer_callback_query,
+                       notice=lambda chat_id: api.send_message(chat_id, SCREEN_FLOOD),
+                       exempt=lambda kind, user_id: user_id in PENDING_DIAG)
+# Запис сирих апдейтів для bench/replay.py (RECORD_DIR; пусто -> вимкнено) — див. recorder.py
+RECORDER = recorder_from_env(metrics=METRICS)
+
+# ======= 1) Стани V1 (простий FSM) =======
+# LRU-кеш + SQLite (STATE_DB), з TTL для неактивних сесій — див. state_store.py
+STORE = open_store()
+PENDING_DIAG = STORE.flags("pending_diag")        # user_id очікуємо 1 повідомлення з описом проблеми
+CHOSEN_PACKAGE = STORE.mapping("chosen_package")  # user_id -> "STANDARD"/"PRO"/"PRO_WIN"
+DIAG_TEXT = STORE.mapping("diag_text")            # user_id -> текст діагностики від клієнта
+DIAG_REF = STORE.mapping("diag_ref")              # user_id -> ref діагностики, до якої вже прикріплені файли
+HAS_CONSENT = STORE.flags("has_consent")          # user_id погодився з політикою/умовами
+HAS_ACCESS = STORE.flags("has_access")            # user_id надав техдоступ (поки як статус, без перевірки)
+WORK_STARTED = STORE.flags("work_started")        # user_id -> майстер працює
+
+# Діагностики — ще й в append-only журнал на диску (JOURNAL_DIR; пусто — без журналу, див. journal.py)
+JOURNAL = journal_from_env("diag")
+
+# Оператори дізнаються про діагностики, вибір пакета і оплату з NOTIFY_CHATS (див. notifier.py)
+NOTIFY = notifier_from_env(api, metrics=METRICS)
+
+# Фото/відео/документи до діагностики — у фоні на диск (MEDIA_DIR; пусто — не приймаються, див. media.py)
+MEDIA = media_from_env(BOT_TOKEN, journal=JOURNAL, usage=STORE.mapping("media_usage"), metrics=METRICS)
+
+# Воронка діагностика -> оплата: події й унікальні користувачі по кроках, GET /funnel (див. funnel.py)
+FUNNEL_STEPS = ("diag_start", "description", "package", "consent", "access", "working", "payment")
+FUNNEL = funnel_from_env(FUNNEL_STEPS, metrics=METRICS)
 
 
 # ======= 2) Тексти екранів (V1) =======
@@ -60,6 +109,8 @@ SCREEN_DIAG_RESULT_TEMPLATE = (
     "Щоб перейти до ремонту — обери пакет нижче."
 )
 
+SCREEN_FLOOD = "⏳ Занадто часто — зачекай кілька секунд і повтори."
+
 SCREEN_CONSENT_SHORT = (
     "🔐 Умови та конфіденційність (коротко)\n\n"
     "• Я працюю тільки для ремонту/діагностики.\n"
@@ -104,6 +155,16 @@ PACKAGES_TEXT = (
     "✅ PRO + Windows — (PRO + ліцензія Windows)\n"
     "• якщо без перевстановлення/оновлення Windows не вирішити\n"
 )
+SCREEN_PACKAGES = PACKAGES_TEXT
+
+SCREEN_HOW_DIAG = (
+    "ℹ️ Як проходить діагностика\n\n"
+    "1) Ти описуєш проблему одним повідомленням\n"
+    "2) AI-Майстер робить попередній висновок\n"
+    "3) Ти обираєш пакет і погоджуєшся з умовами\n"
+    "4) Надаєш доступ — далі я все роблю сам\n\n"
+    "Натисни «Назад», щоб повернутись."
+)
 
 # ======= 4) Клавіатури =======
 
@@ -161,37 +222,102 @@ def kb_payment():
     return kb
 
 
-# ======= 5) Логіка (V1) =======
+# ======= 5) Екрани (текст + серіалізована клавіатура, збираються один раз — див. screens.py) =======
+SCREENS = ScreenRegistry()
+SCREENS.add("start", SCREEN_START, kb_main())
+SCREENS.add("diag_request", SCREEN_DIAG_REQUEST, kb_back())
+SCREENS.add("diag_result", SCREEN_DIAG_RESULT_TEMPLATE, kb_packages())
+SCREENS.add("how_it_works", SCREEN_HOW_DIAG, kb_back())
+SCREENS.add("prices", SCREEN_PACKAGES, kb_packages())
+SCREENS.add("help", "🆘 Напиши /start щоб повернутись у меню", kb_back())
+SCREENS.add("consent", SCREEN_CONSENT_SHORT, kb_consent())
+SCREENS.add("access", SCREEN_ACCESS_REQUEST, kb_access())
+SCREENS.add("working", SCREEN_WORKING, kb_payment())
+SCREENS.add("payment", SCREEN_PAYMENT, kb_back())
+
+
+def notify(text):
+    if NOTIFY is not None:
+        NOTIFY.notify(text)
+
+
+def close_diag_ref(uid):
+    """Діагностику надіслано чи покинуто: ref більше не потрібен, квота вкладень на нього — теж."""
+    ref = DIAG_REF.pop(uid, None)
+    if ref is not None and MEDIA is not None:
+        MEDIA.finish(ref)
+    return ref
+
+
+def track(step, uid):
+    if FUNNEL is not None:
+        FUNNEL.record(step, uid)
+
+
+def send_screen(chat_id, screen):
+    api.send_message(chat_id, screen.text, parse_mode=screen.parse_mode, reply_markup=screen.markup)
+
+
+def show_screen(call, screen):
+    api.edit_message_text(
+        text=screen.text,
+        chat_id=call.message.chat.id,
+        message_id=call.message.message_id,
+        parse_mode=screen.parse_mode,
+        reply_markup=screen.markup
+    )
+    api.answer_callback_query(call.id)
+
+
+# ======= 6) Логіка (V1) =======
+# Пункти меню (текст і callback_data) реєструються в ROUTER — див. router.py
+ROUTER = Router()
+# Правила діагностики — diag_rules.json (DIAG_RULES), перечитуються на льоту
+CLASSIFIER = classifier_from_env()
+
 
 @bot.message_handler(commands=["start"])
+@METRICS.timed("cmd_start")
 def cmd_start(message):
-    bot.send_message(message.chat.id, SCREEN_START, reply_markup=kb_main())
+    close_diag_ref(message.from_user.id)         # файли покинутої діагностики не тягнемо в наступну
+    send_screen(message.chat.id, SCREENS["start"])
+
+
+# 🧰 Почати діагностику
+@ROUTER.text(starts=["🧰"], contains=["Почати діагностику"])
+def txt_diag_start(message):
+    PENDING_DIAG.add(message.from_user.id)
+    track("diag_start", message.from_user.id)
+    api.send_message(message.chat.id, SCREEN_DIAG_REQUEST)
+
+
+# ℹ️ Як проходить діагностика
+@ROUTER.text(starts=["ℹ️"], contains=["Як проходить діагностика"])
+def txt_how_it_works(message):
+    api.send_message(message.chat.id, SCREEN_HOW_DIAG)
+
+
+# 💰 Вартість
+@ROUTER.text(starts=["💰"], contains=["Вартість"])
+def txt_prices(message):
+    api.send_message(message.chat.id, SCREEN_PACKAGES)
+
+
+# 🆘 Допомога
+@ROUTER.text(starts=["🆘"], contains=["Допомога"])
+def txt_help(message):
+    api.send_message(message.chat.id, "🆘 Напиши /start щоб повернутись у меню")
 
 
 @bot.message_handler(func=lambda m: True)
+@METRICS.timed("on_text")
 def on_text(message):
     uid = message.from_user.id
     raw = (message.text or "").strip()
 
-    # 🧰 Почати діагностику
-    if raw.startswith("🧰") or "Почати діагностику" in raw:
-        PENDING_DIAG.add(uid)
-        bot.send_message(message.chat.id, SCREEN_DIAG_REQUEST)
-        return
-
-    # ℹ️ Як проходить діагностика
-    if raw.startswith("ℹ️") or "Як проходить діагностика" in raw:
-        bot.send_message(message.chat.id, SCREEN_HOW_DIAG)
-        return
-
-    # 💰 Вартість
-    if raw.startswith("💰") or "Вартість" in raw:
-        bot.send_message(message.chat.id, SCREEN_PACKAGES)
-        return
-
-    # 🆘 Допомога
-    if raw.startswith("🆘") or "Допомога" in raw:
-        bot.send_message(message.chat.id, "🆘 Напиши /start щоб повернутись у меню")
+    handler = ROUTER.match_text(raw)
+    if handler is not None:
+        handler(message)
         return
 
     # ====== ДІАГНОСТИКА: чекаємо 1 повідомлення ======
@@ -199,95 +325,156 @@ def on_text(message):
         PENDING_DIAG.discard(uid)
         DIAG_TEXT[uid] = raw
 
-        raw_l = raw.lower()
-        if "брауз" in raw_l or "chrome" in raw_l:
-            summary = "Схоже на проблему з браузером/розширеннями або навантаженням."
-        elif "запуск" in raw_l or "автозапуск" in raw_l:
-            summary = "Схоже на перевантажений автозапуск або системні служби."
-        else:
-            summary = "Схоже на навантаження системи (автозапуск/диск/служби)."
-
-        text = SCREEN_DIAG_RESULT_TEMPLATE.format(summary=summary)
-        bot.send_message(message.chat.id, text, reply_markup=kb_packages())
+        track("description", uid)
+        diagnosis = CLASSIFIER.classify(raw)
+        ref = close_diag_ref(uid) or f"{uid}-{message.message_id}"
+        if JOURNAL is not None:
+            JOURNAL.append("diag", uid, chat_id=message.chat.id,
+                           username=message.from_user.username or "", text=raw,
+                           summary=diagnosis.summary, ref=ref)
+        notify(f"🧰 Діагностика від {user_label(message.from_user)}:\n{raw}\n\n→ {diagnosis.summary}")
+        send_screen(message.chat.id, SCREENS["diag_result"].render(summary=diagnosis.summary))
         return
 
-    bot.send_message(message.chat.id, "Напиши /start щоб відкрити меню ✅")
+    api.send_message(message.chat.id, "Напиши /start щоб відкрити меню ✅")
+
+
+# ====== ВКЛАДЕННЯ: фото/відео/скріни помилок до діагностики ======
+def diag_pending(message) -> bool:
+    return message.from_user.id in PENDING_DIAG
+
+
+if MEDIA is not None:
+    @bot.message_handler(content_types=MEDIA_TYPES)
+    @METRICS.timed("on_media")
+    def on_media(message):
+        uid = message.from_user.id
+        if not diag_pending(message):
+            api.send_message(message.chat.id, "Напиши /start щоб відкрити меню ✅")
+            return
+
+        ref = DIAG_REF.get(uid)
+        first = ref is None
+        if first:
+            ref = DIAG_REF[uid] = f"{uid}-{message.message_id}"
+        status = MEDIA.accept(uid, message, ref)
+        if status == "too_big":
+            api.send_message(message.chat.id, "⚠️ Файл завеликий (до 20 МБ). Опиши проблему текстом.")
+        elif status == "quota":
+            api.send_message(message.chat.id, "⚠️ Ліміт файлів вичерпано. Опиши проблему текстом.")
+        elif first:
+            api.send_message(message.chat.id, "📎 Файл отримав. Тепер опиши проблему одним повідомленням.")
+else:
+    # вкладення вимкнені (MEDIA_DIR пусто): поза діагностикою — ігноруємо, як і раніше,
+    # а під час діагностики просимо описати проблему текстом (а не /start)
+    @bot.message_handler(content_types=MEDIA_TYPES, func=diag_pending)
+    @METRICS.timed("on_media")
+    def media_off(message):
+        api.send_message(message.chat.id, "📎 Файли зараз не приймаються. Опиши проблему текстом одним повідомленням.")
+
+
 # ====== CALLBACKS (InlineKeyboard) ======
 
-@bot.callback_query_handler(func=lambda call: True)
-def on_cb(call):
+# 🧰 Почати діагностику
+@ROUTER.callback("diag_start")
+def cb_diag_start(call):
+    PENDING_DIAG.add(call.from_user.id)
+    track("diag_start", call.from_user.id)
+    show_screen(call, SCREENS["diag_request"])
+
+
+# 💰 Вибір пакета
+@ROUTER.prefix("pkg_")
+def cb_package(call, pkg):
+    CHOSEN_PACKAGE[call.from_user.id] = pkg
+    track("package", call.from_user.id)
+    notify(f"💰 {user_label(call.from_user)} обрав пакет {pkg}")
+    show_screen(call, SCREENS["consent"])
+
+
+# 🔙 Назад у головне меню
+@ROUTER.callback("back")
+def cb_back(call):
+    close_diag_ref(call.from_user.id)
+    show_screen(call, SCREENS["start"])
+
+
+# ℹ️ Як проходить діагностика
+@ROUTER.callback("how_it_works")
+def cb_how_it_works(call):
+    show_screen(call, SCREENS["how_it_works"])
+
+
+# 💰 Пакети
+@ROUTER.callback("prices")
+def cb_prices(call):
+    show_screen(call, SCREENS["prices"])
+
+
+# 🆘 Допомога
+@ROUTER.callback("help")
+def cb_help(call):
+    show_screen(call, SCREENS["help"])
+
+
+# ✅ Згода з умовами
+@ROUTER.callback("consent_yes")
+def cb_consent(call):
+    HAS_CONSENT.add(call.from_user.id)
+    track("consent", call.from_user.id)
+    notify(f"✅ {user_label(call.from_user)} погодився з умовами")
+    show_screen(call, SCREENS["access"])
+
+
+# 🔐 Доступ надано -> майстер працює
+@ROUTER.callback("access_yes")
+def cb_access(call):
     uid = call.from_user.id
-    data = call.data
-
-        # 🧰 Почати діагностику
-    if data == "diag_start":
-        PENDING_DIAG.add(uid)
-        bot.edit_message_text(
-            text=SCREEN_DIAG_REQUEST,
-            chat_id=call.message.chat.id,
-            message_id=call.message.message_id,
-            reply_markup=kb_back()
-        )
-        bot.answer_callback_query(call.id)
-        return
+    HAS_ACCESS.add(uid)
+    WORK_STARTED.add(uid)
+    track("access", uid)
+    track("working", uid)
+    notify(f"🔐 {user_label(call.from_user)} надав доступ — пакет {CHOSEN_PACKAGE.get(uid, '?')}, чекає майстра")
+    show_screen(call, SCREENS["working"])
 
-    # 💰 Вибір пакета
-    if data.startswith("pkg_"):
-        pkg = data.replace("pkg_", "")
-        CHOSEN_PACKAGE[uid] = pkg
-        bot.edit_message_text(
-            text=SCREEN_CONSENT_SHORT,
-            chat_id=call.message.chat.id,
-            message_id=call.message.message_id,
-            reply_markup=kb_consent()
-        )
-        bot.answer_callback_query(call.id)
-    # 🔙 Назад у головне меню
-    if data == "back":
-        bot.edit_message_text(
-            text=SCREEN_START,
-            chat_id=call.message.chat.id,
-            message_id=call.message.message_id,
-            reply_markup=kb_main()
-        )
-        bot.answer_callback_query(call.id)
-        return
 
-    # ℹ️ Як проходить діагностика
-    if data == "how_it_works":
-        bot.edit_message_text(
-            text=SCREEN_HOW_DIAG,
-            chat_id=call.message.chat.id,
-            message_id=call.message.message_id,
-            reply_markup=kb_back()
-        )
-        bot.answer_callback_query(call.id)
-        return
+# 💳 Оплата
+@ROUTER.callback("pay")
+def cb_pay(call):
+    track("payment", call.from_user.id)
+    notify(f"💳 {user_label(call.from_user)} перейшов до оплати (пакет {CHOSEN_PACKAGE.get(call.from_user.id, '?')})")
+    show_screen(call, SCREENS["payment"])
 
-    # 💰 Пакети
-    if data == "prices":
-        bot.edit_message_text(
-            text=SCREEN_PACKAGES,
-            chat_id=call.message.chat.id,
-            message_id=call.message.message_id,
-            reply_markup=kb_packages()
-        )
-        bot.answer_callback_query(call.id)
-        return
 
-    # 🆘 Допомога
-    if data == "help":
-        bot.edit_message_text(
-            text="🆘 Напиши /start щоб повернутись у меню",
-            chat_id=call.message.chat.id,
-            message_id=call.message.message_id,
-            reply_markup=kb_back()
-        )
-        bot.answer_callback_query(call.id)
-        return
+@ROUTER.default
+def cb_unknown(call):
+    api.answer_callback_query(call.id, "Невідома дія")
 
-        bot.answer_callback_query(call.id, "Невідома дія")
 
-    if __name__ == "__main__":
-        print("AI-Майстер V1 запущено…")
-        bot.infinity_polling(timeout=60, long_polling_timeout=60)
\ No newline at end of file
+@bot.callback_query_handler(func=lambda call: True)
+def on_cb(call):
+    data = (call.data or "").strip()
+    with METRICS.handler_latency.time("on_cb", ROUTER.route_label(data)):
+        ROUTER.dispatch_callback(call)
+
+
+METRICS.watch_outbound(api)
+METRICS.watch_store(STORE)
+if JOURNAL is not None:
+    METRICS.watch_journal(JOURNAL)
+
+
+if __name__ == "__main__":
+    if METRICS_PORT:
+        serve_metrics(METRICS.registry, int(METRICS_PORT),
+                      routes={"/funnel": FUNNEL.http_view} if FUNNEL is not None else None)
+    print("AI-Майстер V1 запущено…")
+    if ENGINE == "async":
+        import async_engine
+        async_engine.run_polling(sys.modules[__name__])
+    else:
+        # getUpdates + UpdateQueue + чекпойнт offset (POLL_CHECKPOINT) — див. poller.py;
+        # вебхук, якщо ще стоїть, Poller зніме сам (getUpdates -> 409)
+        poller = poller_from_env(bot, limiter=FLOOD, recorder=RECORDER, metrics=METRICS)
+        drain_on_signal(poller, float(os.getenv("SHUTDOWN_TIMEOUT", "25")))
+        poller.run()
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Відсікання повторних доставок апдейтів (Telegram повторює webhook, якщо ми відповіли повільно).
+
+Останні N update_id тримаються в кільцевому буфері (array) + set:
+перевірка і запис — O(1), памʼять фіксована. Опційно буфер
+зберігається у файл, щоб повтори відсікались і після рестарту.
+"""
+
+import atexit
+import logging
+import os
+import threading
+from array import array
+
+logger = logging.getLogger(__name__)
+
+_EMPTY = -1
+
+
+class UpdateDeduper:
+    def __init__(self, capacity=10000, path=None, persist_interval=5.0):
+        self.capacity = capacity
+        self.path = path
+        self.persist_interval = persist_interval
+
+        self._lock = threading.Lock()
+        self._ring = array("q", [_EMPTY]) * capacity
+        self._pos = 0
+        self._ids = set()
+        self._dirty = False
+
+        self.accepted = 0
+        self.dropped = 0
+
+        if path:
+            self._load()
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._persist_loop, name="dedup-save", daemon=True)
+            self._thread.start()
+
+    def seen(self, update_id) -> bool:
+        """True — це повтор (вже бачили); інакше запамʼятовує id і повертає False."""
+        with self._lock:
+            if update_id in self._ids:
+                self.dropped += 1
+                return True
+            old = self._ring[self._pos]
+            if old != _EMPTY:
+                self._ids.discard(old)
+            self._ring[self._pos] = update_id
+            self._pos = (self._pos + 1) % self.capacity
+            self._ids.add(update_id)
+            self._dirty = True
+            self.accepted += 1
+            return False
+
+    def forget(self, update_id):
+        """Апдейт не прийнято (черга повна, 503) — повтор від Telegram має пройти, а не відсіктись."""
+        with self._lock:
+            if update_id not in self._ids:
+                return
+            self._ids.discard(update_id)
+            self.accepted -= 1
+            # зазвичай це щойно записаний id — шукаємо від кінця кільця
+            for step in range(1, self.capacity + 1):
+                pos = (self._pos - step) % self.capacity
+                if self._ring[pos] == update_id:
+                    self._ring[pos] = _EMPTY
+                    break
+            self._dirty = True
+
+    def __len__(self):
+        return len(self._ids)
+
+    # ---- збереження між рестартами ----
+    def _load(self):
+        try:
+            with open(self.path, "rb") as f:
+                saved = array("q")
+                saved.frombytes(f.read())
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError):
+            logger.warning("dedup: cannot read %s, starting empty", self.path)
+            return
+        # у файлі — id від найстарішого до найновішого
+        for update_id in saved[-self.capacity:]:
+            if update_id != _EMPTY:
+                self.seen(update_id)
+        self.accepted = 0
+        self._dirty = False
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            ordered = self._ring[self._pos:] + self._ring[:self._pos]
+            self._dirty = False
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            ordered.tofile(f)
+        os.replace(tmp, self.path)
+
+    def _persist_loop(self):
+        while not self._stop.wait(self.persist_interval):
+            try:
+                self.save()
+            except OSError:
+                logger.exception("dedup: save failed")
+
+    def close(self):
+        if self.path:
+            self._stop.set()
+            self.save()
+
+
+def deduper_from_env() -> UpdateDeduper:
+    """DEDUP_SIZE — скільки останніх update_id памʼятати; DEDUP_FILE — куди зберігати (пусто -> ні)."""
+    deduper = UpdateDeduper(
+        capacity=int(os.getenv("DEDUP_SIZE", "10000")),
+        path=os.getenv("DEDUP_FILE", "").strip() or None,
+    )
+    atexit.register(deduper.close)
+    return deduper
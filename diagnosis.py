@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+Класифікатор опису проблеми для AI-діагностики (bot_ai_master_v1).
+
+Правила лежать у JSON (diag_rules.json або DIAG_RULES):
+    {
+      "default": {"summary": "...", "package": "STANDARD"},
+      "rules": [
+        {"id": "browser", "stems": ["брауз", "chrome"], "keywords": ["edge"],
+         "weight": 3, "summary": "...", "package": "STANDARD"}
+      ]
+    }
+- stems    — підрядок будь-де в тексті ("брауз" -> "браузер", "запуск" -> "автозапуск")
+- keywords — ціле слово
+- weight   — скільки балів дає кожен знайдений (різний) тригер правила
+
+Усі тригери всіх правил компілюються в один автомат Aho-Corasick:
+один прохід по тексту знаходить усі збіги, незалежно від кількості правил.
+Файл перечитується на льоту, коли змінюється його mtime.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "diag_rules.json")
+
+
+class Diagnosis:
+    __slots__ = ("rule_id", "summary", "package", "score")
+
+    def __init__(self, rule_id, summary, package, score):
+        self.rule_id = rule_id
+        self.summary = summary
+        self.package = package
+        self.score = score
+
+    def __repr__(self):
+        return f"<Diagnosis {self.rule_id} score={self.score}>"
+
+
+class Automaton:
+    """Aho-Corasick: trie + fail-посилання; out[node] — усі тригери, що закінчуються у вузлі."""
+
+    def __init__(self, patterns):
+        # patterns: [(текст, payload)]
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [()]
+        self.lengths = {}
+
+        for word, payload in patterns:
+            node = 0
+            for ch in word:
+                nxt = self.goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append(())
+                node = nxt
+            self.out[node] = self.out[node] + ((len(word), payload),)
+
+        # BFS: fail-посилання і злиття виходів
+        queue = list(self.goto[0].values())
+        for node in queue:
+            for ch, nxt in self.goto[node].items():
+                queue.append(nxt)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                target = self.goto[f].get(ch, 0)
+                self.fail[nxt] = target if target != nxt else 0
+                if self.out[self.fail[nxt]]:
+                    self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+        self.alphabet = frozenset(ch for edges in self.goto for ch in edges)
+
+    def iter(self, text):
+        """-> (кінцева позиція, довжина, payload) для кожного збігу, включно з перекриттями."""
+        goto, fail, out, alphabet = self.goto, self.fail, self.out, self.alphabet
+        node = 0
+        for i, ch in enumerate(text):
+            if ch not in alphabet:
+                node = 0
+                continue
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                for length, payload in out[node]:
+                    yield i, length, payload
+
+
+class RuleSet:
+    """Скомпільований, незмінний набір правил."""
+
+    def __init__(self, data):
+        default = data.get("default") or {}
+        self.default = Diagnosis(
+            "default",
+            default.get("summary", "Схоже на навантаження системи (автозапуск/диск/служби)."),
+            default.get("package"),
+            0,
+        )
+        self.rules = []
+        patterns = []
+        for index, rule in enumerate(data.get("rules", [])):
+            self.rules.append(Diagnosis(rule.get("id", str(index)), rule["summary"], rule.get("package"), 0))
+            weight = float(rule.get("weight", 1))
+            for stem in rule.get("stems", ()):
+                patterns.append((stem.lower(), (index, weight, False)))
+            for word in rule.get("keywords", ()):
+                patterns.append((word.lower(), (index, weight, True)))
+        self.automaton = Automaton(patterns)
+        self.pattern_count = len(patterns)
+
+    def classify(self, text: str) -> Diagnosis:
+        text = text.lower()
+        scores = {}
+        seen = set()
+        for end, length, payload in self.automaton.iter(text):
+            index, weight, whole_word = payload
+            if whole_word:
+                start = end - length + 1
+                if (start > 0 and text[start - 1].isalnum()) or (end + 1 < len(text) and text[end + 1].isalnum()):
+                    continue
+            key = (text[end - length + 1:end + 1], index)
+            if key in seen:
+                continue
+            seen.add(key)
+            scores[index] = scores.get(index, 0.0) + weight
+
+        if not scores:
+            return self.default
+        # найбільший бал; при рівності — правило, що стоїть у файлі раніше
+        best = min(scores, key=lambda i: (-scores[i], i))
+        rule = self.rules[best]
+        return Diagnosis(rule.rule_id, rule.summary, rule.package, scores[best])
+
+
+class Classifier:
+    """RuleSet з файлу + перезавантаження при зміні файлу (перевірка не частіше check_interval)."""
+
+    def __init__(self, path=DEFAULT_RULES_PATH, check_interval=2.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._next_check = 0.0
+        self.rules = RuleSet({})
+        self.reload()
+
+    def reload(self) -> bool:
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            with open(self.path, encoding="utf-8") as f:
+                rules = RuleSet(json.load(f))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.error("diag rules: cannot load %s: %s (keeping previous rules)", self.path, e)
+            return False
+        self.rules = rules
+        self._mtime = mtime
+        logger.info("diag rules: loaded %d rules / %d triggers from %s",
+                    len(rules.rules), rules.pattern_count, self.path)
+        return True
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now < self._next_check or not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._next_check = now + self.check_interval
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                return
+            if mtime != self._mtime:
+                self.reload()
+        finally:
+            self._lock.release()
+
+    def classify(self, text: str) -> Diagnosis:
+        self._maybe_reload()
+        return self.rules.classify(text)
+
+
+def classifier_from_env() -> Classifier:
+    """DIAG_RULES — шлях до файлу правил (за замовчуванням diag_rules.json поруч із ботом)."""
+    return Classifier(os.getenv("DIAG_RULES", "").strip() or DEFAULT_RULES_PATH)
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Захист від флуду: зайві апдейти одного користувача відкидаються ще до хендлерів,
+тож не їдять ні воркерів, ні ліміти Telegram API на відповіді.
+
+- вмикається явно (як журнал, вкладення і сповіщення): FLOOD_LIMITS і/або FLOOD_REPEAT
+- ліміт на тип апдейта: FLOOD_LIMITS="message=12/10,callback_query=20/10" —
+  не більше 12 повідомлень за 10 с від одного користувача; понад ліміт користувач
+  раз за вікно отримує notice(chat_id) («занадто часто»), а не тишу
+- ковзне вікно рахується наближено двома лічильниками (поточне і попереднє
+  фіксоване вікно, попереднє — з вагою частки, що ще «в вікні»): три числа на
+  користувача+тип замість списку часів кожного апдейта
+- повторні натискання тієї самої кнопки того самого повідомлення за FLOOD_REPEAT с
+  зводяться до одного: обробляється (і отримує відповідь) лише перше
+- памʼять обмежена: памʼятаються FLOOD_USERS останніх активних пар користувач+тип,
+  найдавніші викидаються
+- exempt(тип, user_id) -> True: не обмежувати (напр. користувач саме пише заявку —
+  альбом фото + текст заявки не мають загубитись)
+- перевірка робиться після дедуплікації: повтор доставки не рахується двічі
+- на відкинутий callback_query все одно йде answer_callback_query (answer=...),
+  інакше в кнопки у клієнта крутиться годинник, поки Telegram не здасться
+
+    FLOOD = flood_from_env(metrics=METRICS, answer=api.answer_callback_query,
+                           notice=lambda chat_id: api.send_message(chat_id, "⏳ Занадто часто..."),
+                           exempt=lambda kind, user_id: USER_STATE.get(user_id) == "awaiting_order")
+    if FLOOD is not None and not FLOOD.allow(update):
+        return "OK", 200
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# поля Update, від яких є користувач (channel_post тощо не обмежуємо)
+UPDATE_FIELDS = ("message", "edited_message", "callback_query", "inline_query",
+                 "chosen_inline_result", "shipping_query", "pre_checkout_query")
+
+
+def _chat_id(obj):
+    chat = getattr(obj, "chat", None)
+    return chat.id if chat is not None else None
+
+
+def update_user(update):
+    """telebot Update -> (тип, user_id, ключ кнопки для callback або None); (None, None, None) — не обмежується."""
+    for field in UPDATE_FIELDS:
+        obj = getattr(update, field, None)
+        if obj is None:
+            continue
+        user = obj.from_user
+        if user is None:
+            return None, None, None
+        if field == "callback_query":
+            return field, user.id, (obj.data, obj.message.message_id if obj.message else None)
+        return field, user.id, None
+    return None, None, None
+
+
+def raw_update_user(update: dict):
+    """update_user для сирого JSON (фронт shard.py не будує telebot-обʼєкти)."""
+    for field in UPDATE_FIELDS:
+        obj = update.get(field)
+        if not obj:
+            continue
+        user = obj.get("from")
+        if not user:
+            return None, None, None
+        if field == "callback_query":
+            message = obj.get("message") or {}
+            return field, user["id"], (obj.get("data"), message.get("message_id"))
+        return field, user["id"], None
+    return None, None, None
+
+
+class FloodLimiter:
+    def __init__(self, limits: dict, repeat_window=1.0, capacity=50000, answer=None, notice=None, exempt=None):
+        self.limits = limits                  # тип -> (апдейтів, секунд)
+        self.repeat_window = repeat_window
+        self.capacity = capacity
+        self.answer = answer                  # answer(callback_query_id) — не блокує (черга клієнта)
+        self.notice = notice                  # notice(chat_id) — «занадто часто», раз за вікно ліміту
+        self.exempt = exempt                  # exempt(тип, user_id) -> True: не обмежувати
+
+        self._lock = threading.Lock()
+        # (user_id, тип) -> [номер вікна, у попередньому, у поточному, остання кнопка, коли натиснута,
+        #                    вікно, у якому вже надіслано notice]
+        self._entries = OrderedDict()
+
+        self.dropped = {}                     # (тип, "rate"/"repeat") -> скільки відкинуто
+
+    def __len__(self):
+        return len(self._entries)
+
+    def allow(self, update) -> bool:
+        allowed, notice = self._check(*update_user(update))
+        if allowed:
+            return True
+        if update.callback_query is not None:
+            self._answer(update.callback_query.id)
+        elif notice:
+            self._notice(_chat_id(update.message or update.edited_message))
+        return False
+
+    def allow_raw(self, update: dict) -> bool:
+        allowed, notice = self._check(*raw_update_user(update))
+        if allowed:
+            return True
+        if update.get("callback_query"):
+            self._answer(update["callback_query"].get("id"))
+        elif notice:
+            message = update.get("message") or update.get("edited_message") or {}
+            self._notice((message.get("chat") or {}).get("id"))
+        return False
+
+    def _notice(self, chat_id):
+        if self.notice is None or chat_id is None:
+            return
+        try:
+            self.notice(chat_id)
+        except Exception:
+            logger.exception("flood: notice failed")
+
+    def _answer(self, callback_query_id):
+        """Порожня відповідь на відкинуте натискання: прибирає годинник з кнопки, хендлер не запускається."""
+        if self.answer is None or callback_query_id is None:
+            return
+        try:
+            self.answer(callback_query_id)
+        except Exception:
+            logger.exception("flood: answer_callback_query failed")
+
+    def check(self, kind, user_id, button=None, now=None) -> bool:
+        """True — обробляти; False — відкинути."""
+        return self._check(kind, user_id, button, now)[0]
+
+    def _check(self, kind, user_id, button=None, now=None):
+        """-> (обробляти?, надіслати notice?) ; notice — перше відкидання за ліміт у цьому вікні."""
+        limit = self.limits.get(kind)
+        if user_id is None or (limit is None and (button is None or not self.repeat_window)):
+            return True, False
+        if self.exempt is not None and self.exempt(kind, user_id):
+            return True, False
+        now = time.monotonic() if now is None else now
+        key = (user_id, kind)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = [0, 0, 0, None, 0.0, -1]
+                if len(self._entries) > self.capacity:
+                    self._entries.popitem(last=False)
+            else:
+                self._entries.move_to_end(key)
+
+            if button is not None and self.repeat_window:
+                if entry[3] == button and now - entry[4] < self.repeat_window:
+                    return self._drop(kind, "repeat"), False
+                entry[3], entry[4] = button, now
+
+            if limit is None:
+                return True, False
+            count, window = limit
+            index = int(now // window)
+            if index != entry[0]:
+                entry[1] = entry[2] if index == entry[0] + 1 else 0
+                entry[0], entry[2] = index, 0
+            estimate = entry[1] * (1.0 - (now % window) / window) + entry[2]
+            if estimate >= count:
+                first = entry[5] != index
+                entry[5] = index
+                return self._drop(kind, "rate"), first
+            entry[2] += 1
+            return True, False
+
+    def _drop(self, kind, reason) -> bool:
+        key = (kind, reason)
+        self.dropped[key] = self.dropped.get(key, 0) + 1
+        return False
+
+
+def parse_limits(spec: str) -> dict:
+    """ "message=12/10,callback_query=20/10" -> {"message": (12, 10.0), ...} """
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        kind, _, rule = item.partition("=")
+        count, _, window = rule.partition("/")
+        kind = kind.strip()
+        if kind not in UPDATE_FIELDS:
+            raise RuntimeError(f"FLOOD_LIMITS: unknown update type {kind!r}")
+        limits[kind] = (int(count), float(window or 1))
+    return limits
+
+
+def flood_from_env(metrics=None, answer=None, notice=None, exempt=None):
+    """
+    FLOOD_LIMITS (тип=апдейтів/секунд через кому, напр. "message=12/10,callback_query=20/10"),
+    FLOOD_REPEAT (с; 0 -> не зводити повторні натискання), FLOOD_USERS.
+    Типово обидва пусті -> без обмежень (None).
+    answer — answer_callback_query клієнта: відповідь на відкинуті натискання;
+    notice(chat_id) — попередження про ліміт; exempt(тип, user_id) — кого не обмежувати.
+    """
+    limits = parse_limits(os.getenv("FLOOD_LIMITS", ""))
+    repeat = float(os.getenv("FLOOD_REPEAT", "0"))
+    if not limits and not repeat:
+        return None
+    limiter = FloodLimiter(limits, repeat_window=repeat, capacity=int(os.getenv("FLOOD_USERS", "50000")),
+                           answer=answer, notice=notice, exempt=exempt)
+    if metrics is not None:
+        metrics.watch_flood(limiter)
+    return limiter
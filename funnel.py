@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+Воронка (напр. діагностика -> пакет -> згода -> доступ -> робота -> оплата) без сканування чатів.
+
+- хендлер викликає FUNNEL.record("consent", user_id) — O(1): лічильник подій кроку
+  і HyperLogLog унікальних користувачів кроку, загальні й у поточному часовому кошику
+- HyperLogLog: 2**precision байтів на крок незалежно від кількості користувачів
+  (precision=11 -> 2 КБ, похибка ~2.3%); скетчі кошиків зводяться поелементним max
+- кошики по FUNNEL_BUCKET_MIN хвилин, памʼятаються останні FUNNEL_BUCKETS;
+  змінюється лише поточний кошик, тож запит копіює під локом тільки його
+- GET /funnel (JSON, ?hours=24 — вікно, ?series=1 — ще й по кошиках) — поруч з /metrics;
+  зведення рахується в потоці HTTP-сервера, хендлери його не чекають
+- лічильники — у памʼяті процесу: після рестарту воронка рахується заново
+
+    FUNNEL = funnel_from_env(("diag_start", "description", ...), metrics=METRICS)
+    FUNNEL.record("diag_start", uid)
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+
+MASK64 = (1 << 64) - 1
+
+
+def _mix64(value: int) -> int:
+    """splitmix64: user_id ідуть підряд, а HyperLogLog потрібні рівномірні біти."""
+    z = (value + 0x9E3779B97F4A7C15) & MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK64
+    return z ^ (z >> 31)
+
+
+class HyperLogLog:
+    __slots__ = ("precision", "registers")
+
+    def __init__(self, precision=11, registers=None):
+        self.precision = precision
+        self.registers = bytearray(1 << precision) if registers is None else registers
+
+    def add(self, value: int):
+        self.add_hash(_mix64(value))
+
+    def add_hash(self, h: int):
+        rest_bits = 64 - self.precision
+        index = h >> rest_bits
+        rest = h & ((1 << rest_bits) - 1)
+        rank = rest_bits - rest.bit_length() + 1     # позиція першої одиниці
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog"):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def copy(self) -> "HyperLogLog":
+        return HyperLogLog(self.precision, bytearray(self.registers))
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)     # мало користувачів: лінійний підрахунок, майже точно
+        return int(round(estimate))
+
+
+class _Bucket:
+    __slots__ = ("start", "events", "users")
+
+    def __init__(self, start):
+        self.start = start
+        self.events = {}        # крок -> подій
+        self.users = {}         # крок -> HyperLogLog
+
+    def copy(self) -> "_Bucket":
+        bucket = _Bucket(self.start)
+        bucket.events = dict(self.events)
+        bucket.users = {step: sketch.copy() for step, sketch in self.users.items()}
+        return bucket
+
+
+class Funnel:
+    def __init__(self, steps, bucket_seconds=3600, buckets=168, precision=11):
+        self.steps = tuple(steps)
+        self._known = frozenset(self.steps)
+        self.bucket_seconds = bucket_seconds
+        self.precision = precision
+
+        self._lock = threading.Lock()
+        self._total = _Bucket(time.time())
+        self._buckets = deque(maxlen=buckets)       # найстаріший кошик випадає сам
+
+    def record(self, step, user_id, now=None):
+        if step not in self._known:
+            raise ValueError(f"unknown funnel step {step!r}")
+        now = time.time() if now is None else now
+        start = now - now % self.bucket_seconds
+        h = _mix64(user_id)
+        with self._lock:
+            bucket = self._buckets[-1] if self._buckets else None
+            if bucket is None or start > bucket.start:
+                bucket = _Bucket(start)
+                self._buckets.append(bucket)
+            for target in (self._total, bucket):
+                target.events[step] = target.events.get(step, 0) + 1
+                sketch = target.users.get(step)
+                if sketch is None:
+                    sketch = target.users[step] = HyperLogLog(self.precision)
+                sketch.add_hash(h)
+
+    # ---- запити (поза хендлерами) ----
+    def _snapshot(self):
+        with self._lock:
+            buckets = list(self._buckets)
+            if buckets:
+                buckets[-1] = buckets[-1].copy()
+            return self._total.copy(), buckets
+
+    def _steps(self, events, users) -> list:
+        rows, first, prev = [], None, None
+        for step in self.steps:
+            sketch = users.get(step)
+            count = sketch.count() if sketch is not None else 0
+            first = count if first is None else first
+            rows.append({
+                "step": step,
+                "events": events.get(step, 0),
+                "users": count,
+                "conversion": round(count / first, 4) if first else 0.0,
+                "from_previous": round(count / prev, 4) if prev else (1.0 if prev is None else 0.0),
+            })
+            prev = count
+        return rows
+
+    def summary(self, hours=None, series=False, now=None) -> dict:
+        """Користувачі й події по кроках (усе з моменту старту або за останні hours годин)."""
+        now = time.time() if now is None else now
+        total, buckets = self._snapshot()
+        if hours is not None:
+            buckets = [b for b in buckets if b.start + self.bucket_seconds > now - hours * 3600]
+            events, users = {}, {}
+            for bucket in buckets:
+                for step, count in bucket.events.items():
+                    events[step] = events.get(step, 0) + count
+                for step, sketch in bucket.users.items():
+                    if step in users:
+                        users[step].merge(sketch)
+                    else:
+                        users[step] = sketch.copy()
+            since = buckets[0].start if buckets else now
+        else:
+            events, users, since = total.events, total.users, total.start
+        result = {"since": round(since), "bucket_seconds": self.bucket_seconds,
+                  "steps": self._steps(events, users)}
+        if series:
+            result["series"] = [
+                {"start": round(b.start),
+                 "events": {s: b.events.get(s, 0) for s in self.steps},
+                 "users": {s: (b.users[s].count() if s in b.users else 0) for s in self.steps}}
+                for b in buckets
+            ]
+        return result
+
+    def http_view(self, params) -> tuple:
+        """GET /funnel: params — аргументи запиту (Flask request.args, aiohttp request.query, dict)."""
+        hours = params.get("hours")
+        body = self.summary(hours=float(hours) if hours else None,
+                            series=params.get("series", "") in ("1", "true"))
+        return "application/json; charset=utf-8", json.dumps(body, ensure_ascii=False)
+
+
+def funnel_from_env(steps, metrics=None):
+    """FUNNEL_BUCKET_MIN, FUNNEL_BUCKETS (0 -> воронку не рахувати), FUNNEL_PRECISION"""
+    buckets = int(os.getenv("FUNNEL_BUCKETS", "168"))
+    if buckets <= 0:
+        return None
+    funnel = Funnel(
+        steps,
+        bucket_seconds=float(os.getenv("FUNNEL_BUCKET_MIN", "60")) * 60,
+        buckets=buckets,
+        precision=int(os.getenv("FUNNEL_PRECISION", "11")),
+    )
+    if metrics is not None:
+        metrics.watch_funnel(funnel)
+    return funnel
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+Кілька ботів в одному процесі: спільний Flask-сервер, пул зʼєднань до API
+і пул воркерів, кожен бот — на своєму маршруті /webhook/<імʼя>.
+
+    HOST_BOTS="shop=bot,diag=bot_ai_master_v1"
+    SHOP_BOT_TOKEN=...  DIAG_BOT_TOKEN=...
+    WEBHOOK_URL=https://<домен>  python host.py
+
+Модулі ботів не змінюються: кожен імпортується окремо (hosted_<імʼя>), а на час
+імпорту змінні <ІМʼЯ>_<КЛЮЧ> підставляються як <КЛЮЧ> (SHOP_BOT_TOKEN -> BOT_TOKEN,
+SHOP_STATE_DB -> STATE_DB). Тому стан, дедуплікація і метрики в кожного бота свої.
+Якщо STATE_DB / DEDUP_FILE / JOURNAL_DIR / RECORD_DIR задано лише спільні, бот отримує свій файл: state.db -> state.shop.db.
+
+Спільне:
+- requests.Session (tg_client.install_session) і пул потоків відправки (tg_client.shared_pool)
+- одна черга апдейтів з доріжками по (бот, чат) — HOST_WORKERS воркерів на всіх ботів
+- /metrics — метрики всіх ботів з міткою bot="<імʼя>" + метрики хоста
+- /funnel/<імʼя> — воронка бота, якщо він її рахує (funnel.py)
+"""
+
+import importlib.util
+import logging
+import os
+import sys
+import threading
+import time
+
+import telebot
+
+from metrics import CONTENT_TYPE, Registry, render_many
+from tg_client import ensure_webhook, webhook_settings_from_env
+from update_queue import UpdateQueue, drain_on_signal, run_handlers_inline, update_chat_id
+
+logger = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# =========================
+# ENV
+# =========================
+HOST_BOTS = os.getenv("HOST_BOTS", "").strip()          # "імʼя=модуль,імʼя=модуль"
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").strip()
+PORT = int(os.getenv("PORT", "10000"))
+HOST_WORKERS = int(os.getenv("HOST_WORKERS", "8"))
+HOST_QUEUE_SIZE = int(os.getenv("HOST_QUEUE_SIZE", "5000"))
+SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", "25"))
+
+# Кожному боту — свій файл, якщо задано лише спільний (значення — типове в модулі бота)
+PER_BOT_FILES = {"STATE_DB": "", "DEDUP_FILE": "", "JOURNAL_DIR": "", "RECORD_DIR": ""}
+
+_import_lock = threading.Lock()
+
+
+def parse_bots(spec: str) -> dict:
+    """ "shop=bot,diag=bot_ai_master_v1" -> {"shop": "bot", "diag": "bot_ai_master_v1"} """
+    bots = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, module = item.partition("=")
+        name, module = name.strip(), (module.strip() or name.strip())
+        if not name.isidentifier():
+            raise RuntimeError(f"HOST_BOTS: bad bot name {name!r}")
+        bots[name] = module
+    if not bots:
+        raise RuntimeError("HOST_BOTS is missing. Set it like shop=bot,diag=bot_ai_master_v1")
+    return bots
+
+
+def bot_env(name: str, environ=os.environ) -> dict:
+    """Змінні оточення, які бачить модуль бота під час імпорту."""
+    prefix = name.upper() + "_"
+    env = {key[len(prefix):]: value for key, value in environ.items() if key.startswith(prefix)}
+    for key, default in PER_BOT_FILES.items():
+        shared = environ.get(key, default).strip()
+        if key not in env and shared and shared != ":memory:":
+            stem, ext = os.path.splitext(shared)
+            env[key] = f"{stem}.{name}{ext}"
+    # у хості апдейти розподіляє спільна черга, а не власна черга/потоки бота
+    env["UPDATE_WORKERS"] = "0"
+    env["ENGINE"] = "sync"
+    if "BOT_TOKEN" not in env:
+        raise RuntimeError(f"{prefix}BOT_TOKEN is missing for bot {name!r}")
+    return env
+
+
+def load_bot(name: str, module_name: str):
+    """Імпортує модуль бота як окремий екземпляр hosted_<імʼя> зі своїми змінними оточення."""
+    return import_bot(f"hosted_{name}", module_name, bot_env(name))
+
+
+def import_bot(alias: str, module_name: str, overlay: dict):
+    """
+    Імпортує модуль бота під іменем alias; на час імпорту os.environ доповнено overlay.
+    Власний пул потоків telebot вимикається — хендлери викликає черга хоста/шарда.
+    """
+    path = os.path.join(ROOT, module_name + ".py")
+    spec = importlib.util.spec_from_file_location(alias, path)
+    module = importlib.util.module_from_spec(spec)
+    with _import_lock:
+        saved = {key: os.environ.get(key) for key in overlay}
+        os.environ.update(overlay)
+        try:
+            sys.modules[spec.name] = module
+            spec.loader.exec_module(module)
+        except BaseException:
+            sys.modules.pop(spec.name, None)
+            raise
+        finally:
+            for key, value in saved.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+
+    # хендлери виконують воркери UpdateQueue — власний пул telebot не потрібен
+    run_handlers_inline(module.bot)
+    return module
+
+
+# =========================
+# HOST
+# =========================
+class BotHost:
+    def __init__(self, bots: dict, workers=8, maxsize=5000):
+        self.bots = {name: load_bot(name, module) for name, module in bots.items()}
+        self.updates = UpdateQueue(self._handle, workers=workers, maxsize=maxsize,
+                                   key=self._key, name="host-updates")
+
+        self.registry = Registry()
+        self.webhook_latency = self.registry.histogram(
+            "host_webhook_request_seconds", "Webhook HTTP request handling time", ("bot", "status"))
+        self.registry.gauge("host_update_queue_depth", "Updates waiting in the shared queue",
+                            lambda: len(self.updates))
+        self.registry.counter_value("host_update_queue_rejected_total",
+                                    "Updates rejected because the queue was full", lambda: self.updates.rejected)
+
+        # Flask — лише тут: воркери shard.py імпортують з host.py тільки import_bot
+        from flask import Flask
+
+        self.app = Flask(__name__)
+        self.app.add_url_rule("/", "health", lambda: ("OK", 200))
+        self.app.add_url_rule("/webhook/<bot_name>", "webhook", self.webhook, methods=["POST"])
+        self.app.add_url_rule("/metrics", "metrics", self.metrics)
+        self.app.add_url_rule("/funnel/<bot_name>", "funnel", self.funnel)
+
+    @staticmethod
+    def _key(item):
+        name, update = item
+        return name, update_chat_id(update)
+
+    def _handle(self, item):
+        name, update = item
+        self.bots[name].bot.process_new_updates([update])
+
+    def webhook(self, bot_name):
+        started = time.perf_counter()
+        body, status = self._webhook(bot_name)
+        if bot_name in self.bots:
+            self.webhook_latency.observe(time.perf_counter() - started, bot_name, str(status))
+        return body, status
+
+    def _webhook(self, bot_name):
+        from flask import request
+
+        module = self.bots.get(bot_name)
+        if module is None:
+            return "Not Found", 404
+        recorder = getattr(module, "RECORDER", None)
+        if recorder is not None:
+            recorder.record(request.data)
+        try:
+            update = telebot.types.Update.de_json(request.data.decode("utf-8"))
+        except (ValueError, KeyError):
+            return "Bad Request", 400
+        if update is None:
+            return "Bad Request", 400
+        dedup = getattr(module, "DEDUP", None)
+        if dedup is not None and dedup.seen(update.update_id):
+            return "OK", 200
+        flood = getattr(module, "FLOOD", None)
+        if flood is not None and not flood.allow(update):
+            return "OK", 200
+        if not self.updates.put((bot_name, update)):
+            # повтор від Telegram має пройти дедуплікацію знову
+            if dedup is not None:
+                dedup.forget(update.update_id)
+            return "Busy", 503
+        return "OK", 200
+
+    def metrics(self):
+        from flask import Response
+
+        bots = {name: module.METRICS.registry for name, module in self.bots.items()
+                if hasattr(module, "METRICS")}
+        body = self.registry.render() + render_many(bots)
+        return Response(body, content_type=CONTENT_TYPE)
+
+    def funnel(self, bot_name):
+        from flask import Response, request
+
+        funnel = getattr(self.bots.get(bot_name), "FUNNEL", None)
+        if funnel is None:
+            return "Not Found", 404
+        try:
+            content_type, body = funnel.http_view(request.args)
+        except ValueError:
+            return "Bad Request", 400
+        return Response(body, content_type=content_type)
+
+    def setup_webhooks(self, base_url: str):
+        settings = webhook_settings_from_env()
+        for name, module in self.bots.items():
+            ensure_webhook(module.bot, f"{base_url}/webhook/{name}", **settings)
+
+    def close(self, timeout=25.0):
+        self.updates.close(timeout)
+
+
+# =========================
+# ENTRYPOINT
+# =========================
+if __name__ == "__main__":
+    if not WEBHOOK_URL:
+        raise RuntimeError("WEBHOOK_URL is missing. Set it like https://<your-render-domain>")
+    host = BotHost(parse_bots(HOST_BOTS), workers=HOST_WORKERS, maxsize=HOST_QUEUE_SIZE)
+    host.setup_webhooks(WEBHOOK_URL)
+    drain_on_signal(host.updates, SHUTDOWN_TIMEOUT)
+    host.app.run(host="0.0.0.0", port=PORT)
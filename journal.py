@@ -0,0 +1,447 @@
+# -*- coding: utf-8 -*-
+"""
+Журнал заявок і діагностик: append-only лог на диску, щоб заявка не губилась
+після відповіді користувачу.
+
+- запис: [довжина u32][crc32 u32][JSON] — битий хвіст після аварії видно по crc
+  і він обрізається при відкритті
+- group commit: append() лише ставить запис у чергу, окремий потік пише все, що
+  накопичилось, одним write + одним fsync; хендлер не чекає на диск
+- сегменти: <імʼя>-000001.log, ...; новий — коли поточний перевищив segment_size.
+  Журнали з різними іменами (orders, diag) можуть жити в одному каталозі
+- індекс: поруч із сегментом .idx — по 16 байт на запис (user_id, час, зсув);
+  пошук за користувачем/часом читає індекс і лише потрібні записи.
+  Індекс fsync-иться лише при ротації й закритті: індекс, що відстав від сегмента
+  (останній запис індексу не закінчується на кінці .log), перебудовується при відкритті,
+  а scan() до того читає такий сегмент повністю
+
+    JOURNAL = journal_from_env("orders")      # JOURNAL_DIR пусто -> вимкнено (None)
+    JOURNAL.append("order", user_id, chat_id=..., text=...)
+
+    python journal.py export [--dir journal] [--name orders] [--user ID] [--since 2024-05-01] [--format csv]
+    python journal.py stats [--dir journal] [--name orders]
+"""
+
+import argparse
+import atexit
+import csv
+import json
+import logging
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import Future
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # не POSIX — без блокування каталогу
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct("!II")    # довжина JSON, crc32
+_INDEX = struct.Struct("!qII")    # user_id, час (сек), зсув запису в сегменті
+# зсув в індексі — u32; пачка може вийти за segment_size, тож лишаємо запас до 4 ГБ
+MAX_SEGMENT_SIZE = 2**31
+
+
+# =========================
+# ФАЙЛИ
+# =========================
+def segment_paths(directory, name="orders") -> list:
+    """[(номер, шлях .log, шлях .idx)] за зростанням номера."""
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    prefix = name + "-"
+    found = []
+    for file_name in names:
+        if file_name.startswith(prefix) and file_name.endswith(".log"):
+            number = file_name[len(prefix):-len(".log")]
+            if number.isdigit():
+                base = os.path.join(directory, file_name[:-len(".log")])
+                found.append((int(number), base + ".log", base + ".idx"))
+    return sorted(found)
+
+
+def read_segment(path, offset=0):
+    """Записи сегмента від offset: (зсув, запис). Зупиняється на кінці або битому хвості."""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        while True:
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                return
+            length, crc = _HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                return
+            yield offset, json.loads(payload)
+            offset += _HEADER.size + length
+
+
+def read_index(path) -> list:
+    """[(user_id, час, зсув)]; битий хвіст (неповний запис) відкидається."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return []
+    data = data[:len(data) - len(data) % _INDEX.size]
+    return list(_INDEX.iter_unpack(data))
+
+
+def index_matches(log_path, entries) -> bool:
+    """Індекс покриває весь сегмент: його останній запис закінчується рівно на кінці .log."""
+    size = os.path.getsize(log_path)
+    if not entries:
+        return size == 0
+    offset = entries[-1][2]
+    with open(log_path, "rb") as f:
+        f.seek(offset)
+        header = f.read(_HEADER.size)
+    if len(header) < _HEADER.size:
+        return False
+    return offset + _HEADER.size + _HEADER.unpack(header)[0] == size
+
+
+def _read_at(f, offset):
+    f.seek(offset)
+    header = f.read(_HEADER.size)
+    if len(header) < _HEADER.size:
+        return None
+    length, crc = _HEADER.unpack(header)
+    payload = f.read(length)
+    if len(payload) < length or zlib.crc32(payload) != crc:
+        return None
+    return json.loads(payload)
+
+
+def scan(directory, name="orders", user_id=None, since=None, until=None, kind=None):
+    """
+    Потоково віддає записи журналу (від старих до нових) з фільтрами.
+    since/until — unix-час; сегменти поза проміжком пропускаються по індексу.
+    """
+    for _, log_path, idx_path in segment_paths(directory, name):
+        entries = read_index(idx_path)
+        if not index_matches(log_path, entries):
+            # індексу немає або він відстав (аварія, ще не перебудовано) — повільний шлях
+            records = (record for _, record in read_segment(log_path))
+        else:
+            if since is not None and entries[-1][1] < int(since):
+                continue
+            if until is not None and entries[0][1] > until:
+                continue
+            offsets = [offset for uid, ts, offset in entries
+                       if (user_id is None or uid == user_id)
+                       and (since is None or ts >= int(since))
+                       and (until is None or ts <= until)]
+            if not offsets:
+                continue
+            records = _read_many(log_path, offsets)
+        for record in records:
+            if user_id is not None and record.get("user_id") != user_id:
+                continue
+            if since is not None and record["ts"] < since:
+                continue
+            if until is not None and record["ts"] > until:
+                continue
+            if kind is not None and record.get("kind") != kind:
+                continue
+            yield record
+
+
+def _read_many(path, offsets):
+    with open(path, "rb") as f:
+        for offset in offsets:
+            record = _read_at(f, offset)
+            if record is not None:
+                yield record
+
+
+# =========================
+# ЗАПИС
+# =========================
+class Journal:
+    def __init__(self, directory, name="orders", segment_size=64 * 2**20, commit_delay=0.0):
+        self.directory = directory
+        self.name = name
+        if segment_size > MAX_SEGMENT_SIZE:
+            raise ValueError(f"journal segment_size must not exceed {MAX_SEGMENT_SIZE} bytes")
+        self.segment_size = segment_size
+        self.commit_delay = commit_delay      # >0 -> чекати стільки, щоб у fsync потрапило більше записів
+
+        os.makedirs(directory, exist_ok=True)
+        self._lock_file = open(os.path.join(directory, f".{name}.lock"), "a")
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                self._lock_file.close()
+                raise RuntimeError(f"journal {name!r} in {directory} is already open elsewhere")
+
+        self._cond = threading.Condition()
+        self._queue = []          # (payload, user_id, час, Future)
+        self._closed = False
+
+        self.appended = 0
+        self.commits = 0
+        self.failed = 0
+
+        self._open_tail()
+        self._thread = threading.Thread(target=self._writer, name=f"journal-{name}", daemon=True)
+        self._thread.start()
+
+    def __len__(self):
+        """Записи, що ще чекають на fsync."""
+        return len(self._queue)
+
+    def append(self, kind, user_id, **fields) -> Future:
+        """
+        Ставить запис у чергу й одразу повертається. Future завершується, коли запис на диску
+        (fsync) — чекати на нього потрібно лише тому, кому важлива гарантія, хендлеру — ні.
+        """
+        now = time.time()
+        record = {"ts": round(now, 3), "kind": kind, "user_id": user_id, **fields}
+        payload = json.dumps(record, ensure_ascii=False).encode("utf-8")
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("journal is closed")
+            self._queue.append((payload, int(user_id or 0), int(now), future))
+            self._cond.notify()
+        return future
+
+    def scan(self, **filters):
+        return scan(self.directory, self.name, **filters)
+
+    # ---- сегменти ----
+    def _open_tail(self):
+        segments = segment_paths(self.directory, self.name)
+        if not segments:
+            self._open_segment(1)
+            return
+        for number, log_path, idx_path in segments:
+            # останній сегмент міг обірватись на аварії — його хвіст перевіряємо завжди;
+            # старші — лише якщо індекс відстав (аварія до fsync індексу, невдалий commit)
+            if number == segments[-1][0] or not index_matches(log_path, read_index(idx_path)):
+                self._repair(log_path, idx_path)
+        self._open_segment(segments[-1][0])
+
+    def _repair(self, log_path, idx_path):
+        """Обрізає недописаний хвіст сегмента і перебудовує індекс, якщо він не збігається з .log."""
+        end = self._valid_end(log_path)
+        if end < os.path.getsize(log_path):
+            logger.warning("journal: truncating torn tail of %s at %d", log_path, end)
+            with open(log_path, "r+b") as f:
+                f.truncate(end)
+                os.fsync(f.fileno())
+        if index_matches(log_path, read_index(idx_path)):
+            return
+        logger.warning("journal: rebuilding index %s", idx_path)
+        entries = bytearray()
+        for offset, record in read_segment(log_path):
+            entries += _INDEX.pack(int(record.get("user_id") or 0), int(record["ts"]), offset)
+        with open(idx_path, "wb") as f:
+            f.write(entries)
+            os.fsync(f.fileno())
+
+    @staticmethod
+    def _valid_end(path) -> int:
+        end = 0
+        with open(path, "rb") as f:
+            while True:
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    return end
+                length, crc = _HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    return end
+                end += _HEADER.size + length
+
+    def _open_segment(self, number):
+        base = os.path.join(self.directory, f"{self.name}-{number:06d}")
+        self._number = number
+        self._log = open(base + ".log", "ab", buffering=0)
+        self._idx = open(base + ".idx", "ab", buffering=0)
+        self._idx_broken = False
+        self._size = self._log.tell()
+
+    def _rotate(self):
+        self._log.close()
+        os.fsync(self._idx.fileno())
+        self._idx.close()
+        self._open_segment(self._number + 1)
+        # новий файл має бути видно в каталозі після аварії
+        if hasattr(os, "O_DIRECTORY"):
+            fd = os.open(self.directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    # ---- group commit ----
+    def _writer(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+            if self.commit_delay:
+                time.sleep(self.commit_delay)
+            with self._cond:
+                batch, self._queue = self._queue, []
+            try:
+                self._commit(batch)
+            except Exception as e:
+                self.failed += len(batch)
+                logger.exception("journal: failed to write %d records", len(batch))
+                for *_, future in batch:
+                    future.set_exception(e)
+            else:
+                for *_, future in batch:
+                    future.set_result(None)
+
+    def _commit(self, batch):
+        if self._size >= self.segment_size:
+            self._rotate()
+        data = bytearray()
+        index = bytearray()
+        offset = self._size
+        for payload, user_id, ts, _ in batch:
+            data += _HEADER.pack(len(payload), zlib.crc32(payload))
+            data += payload
+            index += _INDEX.pack(user_id, ts, offset)
+            offset += _HEADER.size + len(payload)
+        try:
+            self._log.write(data)
+            os.fsync(self._log.fileno())
+        except OSError:
+            self._discard_tail()
+            raise
+        # індекс пишемо після fsync даних: він ніколи не вказує на те, чого немає на диску
+        if not self._idx_broken:
+            try:
+                self._idx.write(index)
+            except OSError:
+                # дані вже на диску; індекс сегмента далі не ведемо — перебудується при відкритті
+                logger.exception("journal: index write failed for %s", self._idx.name)
+                self._idx_broken = True
+        self._size = offset
+        self.appended += len(batch)
+        self.commits += 1
+
+    def _discard_tail(self):
+        """Невдалий commit: частина пачки могла лягти в сегмент — повертаємо його до _size."""
+        try:
+            os.ftruncate(self._log.fileno(), self._size)
+            os.fsync(self._log.fileno())
+        except OSError:
+            # обрізати не вдалось — наступні записи йдуть у новий сегмент,
+            # а битий хвіст цього читання й так пропускає (crc)
+            logger.exception("journal: cannot truncate %s, rolling to a new segment", self._log.name)
+            self._rotate()
+
+    def close(self, timeout=10.0):
+        """Дописує чергу на диск і закриває файли."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout)
+        self._log.close()
+        os.fsync(self._idx.fileno())
+        self._idx.close()
+        self._lock_file.close()
+
+
+def journal_from_env(name="orders"):
+    """JOURNAL_DIR (пусто -> без журналу), JOURNAL_SEGMENT_MB (до 2048), JOURNAL_COMMIT_MS"""
+    directory = os.getenv("JOURNAL_DIR", "").strip()
+    if not directory:
+        return None
+    journal = Journal(
+        directory,
+        name=name,
+        segment_size=int(float(os.getenv("JOURNAL_SEGMENT_MB", "64")) * 2**20),
+        commit_delay=float(os.getenv("JOURNAL_COMMIT_MS", "0")) / 1000,
+    )
+    atexit.register(journal.close)
+    return journal
+
+
+# =========================
+# CLI
+# =========================
+CSV_COLUMNS = ("time", "kind", "user_id", "chat_id", "username", "text")
+
+
+def _parse_time(value):
+    """unix-час або ISO-дата/час (2024-05-01, 2024-05-01T12:00)."""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def _export(args):
+    records = scan(args.dir, args.name, user_id=args.user, since=_parse_time(args.since),
+                   until=_parse_time(args.until), kind=args.kind)
+    out = sys.stdout
+    if args.format == "csv":
+        writer = csv.writer(out)
+        writer.writerow(CSV_COLUMNS)
+        for record in records:
+            when = datetime.fromtimestamp(record["ts"]).isoformat(timespec="seconds")
+            writer.writerow([when] + [record.get(column, "") for column in CSV_COLUMNS[1:]])
+    else:
+        for record in records:
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def _stats(args):
+    for number, log_path, idx_path in segment_paths(args.dir, args.name):
+        entries = read_index(idx_path)
+        if entries:
+            first = datetime.fromtimestamp(entries[0][1]).isoformat(timespec="seconds")
+            last = datetime.fromtimestamp(entries[-1][1]).isoformat(timespec="seconds")
+        else:
+            first = last = "-"
+        print(f"{os.path.basename(log_path)}  {os.path.getsize(log_path):>10} B  "
+              f"{len(entries):>8} records  {first} .. {last}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Журнал заявок і діагностик")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    export = sub.add_parser("export", help="вивантажити записи (JSON lines або CSV) у stdout")
+    export.add_argument("--dir", default=os.getenv("JOURNAL_DIR") or "journal")
+    export.add_argument("--name", default="orders", help="orders (bot.py) / diag (bot_ai_master_v1.py)")
+    export.add_argument("--user", type=int)
+    export.add_argument("--since", help="unix-час або ISO-дата")
+    export.add_argument("--until", help="unix-час або ISO-дата")
+    export.add_argument("--kind", help="order / diag")
+    export.add_argument("--format", choices=["jsonl", "csv"], default="jsonl")
+    export.set_defaults(func=_export)
+
+    stats = sub.add_parser("stats", help="сегменти, розмір, кількість записів")
+    stats.add_argument("--dir", default=os.getenv("JOURNAL_DIR") or "journal")
+    stats.add_argument("--name", default="orders")
+    stats.set_defaults(func=_stats)
+
+    args = ap.parse_args()
+    try:
+        args.func(args)
+    except BrokenPipeError:  # export | head
+        pass
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+Фото/відео/документи до заявки чи діагностики: завантаження у фоні на локальний диск.
+
+- хендлер лише перевіряє ліміти і ставить завантаження в пул (MEDIA_WORKERS потоків)
+- getFile + потокове завантаження частинами по chunk_size прямо у файл —
+  у памʼяті ніколи не лежить файл цілком (telebot.download_file тримає його весь)
+- квота на заявку (ref): байти і кількість файлів (MEDIA_QUOTA_MB, MEDIA_QUOTA_FILES);
+  місце резервується при прийомі за file_size із повідомлення, тож паралельні
+  завантаження не перевищують квоту. finish(ref) — заявка надіслана чи покинута:
+  облік квоти видаляється, наступна заявка починає з нуля
+- дедуплікація: файли лежать за sha256 вмісту (media/ab/abcd….jpg), однаковий вміст —
+  один файл; повторний file_unique_id не завантажується і не рахується в квоту
+- кожен файл привʼязується до заявки: запис "media" з ref заявки в журналі (journal.py)
+
+    MEDIA = media_from_env(BOT_TOKEN, journal=JOURNAL, usage=STORE.mapping("media_usage"))   # MEDIA_DIR пусто -> None
+    status = MEDIA.accept(user_id, message, ref)   # "queued" / "linked" / "too_big" / "quota" / None
+    MEDIA.finish(ref)                              # заявку надіслано — квота ref більше не потрібна
+"""
+
+import atexit
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from telebot import apihelper
+
+from tg_client import install_session
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FILE_URL = "https://api.telegram.org/file/bot{0}/{1}"
+MEDIA_TYPES = ["photo", "video", "document"]
+
+
+class TooBig(Exception):
+    pass
+
+
+def media_of(message):
+    """-> (тип, file_id, file_unique_id, file_size, імʼя файлу) або None."""
+    if message.photo:
+        item, name = message.photo[-1], ""   # найбільший розмір
+        kind = "photo"
+    elif message.video:
+        item, name, kind = message.video, getattr(message.video, "file_name", "") or "", "video"
+    elif message.document:
+        item, name, kind = message.document, message.document.file_name or "", "document"
+    else:
+        return None
+    return kind, item.file_id, item.file_unique_id, item.file_size or 0, name
+
+
+class MediaIntake:
+    def __init__(self, token, directory, workers=2, max_file=20 * 2**20, quota_bytes=100 * 2**20,
+                 quota_files=30, chunk_size=64 * 1024, usage=None, journal=None, timeout=60,
+                 known_size=10000):
+        self.token = token
+        self.directory = directory
+        self.max_file = max_file
+        self.quota_bytes = quota_bytes
+        self.quota_files = quota_files
+        self.chunk_size = chunk_size
+        self.usage = usage if usage is not None else {}   # ref -> [байти, файли]
+        self.journal = journal
+        self.timeout = timeout
+        self.known_size = known_size
+
+        self._tmp = os.path.join(directory, "tmp")
+        os.makedirs(self._tmp, exist_ok=True)
+        self._lock = threading.Lock()
+        self._known = OrderedDict()     # file_unique_id -> (sha256, шлях, розмір)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="media")
+        self._inflight = 0
+
+        self.downloaded = 0
+        self.deduplicated = 0
+        self.rejected = 0
+        self.failed = 0
+        self.bytes = 0
+
+    def __len__(self):
+        return self._inflight
+
+    # ---- прийом (з хендлера, не блокує) ----
+    def accept(self, user_id, message, ref):
+        media = media_of(message)
+        if media is None:
+            return None
+        kind, file_id, unique_id, size, name = media
+        link = {"chat_id": message.chat.id, "message_id": message.message_id,
+                "caption": message.caption or "", "media": kind, "file_name": name}
+
+        with self._lock:
+            known = self._known.get(unique_id)
+            if known is not None:
+                self._known.move_to_end(unique_id)
+        if known is not None:
+            # цей самий файл уже є на диску — лише привʼязуємо до заявки
+            sha, path, size = known
+            self.deduplicated += 1
+            self._link(user_id, ref, link, sha, path, size, duplicate=True)
+            return "linked"
+
+        if size > self.max_file:
+            self.rejected += 1
+            return "too_big"
+        if not self._reserve(ref, size):
+            self.rejected += 1
+            return "quota"
+
+        with self._lock:
+            self._inflight += 1
+        self._pool.submit(self._download, user_id, ref, file_id, unique_id, size, link)
+        return "queued"
+
+    def finish(self, ref):
+        """Заявка надіслана або покинута: облік квоти ref більше не потрібен (завантаження в пулі докачуються)."""
+        with self._lock:
+            self.usage.pop(ref, None)
+
+    def _reserve(self, ref, size) -> bool:
+        with self._lock:
+            used_bytes, used_files = self.usage.get(ref) or (0, 0)
+            if used_files + 1 > self.quota_files or used_bytes + size > self.quota_bytes:
+                return False
+            self.usage[ref] = [used_bytes + size, used_files + 1]
+            return True
+
+    def _resize(self, ref, reserved, size) -> bool:
+        """Резерв за file_size -> фактичний розмір; заявку вже закрито (finish) — файл просто приймаємо."""
+        with self._lock:
+            used = self.usage.get(ref)
+            if used is None:
+                return True
+            used_bytes = used[0] - reserved + size
+            if used_bytes > self.quota_bytes:
+                self.usage[ref] = [max(0, used[0] - reserved), max(0, used[1] - 1)]
+                return False
+            self.usage[ref] = [used_bytes, used[1]]
+            return True
+
+    def _release(self, ref, size):
+        with self._lock:
+            used = self.usage.get(ref)
+            if used is not None:   # після finish не відновлюємо запис
+                self.usage[ref] = [max(0, used[0] - size), max(0, used[1] - 1)]
+
+    # ---- завантаження (пул) ----
+    def _download(self, user_id, ref, file_id, unique_id, reserved, link):
+        tmp = None
+        try:
+            info = apihelper.get_file(self.token, file_id)
+            url = (apihelper.FILE_URL or DEFAULT_FILE_URL).format(self.token, info["file_path"])
+            ext = os.path.splitext(info["file_path"])[1].lower()
+            sha, size, tmp = self._stream(url)
+
+            if size != reserved and not self._resize(ref, reserved, size):
+                # у повідомленні розміру могло не бути — квоту рахуємо за фактом
+                self.rejected += 1
+                logger.info("media: %s over quota after download (%d bytes)", ref, size)
+                return
+
+            path = os.path.join(self.directory, sha[:2], sha + ext)
+            duplicate = os.path.exists(path)
+            if duplicate:
+                self.deduplicated += 1
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp, path)
+                tmp = None
+                self.bytes += size
+            self.downloaded += 1
+            self._remember(unique_id, sha, path, size)
+            self._link(user_id, ref, link, sha, path, size, duplicate=duplicate)
+        except TooBig:
+            self.rejected += 1
+            self._release(ref, reserved)
+            logger.info("media: file from %s exceeds %d bytes, dropped", user_id, self.max_file)
+        except Exception:
+            self.failed += 1
+            self._release(ref, reserved)
+            logger.exception("media: download failed for %s", user_id)
+        finally:
+            if tmp is not None:
+                os.remove(tmp)
+            with self._lock:
+                self._inflight -= 1
+
+    def _stream(self, url):
+        """Частинами у тимчасовий файл, паралельно рахуючи sha256. -> (sha256, розмір, шлях)"""
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp = tempfile.mkstemp(dir=self._tmp)
+        try:
+            with os.fdopen(fd, "wb") as f, \
+                    install_session().get(url, stream=True, timeout=self.timeout) as response:
+                if response.status_code != 200:
+                    raise RuntimeError(f"file download failed: HTTP {response.status_code}")
+                for chunk in response.iter_content(self.chunk_size):
+                    size += len(chunk)
+                    if size > self.max_file:
+                        raise TooBig()
+                    digest.update(chunk)
+                    f.write(chunk)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        return digest.hexdigest(), size, tmp
+
+    def _remember(self, unique_id, sha, path, size):
+        with self._lock:
+            self._known[unique_id] = (sha, path, size)
+            self._known.move_to_end(unique_id)
+            while len(self._known) > self.known_size:
+                self._known.popitem(last=False)
+
+    def _link(self, user_id, ref, link, sha, path, size, duplicate):
+        if self.journal is None:
+            logger.info("media: %s -> %s (%s, %d bytes)", ref, path, link["media"], size)
+            return
+        self.journal.append("media", user_id, ref=ref, sha256=sha, size=size,
+                            path=os.path.relpath(path, self.directory), duplicate=duplicate, **link)
+
+    def close(self):
+        """Дочікується завантажень, які вже в пулі."""
+        self._pool.shutdown(wait=True)
+
+
+def media_from_env(token, journal=None, usage=None, metrics=None):
+    """
+    MEDIA_DIR (пусто -> вкладення не приймаються), MEDIA_WORKERS, MEDIA_MAX_MB,
+    MEDIA_QUOTA_MB, MEDIA_QUOTA_FILES; TG_FILE_URL — інший сервер файлів
+    у форматі apihelper.FILE_URL: http://host:port/file/bot{0}/{1}
+    """
+    directory = os.getenv("MEDIA_DIR", "").strip()
+    if not directory:
+        return None
+    file_url = os.getenv("TG_FILE_URL", "").strip()
+    if file_url:
+        apihelper.FILE_URL = file_url
+    intake = MediaIntake(
+        token,
+        directory,
+        workers=int(os.getenv("MEDIA_WORKERS", "2")),
+        max_file=int(float(os.getenv("MEDIA_MAX_MB", "20")) * 2**20),
+        quota_bytes=int(float(os.getenv("MEDIA_QUOTA_MB", "100")) * 2**20),
+        quota_files=int(os.getenv("MEDIA_QUOTA_FILES", "30")),
+        usage=usage,
+        journal=journal,
+    )
+    # закривається раніше за журнал (atexit — у зворотному порядку), щоб записи "media" встигли
+    atexit.register(intake.close)
+    if metrics is not None:
+        metrics.watch_media(intake)
+    return intake
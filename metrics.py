@@ -0,0 +1,424 @@
+# -*- coding: utf-8 -*-
+"""
+Метрики у форматі Prometheus (text exposition 0.0.4).
+
+Запис не бере локів: кожен потік пише у свій шард (dict у threading.local),
+шарди зводяться лише під час віддачі /metrics. Шард потоку, що завершився
+(потоки запитів Flask), зливається в базовий, тож шардів не більше, ніж живих
+потоків. Тому інструментацію можна лишати увімкненою в проді.
+
+    METRICS = BotMetrics()
+    with METRICS.handler_latency.time("callbacks", "order"):
+        ...
+    METRICS.registry.render()  # -> текст для /metrics
+"""
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, *extra):
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    parts.extend(e for e in extra if e)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Sharded:
+    """Базовий клас: шард на потік, зведення під час scrape."""
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._base = {}         # зведені шарди завершених потоків
+        self._shards = []       # (потік, шард)
+        self._shards_lock = threading.Lock()
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._shards_lock:
+                self._fold_finished()
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _fold_finished(self):
+        """Під _shards_lock: шарди завершених потоків -> _base (у них уже ніхто не пише)."""
+        alive = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                alive.append((thread, shard))
+            else:
+                for labels, value in shard.items():
+                    self._merge(self._base, labels, value)
+        self._shards = alive
+
+    def _snapshot(self):
+        with self._shards_lock:
+            self._fold_finished()
+            return [dict(self._base)] + [dict(s) for _, s in self._shards]
+
+
+class Counter(_Sharded):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    @staticmethod
+    def _merge(into, labels, value):
+        into[labels] = into.get(labels, 0) + value
+
+    def values(self):
+        total = {}
+        for shard in self._snapshot():
+            for labels, value in shard.items():
+                total[labels] = total.get(labels, 0) + value
+        return total
+
+    def render(self, extra=""):
+        for labels, value in sorted(self.values().items()):
+            yield f"{self.name}{_labels(self.labelnames, labels, extra)} {_num(value)}"
+
+
+class Histogram(_Sharded):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        shard = self._shard()
+        row = shard.get(labels)
+        if row is None:
+            # [лічильники по кошиках..., +Inf, сума]
+            row = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                row[i] += 1
+                break
+        else:
+            row[len(self.buckets)] += 1
+        row[-1] += value
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    @staticmethod
+    def _merge(into, labels, row):
+        acc = into.get(labels)
+        if acc is None:
+            into[labels] = list(row)
+        else:
+            for i, v in enumerate(row):
+                acc[i] += v
+
+    def render(self, extra=""):
+        merged = {}
+        for shard in self._snapshot():
+            for labels, row in shard.items():
+                acc = merged.get(labels)
+                if acc is None:
+                    merged[labels] = list(row)
+                else:
+                    for i, v in enumerate(row):
+                        acc[i] += v
+        for labels, row in sorted(merged.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), row):
+                cumulative += count
+                le = 'le="' + _num(float(bound)) + '"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, extra, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels, extra)} {_num(row[-1])}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels, extra)} {cumulative}"
+
+
+class _Timer:
+    __slots__ = ("hist", "labels", "start")
+
+    def __init__(self, hist, labels):
+        self.hist = hist
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.start, *self.labels)
+        return False
+
+
+class Gauge:
+    """Значення читається функцією в момент scrape (довжина черги, розмір сховища…)."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, fn, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.fn = fn
+        self.labelnames = tuple(labelnames)
+
+    def render(self, extra=""):
+        value = self.fn()
+        if isinstance(value, dict):
+            for labels, v in sorted(value.items()):
+                labels = labels if isinstance(labels, tuple) else (labels,)
+                yield f"{self.name}{_labels(self.labelnames, labels, extra)} {_num(v)}"
+        else:
+            yield f"{self.name}{_labels((), (), extra)} {_num(value)}"
+
+
+class CounterValue(Gauge):
+    """Лічильник, який веде сам компонент (атрибут, що лише росте): читається під час scrape, як Gauge."""
+
+    kind = "counter"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self.register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def gauge(self, name, help_text, fn, labelnames=()):
+        return self.register(Gauge(name, help_text, fn, labelnames))
+
+    def counter_value(self, name, help_text, fn, labelnames=()):
+        return self.register(CounterValue(name, help_text, fn, labelnames))
+
+    def collect(self, extra=""):
+        """-> (метрика, рядки зразків) для кожної метрики реєстру."""
+        with self._lock:
+            metrics = list(self._metrics)
+        for metric in metrics:
+            try:
+                lines = list(metric.render(extra))
+            except Exception as e:  # одна зламана gauge не має ламати весь scrape
+                lines = [f"# {metric.name} unavailable: {_escape(e)}"]
+            yield metric, lines
+
+    def render(self) -> str:
+        return _render_families((metric, lines) for metric, lines in self.collect())
+
+
+def _render_families(families) -> str:
+    out = []
+    for metric, lines in families:
+        out.append(f"# HELP {metric.name} {metric.help}")
+        out.append(f"# TYPE {metric.name} {metric.kind}")
+        out.extend(lines)
+    return "\n".join(out) + "\n"
+
+
+def render_many(registries: dict, label="bot") -> str:
+    """
+    Кілька реєстрів (напр. ботів одного host.py) в одному /metrics:
+    однойменні метрики зводяться в одну родину, кожен зразок отримує label="<ключ>".
+    """
+    families = {}
+    for value, registry in registries.items():
+        extra = f'{label}="{_escape(value)}"'
+        for metric, lines in registry.collect(extra):
+            families.setdefault(metric.name, (metric, []))[1].extend(lines)
+    return _render_families(families.values())
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class BotMetrics:
+    """Стандартний набір метрик бота."""
+
+    def __init__(self):
+        self.registry = Registry()
+        self.handler_latency = self.registry.histogram(
+            "bot_handler_seconds", "Handler execution time", ("handler", "route"))
+        self.api_latency = self.registry.histogram(
+            "bot_telegram_api_seconds", "Telegram Bot API call latency", ("method",))
+        self.api_errors = self.registry.counter(
+            "bot_telegram_api_errors_total", "Failed Telegram Bot API calls", ("method", "code"))
+        self.webhook_latency = self.registry.histogram(
+            "bot_webhook_request_seconds", "Webhook HTTP request handling time", ("status",))
+        self.poll_lag = self.registry.histogram(
+            "bot_poll_lag_seconds", "Time from getUpdates fetch to the end of handling")
+
+    def api_call(self, method, seconds, error=None):
+        self.api_latency.observe(seconds, method)
+        if error is not None:
+            self.api_errors.inc(method, str(getattr(error, "error_code", type(error).__name__)))
+
+    # ---- gauges і лічильники компонентів (значення читаються під час scrape) ----
+    def watch_updates(self, queue):
+        self.registry.gauge("bot_update_queue_depth", "Updates waiting in the inbound queue",
+                            lambda: len(queue))
+        self.registry.counter_value("bot_update_queue_rejected_total", "Updates rejected because the queue was full",
+                                    lambda: queue.rejected)
+
+    def watch_outbound(self, client):
+        self.registry.gauge("bot_outbound_queue_depth", "Telegram API calls waiting to be sent",
+                            lambda: len(client))
+        self.registry.counter_value("bot_outbound_throttled_total", "429 responses received from Telegram",
+                                    lambda: client.throttled)
+        self.registry.gauge("bot_outbound_queue_wait_max_seconds", "Longest time a call waited in the queue",
+                            lambda: client.wait_max)
+        if client.edits is not None:
+            self.registry.counter_value("bot_edit_cache_hits_total", "edit_message_text calls skipped as unchanged",
+                                        lambda: client.edits.hits)
+            self.registry.counter_value("bot_edit_cache_misses_total", "edit_message_text calls sent to Telegram",
+                                        lambda: client.edits.misses)
+            self.registry.gauge("bot_edit_cache_entries", "Messages tracked by the edit cache",
+                                lambda: len(client.edits))
+
+    def watch_store(self, store):
+        self.registry.gauge("bot_state_cache_entries", "Entries in the state store LRU cache",
+                            lambda: len(store._cache))
+        # store.rows, а не store.size: без flush і COUNT(*) під локом на кожен scrape
+        self.registry.gauge("bot_state_rows", "Rows in the state store backend",
+                            store.rows)
+
+    def watch_poller(self, poller):
+        self.registry.gauge("bot_poll_pending", "Fetched updates not yet handled",
+                            lambda: len(poller))
+        self.registry.gauge("bot_poll_oldest_pending_seconds", "Age of the oldest fetched but unhandled update",
+                            poller.oldest_pending_age)
+        self.registry.gauge("bot_poll_offset", "Next getUpdates offset",
+                            lambda: poller.offset or 0)
+        self.registry.counter_value("bot_poll_fetched_total", "Updates fetched by getUpdates",
+                                    lambda: poller.fetched)
+        self.registry.counter_value("bot_poll_handled_total", "Fetched updates handled and checkpointed",
+                                    lambda: poller.handled)
+
+    def watch_dedup(self, deduper):
+        self.registry.counter_value("bot_updates_deduplicated_total", "Redelivered updates dropped by update_id",
+                                    lambda: deduper.dropped)
+
+    def watch_journal(self, journal):
+        self.registry.counter_value("bot_journal_records_total", "Records written to the order journal",
+                                    lambda: journal.appended)
+        self.registry.counter_value("bot_journal_commits_total", "Journal fsync batches (group commits)",
+                                    lambda: journal.commits)
+        self.registry.gauge("bot_journal_pending", "Journal records waiting for fsync",
+                            lambda: len(journal))
+        self.registry.counter_value("bot_journal_failed_total", "Journal records that failed to write",
+                                    lambda: journal.failed)
+
+    def watch_notifier(self, notifier):
+        self.registry.gauge("bot_notify_pending", "Operator events waiting for the next digest",
+                            lambda: len(notifier))
+        self.registry.counter_value("bot_notify_events_total", "Operator events queued", lambda: notifier.events)
+        self.registry.counter_value("bot_notify_digests_total", "Digest messages delivered to operator chats",
+                                    lambda: notifier.digests)
+        self.registry.counter_value("bot_notify_failed_total", "Digest messages dropped after all retries",
+                                    lambda: notifier.failed)
+        self.registry.counter_value("bot_notify_dropped_total", "Operator events dropped because the buffer was full",
+                                    lambda: notifier.dropped)
+
+    def watch_media(self, intake):
+        self.registry.gauge("bot_media_inflight", "Attachments queued or downloading", lambda: len(intake))
+        self.registry.counter_value("bot_media_downloaded_total", "Attachments downloaded", lambda: intake.downloaded)
+        self.registry.counter_value("bot_media_deduplicated_total", "Attachments already stored (same content)",
+                                    lambda: intake.deduplicated)
+        self.registry.counter_value("bot_media_rejected_total", "Attachments rejected by size or quota",
+                                    lambda: intake.rejected)
+        self.registry.counter_value("bot_media_failed_total", "Attachment downloads that failed", lambda: intake.failed)
+        self.registry.counter_value("bot_media_stored_bytes_total", "Bytes written to the media store",
+                                    lambda: intake.bytes)
+
+    def watch_flood(self, limiter):
+        self.registry.counter_value("bot_flood_dropped_total", "Inbound updates dropped by the flood limiter",
+                                    lambda: dict(limiter.dropped), ("type", "reason"))
+        self.registry.gauge("bot_flood_tracked", "User+type pairs tracked by the flood limiter",
+                            lambda: len(limiter))
+
+    def watch_recorder(self, recorder):
+        self.registry.counter_value("bot_recorder_updates_total", "Raw updates written to the replay log",
+                                    lambda: recorder.recorded)
+        self.registry.gauge("bot_recorder_pending", "Raw updates buffered for the replay log",
+                            lambda: len(recorder))
+        self.registry.counter_value("bot_recorder_dropped_total", "Raw updates not recorded because the buffer was full",
+                                    lambda: recorder.dropped)
+
+    def watch_funnel(self, funnel):
+        self.registry.counter_value("bot_funnel_events_total", "Funnel step events since start",
+                                    lambda: {row["step"]: row["events"] for row in funnel.summary()["steps"]}, ("step",))
+        self.registry.gauge("bot_funnel_users", "Estimated unique users per funnel step since start",
+                            lambda: {row["step"]: row["users"] for row in funnel.summary()["steps"]}, ("step",))
+
+    def timed(self, handler, route=""):
+        """Декоратор для хендлера: час виконання -> bot_handler_seconds{handler=...}."""
+        def deco(fn):
+            def wrapper(*args, **kwargs):
+                with self.handler_latency.time(handler, route):
+                    return fn(*args, **kwargs)
+            wrapper.__name__ = fn.__name__
+            wrapper.__doc__ = fn.__doc__
+            return wrapper
+        return deco
+
+
+def serve_metrics(registry: Registry, port: int, host="0.0.0.0", routes=None):
+    """
+    /metrics на окремому порту — для ботів без Flask (polling).
+    routes: {"/шлях": fn(аргументи запиту) -> (content_type, тіло)} — додаткові GET-сторінки (напр. /funnel).
+    """
+    routes = dict(routes or {})
+    routes["/metrics"] = lambda params: (CONTENT_TYPE, registry.render())
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            path, _, query = self.path.partition("?")
+            view = routes.get(path)
+            if view is None:
+                self.send_error(404)
+                return
+            try:
+                content_type, body = view({k: v[-1] for k, v in parse_qs(query).items()})
+            except ValueError:
+                self.send_error(400)
+                return
+            body = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
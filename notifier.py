@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""
+Сповіщення операторам: нові заявки, вибір пакета, оплата — у чати NOTIFY_CHATS.
+
+- notify() лише додає подію в памʼять і повертається: хендлер ніколи не чекає
+- окремий потік збирає події у вікно: з першої події минуло NOTIFY_WINDOW секунд
+  або назбиралось NOTIFY_BATCH подій -> один дайджест у кожен чат оператора.
+  Сплеск заявок = кілька повідомлень, а не сотні, тож ліміт на чат не вибивається
+- дайджест іде з PRIORITY_BULK — відповіді користувачам не чекають за ним;
+  потік лише ставить відправку в чергу клієнта і не чекає результату, тож
+  повільний чат не тримає інших. Результат приходить у done-callback:
+  помилка API (429, 5xx) -> повтор цього чату з експоненційною паузою;
+  4xx (чат не знайдено, бота заблоковано) і мережеві помилки, які клієнт уже
+  сам повторював, — не повторюються: запит міг дійти, а дубль дайджесту гірший
+- черга подій обмежена: при переповненні випадають найстаріші (dropped)
+
+    NOTIFY = notifier_from_env(api, metrics=METRICS)
+    NOTIFY.notify(f"🆕 Заявка від {user_label(message.from_user)}: ...")
+"""
+
+import atexit
+import heapq
+import itertools
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+from tg_client import PRIORITY_BULK
+
+logger = logging.getLogger(__name__)
+
+MAX_MESSAGE = 4000    # ліміт Telegram — 4096 символів, лишаємо запас
+
+
+def user_label(user) -> str:
+    """@username (id) або імʼя (id) — щоб оператор міг знайти клієнта."""
+    if user is None:
+        return "?"
+    name = f"@{user.username}" if user.username else (user.first_name or "")
+    return f"{name} ({user.id})".strip()
+
+
+def digest_messages(events, limit=MAX_MESSAGE) -> list:
+    """Події -> тексти повідомлень не довші за limit; подія не розрізається між повідомленнями."""
+    if len(events) == 1:
+        return [events[0][:limit]]
+    header = f"🔔 Нових подій: {len(events)}\n\n"
+    messages, current = [], header
+    for event in events:
+        event = event[:limit - len(header) - 2]
+        if len(current) + len(event) + 2 > limit:
+            messages.append(current.rstrip())
+            current = ""
+        current += event + "\n\n"
+    messages.append(current.rstrip())
+    return messages
+
+
+def _retryable(error) -> bool:
+    """
+    Повторюємо лише відповідь API, яка точно означає «не відправлено»: 429 і 5xx.
+    4xx не мине з повтором (чат не знайдено, бот заблокований, битий запит), а без
+    коду (таймаут, обрив) невідомо, чи дійшло — повтор може задублювати дайджест.
+    """
+    code = getattr(error, "error_code", None)
+    return isinstance(code, int) and (code == 429 or code >= 500)
+
+
+class Notifier:
+    def __init__(self, api, chats, window=3.0, max_batch=20, maxsize=1000,
+                 max_retries=5, backoff=2.0):
+        self.api = api
+        self.chats = list(chats)
+        self.window = window
+        self.max_batch = max_batch
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+        self._cond = threading.Condition()
+        self._events = deque(maxlen=maxsize)   # (коли, текст)
+        self._closed = False
+        self._retries = []                     # купа (коли, №, chat_id, текст, спроба) — під _cond
+        self._seq = itertools.count()
+        self._loop = None                      # event loop async-клієнта (ENGINE=async)
+
+        self.events = 0
+        self.inflight = 0                      # відправлено в клієнт, результату ще немає
+        self.digests = 0
+        self.retries = 0
+        self.failed = 0
+        self.dropped = 0
+
+        self._thread = threading.Thread(target=self._run, name="notifier", daemon=True)
+        self._thread.start()
+
+    def __len__(self):
+        return len(self._events)
+
+    def notify(self, text: str):
+        """Не блокує: подія піде в найближчий дайджест."""
+        # без async-рушія asyncio навіть не імпортований (холодний старт) — і loop шукати нема де
+        asyncio = sys.modules.get("asyncio")
+        if self._loop is None and asyncio is not None:
+            try:
+                # async-клієнт відправляє лише з свого loop — запамʼятовуємо його з хендлера
+                self._loop = asyncio.get_running_loop()
+            except RuntimeError:
+                pass
+        with self._cond:
+            if self._closed:
+                return
+            if len(self._events) == self._events.maxlen:
+                self.dropped += 1
+            self._events.append((time.monotonic(), text))
+            self.events += 1
+            self._cond.notify()
+
+    # ---- фоновий потік ----
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            for text in digest_messages(batch) if batch else ():
+                for chat_id in self.chats:
+                    self._deliver(chat_id, text)
+            with self._cond:
+                due = []
+                while self._retries and self._retries[0][0] <= time.monotonic():
+                    due.append(heapq.heappop(self._retries))
+            for _, _, chat_id, text, attempt in due:
+                self._deliver(chat_id, text, attempt)
+
+    def _retry_in(self):
+        """Секунд до найближчого повтору (None — повторів немає)."""
+        return self._retries[0][0] - time.monotonic() if self._retries else None
+
+    def _next_batch(self):
+        """
+        Чекає першу подію, далі — до кінця вікна або поки не назбирається max_batch.
+        [] — подій ще немає, але настав час повтору; None — закрито.
+        """
+        with self._cond:
+            while not self._events and not self._closed:
+                retry_in = self._retry_in()
+                if retry_in is not None and retry_in <= 0:
+                    return []
+                self._cond.wait(retry_in)
+            if not self._events:
+                if self._retries:
+                    self.failed += len(self._retries)
+                    logger.error("notifier: closing, %d digests not delivered", len(self._retries))
+                return None
+            deadline = self._events[0][0] + self.window
+            while len(self._events) < self.max_batch and not self._closed:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    break
+                retry_in = self._retry_in()
+                if retry_in is not None and retry_in <= 0:
+                    return []       # події лишаються у вікні, спершу повтори
+                self._cond.wait(left if retry_in is None else min(left, retry_in))
+            count = min(self.max_batch, len(self._events))
+            return [self._events.popleft()[1] for _ in range(count)]
+
+    def _deliver(self, chat_id, text, attempt=0):
+        """Ставить відправку в чергу клієнта і одразу повертається; результат — у _sent."""
+        with self._cond:
+            self.inflight += 1
+        try:
+            future = self._send(chat_id, text)
+        except Exception as e:
+            self._settle(chat_id, text, attempt, e)
+            return
+        future.add_done_callback(lambda f: self._sent(f, chat_id, text, attempt))
+
+    def _sent(self, future, chat_id, text, attempt):
+        # потік клієнта (або loop async-клієнта) — тому все спільне під _cond
+        if future.cancelled():
+            self._settle(chat_id, text, attempt, RuntimeError("send cancelled"))
+        else:
+            self._settle(chat_id, text, attempt, future.exception())
+
+    def _settle(self, chat_id, text, attempt, error):
+        with self._cond:
+            self.inflight -= 1
+            if error is None:
+                self.digests += 1
+                return
+            if not _retryable(error) or attempt == self.max_retries or self._closed:
+                self.failed += 1
+                logger.error("notifier: giving up on chat %s: %s", chat_id, error)
+                return
+            self.retries += 1
+            delay = min(60.0, self.backoff * 2 ** attempt)
+            logger.warning("notifier: chat %s failed (%s), retry in %.0fs", chat_id, error, delay)
+            heapq.heappush(self._retries, (time.monotonic() + delay, next(self._seq), chat_id, text, attempt + 1))
+            self._cond.notify()
+
+    def _send(self, chat_id, text):
+        # parse_mode="" — текст клієнта без розмітки, щоб <, * чи _ не зламали повідомлення
+        if self._loop is None:
+            return self.api.send_message(chat_id, text, priority=PRIORITY_BULK, parse_mode="")
+
+        import asyncio
+
+        async def send():
+            return await self.api.send_message(chat_id, text, priority=PRIORITY_BULK, parse_mode="")
+        return asyncio.run_coroutine_threadsafe(send(), self._loop)
+
+    def close(self, timeout=10.0):
+        """Відправляє те, що вже назбиралось (без очікування вікна і повторів)."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout)
+
+
+def notifier_from_env(api, metrics=None):
+    """NOTIFY_CHATS — chat_id операторів через кому (пусто -> без сповіщень); NOTIFY_WINDOW, NOTIFY_BATCH"""
+    chats = [int(chat) for chat in os.getenv("NOTIFY_CHATS", "").replace(" ", "").split(",") if chat]
+    if not chats:
+        return None
+    notifier = Notifier(
+        api,
+        chats,
+        window=float(os.getenv("NOTIFY_WINDOW", "3")),
+        max_batch=int(os.getenv("NOTIFY_BATCH", "20")),
+    )
+    atexit.register(notifier.close)
+    if metrics is not None:
+        metrics.watch_notifier(notifier)
+    return notifier
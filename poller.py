@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+Long polling з контрольованою паралельністю і збереженим offset.
+
+- getUpdates забирає пачку, апдейти розходяться в UpdateQueue: обмежений пул
+  воркерів, один чат — строго по черзі, повільний хендлер не тримає всю пачку
+- наступний getUpdates підтверджує попередню пачку в Telegram, тому перед ним
+  чекпойнт (offset + ще не оброблені апдейти) атомарно пишеться на диск;
+  після рестарту необроблені апдейти обробляються першими, далі — з offset
+- lag: скільки апдейт чекав від отримання до кінця обробки (bot_poll_lag_seconds)
+- вебхук знімається лише тоді, коли getUpdates відповів 409 (він ще стоїть)
+
+    poller = poller_from_env(bot, deduper=DEDUP, metrics=METRICS)
+    drain_on_signal(poller)
+    poller.run()
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from telebot import apihelper
+from telebot.types import Update
+
+from tg_client import webhook_conflict
+from update_queue import UpdateQueue, run_handlers_inline, update_chat_id
+
+logger = logging.getLogger(__name__)
+
+
+class Poller:
+    def __init__(self, bot, workers=4, maxsize=1000, checkpoint=None, timeout=60, limit=100,
+                 checkpoint_interval=1.0, deduper=None, limiter=None, recorder=None, metrics=None,
+                 name="poll"):
+        run_handlers_inline(bot)
+        self.bot = bot
+        self.checkpoint = checkpoint
+        self.checkpoint_interval = checkpoint_interval
+        self.timeout = timeout
+        # пачка getUpdates не більша за чергу: інакше умова в run() не виконується ніколи
+        # і бот мовчки перестає забирати апдейти
+        self.limit = max(1, min(limit, maxsize))
+        self.deduper = deduper
+        self.limiter = limiter    # flood.FloodLimiter: зайві апдейти користувача не доходять до хендлерів
+        self.recorder = recorder  # recorder.UpdateRecorder: сирі апдейти для bench/replay.py
+        self.metrics = metrics
+        self.name = name
+
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._order = deque()     # update_id у порядку отримання, ще не підтверджені
+        self._done = set()        # оброблені, але перед ними ще є необроблені
+        self._pending = {}        # update_id -> (сирий dict, коли отримано)
+        self._dirty = False
+        self._stop = threading.Event()
+
+        self.offset = None        # наступний offset для getUpdates
+        self.acked = None         # усі update_id до цього включно оброблені
+        self.fetched = 0
+        self.handled = 0
+
+        self.queue = UpdateQueue(self._handle, workers=workers, maxsize=maxsize,
+                                 key=lambda item: update_chat_id(item[1]), name=name)
+        self._restore()
+
+        self._saver = None
+        if checkpoint:
+            self._saver = threading.Thread(target=self._persist_loop, name=f"{name}-checkpoint", daemon=True)
+            self._saver.start()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def oldest_pending_age(self) -> float:
+        with self._lock:
+            if not self._order:
+                return 0.0
+            return time.monotonic() - self._pending[self._order[0]][1]
+
+    # ---- отримання ----
+    def run(self):
+        """Блокує до stop()/close()."""
+        while not self._stop.is_set():
+            if len(self.queue) > self.queue.maxsize - self.limit:
+                # не забираємо з Telegram більше, ніж вміщає черга
+                self._stop.wait(0.05)
+                continue
+            try:
+                batch = apihelper.get_updates(self.bot.token, offset=self.offset, limit=self.limit,
+                                              long_polling_timeout=self.timeout)
+            except Exception as e:
+                if self._stop.is_set():
+                    break
+                if webhook_conflict(e):
+                    # вебхук знімаємо лише якщо він справді стоїть — звичайний старт без зайвих запитів
+                    logger.info("%s: webhook is set, removing it for polling", self.name)
+                    self.bot.remove_webhook()
+                    continue
+                logger.exception("%s: getUpdates failed", self.name)
+                self._stop.wait(3)
+                continue
+            if batch:
+                self._accept(batch)
+
+    def _accept(self, batch):
+        if self.recorder is not None:
+            for raw in batch:
+                self.recorder.record_update(raw)
+        with self._lock:
+            self.offset = batch[-1]["update_id"] + 1
+            self.fetched += len(batch)
+        fetched_at = self._track(batch)
+        # наступний getUpdates підтвердить пачку в Telegram — спершу на диск
+        self.save(force=True)
+        self._enqueue(batch, fetched_at)
+
+    def _track(self, batch) -> float:
+        now = time.monotonic()
+        with self._lock:
+            for raw in batch:
+                self._order.append(raw["update_id"])
+                self._pending[raw["update_id"]] = (raw, now)
+        return now
+
+    def _enqueue(self, batch, fetched_at):
+        for raw in batch:
+            update = Update.de_json(raw)
+            while not self.queue.put((fetched_at, update)):
+                time.sleep(0.01)
+
+    # ---- обробка ----
+    def _handle(self, item):
+        fetched_at, update = item
+        try:
+            if self.deduper is not None and self.deduper.seen(update.update_id):
+                return
+            if self.limiter is None or self.limiter.allow(update):
+                self.bot.process_new_updates([update])
+        finally:
+            if self.metrics is not None:
+                self.metrics.poll_lag.observe(time.monotonic() - fetched_at)
+            self._ack(update.update_id)
+
+    def _ack(self, update_id):
+        with self._lock:
+            self._pending.pop(update_id, None)
+            self._done.add(update_id)
+            while self._order and self._order[0] in self._done:
+                self.acked = self._order.popleft()
+                self._done.discard(self.acked)
+            self.handled += 1
+            self._dirty = True
+
+    # ---- чекпойнт ----
+    def _restore(self):
+        if not self.checkpoint:
+            return
+        try:
+            with open(self.checkpoint, encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError):
+            logger.warning("%s: cannot read checkpoint %s, starting from Telegram's offset",
+                           self.name, self.checkpoint)
+            return
+        self.offset = state.get("offset")
+        pending = state.get("pending", [])
+        if pending:
+            logger.info("%s: resuming %d unhandled updates from %s", self.name, len(pending), self.checkpoint)
+            self._enqueue(pending, self._track(pending))
+
+    def save(self, force=False):
+        if not self.checkpoint:
+            return
+        with self._save_lock:
+            with self._lock:
+                if not (force or self._dirty):
+                    return
+                state = {
+                    "offset": self.offset,
+                    "pending": [self._pending[i][0] for i in self._order if i in self._pending],
+                }
+                self._dirty = False
+            tmp = self.checkpoint + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(state, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.checkpoint)
+
+    def _persist_loop(self):
+        while not self._stop.wait(self.checkpoint_interval):
+            try:
+                self.save()
+            except OSError:
+                logger.exception("%s: checkpoint failed", self.name)
+
+    # ---- зупинка ----
+    def stop(self):
+        self._stop.set()
+
+    def close(self, timeout=25.0) -> bool:
+        """Перестає забирати апдейти, доопрацьовує чергу і зберігає чекпойнт."""
+        self.stop()
+        drained = self.queue.close(timeout)
+        self.save(force=True)
+        return drained
+
+
+def poller_from_env(bot, deduper=None, limiter=None, recorder=None, metrics=None) -> Poller:
+    """
+    POLL_WORKERS, POLL_QUEUE_SIZE, POLL_CHECKPOINT (файл; пусто -> offset лише в памʼяті), POLL_TIMEOUT,
+    POLL_LIMIT (апдейтів за один getUpdates, 1..100; не більше POLL_QUEUE_SIZE)
+    """
+    poller = Poller(
+        bot,
+        workers=int(os.getenv("POLL_WORKERS", "4")),
+        maxsize=int(os.getenv("POLL_QUEUE_SIZE", "1000")),
+        checkpoint=os.getenv("POLL_CHECKPOINT", "").strip() or None,
+        timeout=int(os.getenv("POLL_TIMEOUT", "60")),
+        limit=min(100, int(os.getenv("POLL_LIMIT", "100"))),
+        deduper=deduper,
+        limiter=limiter,
+        recorder=recorder,
+        metrics=metrics,
+    )
+    if metrics is not None:
+        metrics.watch_poller(poller)
+    return poller
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+Запис сирих апдейтів з проду — щоб прогнати той самий трафік через нову збірку
+(bench/replay.py).
+
+- record() лише додає байти в буфер памʼяті; стискає й пише на диск фоновий потік
+  раз на flush_interval — webhook не чекає ні gzip, ні диска
+- формат: gzip, рядок на апдейт: "<unix-час>\\t<JSON апдейта>\\n"; після кожної пачки
+  gzip-потік скидається (Z_SYNC_FLUSH), тож файл читається і після аварії
+- ротація: новий файл updates-<дата-час>.jsonl.gz, коли поточний більший
+  за RECORD_ROTATE_MB або старший за RECORD_ROTATE_MIN хвилин
+- буфер обмежений (max_pending): якщо диск не встигає, апдейти не записуються
+  (dropped), а бот працює далі
+
+    RECORDER = recorder_from_env(METRICS)   # RECORD_DIR пусто -> вимкнено
+    RECORDER.record(request.data)           # webhook: сирі байти
+    RECORDER.record_update(raw_dict)        # polling: dict з getUpdates
+"""
+
+import atexit
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "updates-"
+SUFFIX = ".jsonl.gz"
+
+
+def log_files(directory) -> list:
+    """Файли запису за часом створення (імʼя містить дату-час)."""
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return [os.path.join(directory, name) for name in sorted(names)
+            if name.startswith(PREFIX) and name.endswith(SUFFIX)]
+
+
+def read_log(path):
+    """(unix-час, JSON апдейта як bytes) з каталогу або одного файлу; недописаний хвіст пропускається."""
+    paths = log_files(path) if os.path.isdir(path) else [path]
+    for file_path in paths:
+        try:
+            with gzip.open(file_path, "rb") as f:
+                for line in f:
+                    stamp, sep, raw = line.rstrip(b"\n").partition(b"\t")
+                    if sep and raw:
+                        yield float(stamp), raw
+        except (EOFError, OSError):
+            # файл, який ще пишеться або обірвався на аварії — читаємо, скільки є
+            continue
+
+
+class UpdateRecorder:
+    def __init__(self, directory, rotate_bytes=64 * 2**20, rotate_seconds=3600,
+                 flush_interval=1.0, max_pending=100000, level=6):
+        self.directory = directory
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.level = level
+
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._pending = []
+        self._stop = threading.Event()
+        self._file = None
+        self._raw = None
+        self._opened = 0.0
+
+        self.recorded = 0
+        self.dropped = 0
+        self.files = 0
+
+        self._thread = threading.Thread(target=self._loop, name="recorder", daemon=True)
+        self._thread.start()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def record(self, raw: bytes, stamp=None):
+        """Сирий JSON апдейта (тіло webhook-запиту); stamp — unix-час, якщо не «зараз»."""
+        if b"\n" in raw:
+            # рядок на апдейт: переводимо в компактний JSON (Telegram так і шле, це для ручних запитів)
+            try:
+                raw = json.dumps(json.loads(raw), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            except ValueError:
+                return
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return
+            self._pending.append((time.time() if stamp is None else stamp, raw))
+
+    def record_update(self, update: dict, stamp=None):
+        self.record(json.dumps(update, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), stamp)
+
+    # ---- фоновий потік ----
+    def _loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self._flush_safe()
+        self._flush_safe()
+        if self._file is not None:
+            self._file.close()
+            self._raw.close()
+
+    def _flush_safe(self):
+        try:
+            self.flush()
+        except OSError:
+            logger.exception("recorder: write failed")
+
+    def flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return
+        if self._file is None or self._should_rotate():
+            self._rotate()
+        self._file.write(b"".join(b"%.3f\t%s\n" % (stamp, raw) for stamp, raw in batch))
+        self._file.flush()       # Z_SYNC_FLUSH: усе записане вже можна розпакувати
+        self.recorded += len(batch)
+
+    def _should_rotate(self) -> bool:
+        return (self._raw.tell() >= self.rotate_bytes
+                or time.monotonic() - self._opened >= self.rotate_seconds)
+
+    def _rotate(self):
+        if self._file is not None:
+            self._file.close()
+            self._raw.close()
+        now = time.time()
+        # UTC з мілісекундами: імена сортуються в порядку запису
+        name = time.strftime("%Y%m%d-%H%M%S", time.gmtime(now)) + f"-{int(now * 1000) % 1000:03d}"
+        self._raw = open(os.path.join(self.directory, f"{PREFIX}{name}{SUFFIX}"), "xb")
+        self._file = gzip.GzipFile(fileobj=self._raw, mode="wb", compresslevel=self.level)
+        self._opened = time.monotonic()
+        self.files += 1
+
+    def close(self, timeout=10.0):
+        self._stop.set()
+        self._thread.join(timeout)
+
+
+def recorder_from_env(metrics=None):
+    """RECORD_DIR (пусто -> не записувати), RECORD_ROTATE_MB, RECORD_ROTATE_MIN"""
+    directory = os.getenv("RECORD_DIR", "").strip()
+    if not directory:
+        return None
+    recorder = UpdateRecorder(
+        directory,
+        rotate_bytes=int(float(os.getenv("RECORD_ROTATE_MB", "64")) * 2**20),
+        rotate_seconds=float(os.getenv("RECORD_ROTATE_MIN", "60")) * 60,
+    )
+    atexit.register(recorder.close)
+    if metrics is not None:
+        metrics.watch_recorder(recorder)
+    return recorder
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Маршрутизація апдейтів без ланцюжків if.
+
+- callback_data: точні значення -> dict, префікси (на кшталт "pkg_") -> trie
+- текстові тригери (startswith / «містить») -> trie, зкомпільований у regex;
+  з кількох тригерів у тексті виграє правило, зареєстроване раніше
+
+Вартість dispatch не залежить від кількості пунктів меню:
+dict-пошук + прохід trie довжиною в сам callback_data + один прохід regex по тексту.
+"""
+
+import re
+
+
+def _trie_regex(words):
+    """
+    Слова -> regex зі спільними префіксами (trie): на кожній позиції тексту
+    перевіряються лише гілки з потрібною літерою, а не всі тригери підряд.
+    Груп у regex немає — правило знаходиться по самому збігу (m.group()).
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[None] = True
+    return _node_regex(trie)
+
+
+def _node_regex(node):
+    alts = []
+    for ch, child in node.items():
+        if ch is not None:
+            alts.append(re.escape(ch) + _node_regex(child))
+    if not alts:
+        return ""
+    body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+    if None in node:
+        # тригер закінчується тут, але є й довші — беремо довший, якщо він є
+        body = "(?:" + body + ")?"
+    return body
+
+
+class Router:
+    def __init__(self):
+        self._exact = {}        # callback_data -> handler(call)
+        self._trie = {}         # символ -> вузол; вузол[None] = handler(call, suffix)
+        self._default = None    # handler(call)
+
+        self._text_rules = []   # [(starts, contains, handler)]
+        self._text_starts = {}  # тригер -> handler(message)
+        self._text_contains = {}
+        self._text_re = None
+
+    # ---- реєстрація ----
+    def callback(self, *values):
+        def deco(fn):
+            for value in values:
+                self._exact[value] = fn
+            return fn
+        return deco
+
+    def prefix(self, value):
+        """handler(call, suffix) для callback_data, що починається з value."""
+        def deco(fn):
+            node = self._trie
+            for ch in value:
+                node = node.setdefault(ch, {})
+            node[None] = fn
+            return fn
+        return deco
+
+    def default(self, fn):
+        self._default = fn
+        return fn
+
+    def text(self, starts=(), contains=()):
+        """handler(message) для тексту, що починається з starts або містить contains."""
+        def deco(fn):
+            self._text_rules.append((tuple(starts), tuple(contains), fn))
+            self._text_re = None
+            return fn
+        return deco
+
+    # ---- пошук ----
+    def resolve_callback(self, data: str):
+        """-> (handler, args) ; args — те, що треба передати після call."""
+        handler = self._exact.get(data)
+        if handler is not None:
+            return handler, ()
+
+        found, found_at = None, 0
+        node = self._trie
+        for i, ch in enumerate(data):
+            node = node.get(ch)
+            if node is None:
+                break
+            if None in node:
+                found, found_at = node[None], i + 1
+        if found is not None:
+            return found, (data[found_at:],)
+
+        return self._default, ()
+
+    def route_label(self, data: str) -> str:
+        """Назва маршруту для метрик: саме значення, "префікс*" або "unknown" (обмежена кардинальність)."""
+        if data in self._exact:
+            return data
+        node, label = self._trie, None
+        for i, ch in enumerate(data):
+            node = node.get(ch)
+            if node is None:
+                break
+            if None in node:
+                label = data[:i + 1] + "*"
+        return label or "unknown"
+
+    def dispatch_callback(self, call) -> bool:
+        handler, args = self.resolve_callback((call.data or "").strip())
+        if handler is None:
+            return False
+        handler(call, *args)
+        return True
+
+    def _compile_text(self):
+        # тригер -> (номер правила, handler): перше зареєстроване правило має перевагу
+        starts, contains = {}, {}
+        for index, (rule_starts, rule_contains, fn) in enumerate(self._text_rules):
+            for word in rule_starts:
+                starts.setdefault(word, (index, fn))
+            for word in rule_contains:
+                contains.setdefault(word, (index, fn))
+        self._text_starts = starts
+        self._text_contains = contains
+        # без правил -> regex, який ніколи не спрацьовує
+        self._starts_re = re.compile(_trie_regex(starts) if starts else r"(?!)")
+        # lookahead: збіги з кожної позиції, зокрема ті, що перекриваються
+        self._text_re = re.compile("(?=(" + _trie_regex(contains) + "))" if contains else r"(?!)")
+
+    @staticmethod
+    def _best(word, triggers, best):
+        """Найменший номер правила серед тригерів, якими починається word (trie бере найдовший)."""
+        for end in range(1, len(word) + 1):
+            rule = triggers.get(word[:end])
+            if rule is not None and (best is None or rule[0] < best[0]):
+                best = rule
+        return best
+
+    def match_text(self, text: str):
+        """
+        Хендлер для тексту або None.
+        Якщо в тексті кілька тригерів — виграє правило, зареєстроване раніше
+        (як у ланцюжку if), а не тригер, що стоїть у тексті раніше.
+        """
+        if self._text_re is None:
+            self._compile_text()
+        best = None
+        m = self._starts_re.match(text)
+        if m is not None:
+            best = self._best(m.group(), self._text_starts, best)
+        for m in self._text_re.finditer(text):
+            if best is not None and best[0] == 0:
+                break
+            best = self._best(m.group(1), self._text_contains, best)
+        return best[1] if best is not None else None
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+Реєстр екранів: (текст, parse_mode, reply_markup) збираються один раз при старті.
+
+Клавіатура одразу серіалізується в JSON-рядок — telebot передає рядок
+як є (apihelper._convert_markup), тож на кожен апдейт не створюються
+нові InlineKeyboardMarkup і не викликається to_json().
+
+    SCREENS.add("home", SCREEN_HOME, kb_main())
+    SCREENS["home"]                              # готовий Screen
+    SCREENS["diag_result"].render(summary=...)   # екран з параметрами
+"""
+
+
+class Screen:
+    __slots__ = ("name", "text", "parse_mode", "markup")
+
+    def __init__(self, name, text, markup=None, parse_mode=None):
+        self.name = name
+        self.text = text
+        self.parse_mode = parse_mode
+        # InlineKeyboardMarkup -> JSON один раз; рядок лишаємо як є
+        self.markup = markup.to_json() if hasattr(markup, "to_json") else markup
+
+    def render(self, **params) -> "Screen":
+        """Копія екрана з підставленими параметрами; клавіатура — та сама."""
+        screen = Screen.__new__(Screen)
+        screen.name = self.name
+        screen.text = self.text.format(**params)
+        screen.parse_mode = self.parse_mode
+        screen.markup = self.markup
+        return screen
+
+    def __repr__(self):
+        return f"<Screen {self.name}>"
+
+
+class ScreenRegistry:
+    def __init__(self, parse_mode=None):
+        self.parse_mode = parse_mode
+        self._screens = {}
+
+    def add(self, name, text, markup=None, parse_mode=None) -> Screen:
+        screen = Screen(name, text, markup, parse_mode or self.parse_mode)
+        self._screens[name] = screen
+        return screen
+
+    def __getitem__(self, name) -> Screen:
+        return self._screens[name]
+
+    def __contains__(self, name):
+        return name in self._screens
+
+    def __iter__(self):
+        return iter(self._screens.values())
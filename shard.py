@@ -0,0 +1,405 @@
+# -*- coding: utf-8 -*-
+"""
+Горизонтальне масштабування: фронт-процес + N процесів-воркерів, апдейти шардуються за chat_id.
+
+    SHARD_BOT=bot SHARDS=4 WEBHOOK_URL=https://<домен> BOT_TOKEN=... python shard.py
+    SHARD_BOT=bot_ai_master_v1 SHARDS=4 BOT_TOKEN=... python shard.py        # polling
+
+- фронт приймає webhook (або сам робить getUpdates), відсікає повтори (DEDUP_*) і флуд (FLOOD_*)
+  і віддає сирий JSON апдейту воркеру jump_hash(chat_id, N) через Pipe
+- чат завжди потрапляє в той самий воркер, тому стан FSM (USER_STATE, PENDING_DIAG…)
+  лишається локальним для процесу; STATE_DB можна тримати спільним (SQLite WAL) —
+  тоді стан не губиться і при зміні SHARDS; журнал заявок — JOURNAL_DIR/shard<i>
+- усередині воркера — звичайна UpdateQueue з доріжками по чатах (SHARD_THREADS потоків)
+- воркер підтверджує кожен оброблений апдейт; якщо процес упав, фронт піднімає
+  його знову і повторно надсилає все непідтверджене (at-least-once)
+- кожна черга шарда обмежена: коли повна — webhook віддає 503, Telegram повторить
+"""
+
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+from dedup import deduper_from_env
+from flood import flood_from_env
+from recorder import recorder_from_env
+from metrics import CONTENT_TYPE, Registry
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# ENV
+# =========================
+SHARD_BOT = os.getenv("SHARD_BOT", "bot").strip()        # модуль бота: bot / bot_ai_master_v1
+SHARDS = int(os.getenv("SHARDS", str(os.cpu_count() or 1)))
+SHARD_THREADS = int(os.getenv("SHARD_THREADS", "4"))     # потоків обробки в кожному воркері
+SHARD_QUEUE_SIZE = int(os.getenv("SHARD_QUEUE_SIZE", "1000"))
+SHARD_INFLIGHT = int(os.getenv("SHARD_INFLIGHT", "256"))  # непідтверджених апдейтів на воркер
+BOT_TOKEN = os.getenv("BOT_TOKEN", "").strip()
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").strip()
+PORT = int(os.getenv("PORT", "10000"))
+METRICS_PORT = os.getenv("METRICS_PORT", "").strip()     # воркер i -> METRICS_PORT + 1 + i
+SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", "25"))
+FLOOD_NOTICE = "⏳ Занадто часто — зачекай кілька секунд і повтори."
+
+_HEADER = struct.Struct("!Q")   # seq апдейта в повідомленні фронт <-> воркер
+_CTX = multiprocessing.get_context("spawn")
+_MASK64 = 0xFFFFFFFFFFFFFFFF
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """Jump consistent hash (Lamping, Veach): при зміні кількості шардів переїжджає ~1/N чатів."""
+    key &= _MASK64
+    b, j = -1, 0
+    while j < buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & _MASK64
+        j = int((b + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return b
+
+
+def raw_chat_id(update: dict) -> int:
+    """update_queue.update_chat_id для сирого JSON — фронт не будує telebot-обʼєкти."""
+    for field in ("message", "edited_message", "channel_post", "edited_channel_post"):
+        msg = update.get(field)
+        if msg:
+            return msg["chat"]["id"]
+
+    call = update.get("callback_query")
+    if call:
+        msg = call.get("message")
+        return msg["chat"]["id"] if msg else call["from"]["id"]
+
+    for field in ("inline_query", "chosen_inline_result", "shipping_query",
+                  "pre_checkout_query", "my_chat_member", "chat_member", "chat_join_request"):
+        obj = update.get(field)
+        if obj:
+            if obj.get("from"):
+                return obj["from"]["id"]
+            if obj.get("chat"):
+                return obj["chat"]["id"]
+
+    return update["update_id"]
+
+
+# =========================
+# Воркер (окремий процес)
+# =========================
+def _shard_journal(index: int) -> str:
+    """Журнал заявок пише один процес — кожен шард у свій підкаталог JOURNAL_DIR."""
+    base = os.getenv("JOURNAL_DIR", "").strip()
+    return os.path.join(base, f"shard{index}") if base else ""
+
+
+def worker_main(module_name, index, conn, threads, metrics_port=None):
+    # зупинкою керує фронт: закриває Pipe, воркер доопрацьовує чергу і виходить
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+    from telebot.types import Update
+
+    from host import import_bot
+    from metrics import serve_metrics
+    from update_queue import UpdateQueue, update_chat_id
+
+    # дедуплікацію, флуд-ліміт і запис апдейтів робить фронт; власна черга/потоки бота не потрібні
+    module = import_bot(f"shard{index}_{module_name}", module_name,
+                        {"UPDATE_WORKERS": "0", "ENGINE": "sync", "DEDUP_FILE": "",
+                         "FLOOD_LIMITS": "", "FLOOD_REPEAT": "0", "RECORD_DIR": "",
+                         "JOURNAL_DIR": _shard_journal(index)})
+    if metrics_port and hasattr(module, "METRICS"):
+        funnel = getattr(module, "FUNNEL", None)
+        serve_metrics(module.METRICS.registry, metrics_port,
+                      routes={"/funnel": funnel.http_view} if funnel is not None else None)
+
+    send_lock = threading.Lock()
+
+    def handle(item):
+        seq, update = item
+        try:
+            module.bot.process_new_updates([update])
+        finally:
+            with send_lock:
+                conn.send_bytes(_HEADER.pack(seq))
+
+    updates = UpdateQueue(handle, workers=threads, maxsize=SHARD_INFLIGHT,
+                          key=lambda item: update_chat_id(item[1]), name=f"shard-{index}")
+    while True:
+        try:
+            data = conn.recv_bytes()
+        except (EOFError, OSError):
+            break
+        seq, = _HEADER.unpack_from(data)
+        update = Update.de_json(data[_HEADER.size:].decode("utf-8"))
+        while not updates.put((seq, update)):
+            time.sleep(0.005)
+    updates.close(SHUTDOWN_TIMEOUT)
+
+
+# =========================
+# Фронт
+# =========================
+class Shard:
+    """Один процес-воркер + його черга і непідтверджені апдейти на боці фронту."""
+
+    def __init__(self, index, module_name, threads=4, maxsize=1000, max_inflight=256, metrics_port=None):
+        self.index = index
+        self.module_name = module_name
+        self.threads = threads
+        self.max_inflight = max_inflight
+        self.metrics_port = metrics_port
+
+        self._queue = queue.Queue(maxsize)
+        self._inflight = OrderedDict()   # seq -> JSON апдейта, ще не підтверджений воркером
+        self._seq = itertools.count(1)
+        self._stop = threading.Event()
+        self._started = 0.0
+
+        self.processed = 0
+        self.rejected = 0
+        self.restarts = 0
+
+        self._spawn()
+        self._thread = threading.Thread(target=self._pump, name=f"shard-{index}", daemon=True)
+        self._thread.start()
+
+    def submit(self, raw: bytes) -> bool:
+        try:
+            self._queue.put_nowait(raw)
+        except queue.Full:
+            self.rejected += 1
+            return False
+        return True
+
+    def __len__(self):
+        return self._queue.qsize() + len(self._inflight)
+
+    def _spawn(self):
+        parent, child = _CTX.Pipe()
+        self.process = _CTX.Process(
+            target=worker_main, name=f"shard-{self.index}", daemon=True,
+            args=(self.module_name, self.index, child, self.threads, self.metrics_port),
+        )
+        self.process.start()
+        child.close()
+        self._conn = parent
+        self._started = time.monotonic()
+
+    def _restart(self):
+        logger.error("shard %d: worker died (exit code %s), restarting with %d unacked updates",
+                     self.index, self.process.exitcode, len(self._inflight))
+        self._conn.close()
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        if time.monotonic() - self._started < 1.0:
+            time.sleep(1.0)   # воркер падає одразу (напр. на імпорті) — не крутимо цикл
+        self.restarts += 1
+        self._spawn()
+        try:
+            for seq, raw in self._inflight.items():
+                self._conn.send_bytes(_HEADER.pack(seq) + raw)
+        except OSError:
+            pass   # новий воркер теж упав — наступна ітерація _pump перезапустить ще раз
+
+    def _drain_acks(self):
+        while self._conn.poll():
+            seq, = _HEADER.unpack(self._conn.recv_bytes())
+            if self._inflight.pop(seq, None) is not None:
+                self.processed += 1
+
+    def _pump(self):
+        while not (self._stop.is_set() and self._queue.empty() and not self._inflight):
+            try:
+                self._drain_acks()
+                if len(self._inflight) >= self.max_inflight:
+                    self._conn.poll(0.05)
+                    continue
+                try:
+                    raw = self._queue.get(timeout=0.05)
+                except queue.Empty:
+                    if not self.process.is_alive():
+                        raise EOFError
+                    continue
+                seq = next(self._seq)
+                self._inflight[seq] = raw
+                self._conn.send_bytes(_HEADER.pack(seq) + raw)
+            except (EOFError, OSError):
+                self._restart()
+        # усе підтверджено -> закриваємо Pipe, воркер виходить сам
+        self._conn.close()
+        self.process.join(SHUTDOWN_TIMEOUT)
+
+    def close(self, timeout=25.0):
+        self._stop.set()
+        self._thread.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+class ShardRouter:
+    def __init__(self, module_name, shards, threads=4, maxsize=1000, max_inflight=256, metrics_port=None,
+                 answer=None, notice=None):
+        self.shards = [
+            Shard(i, module_name, threads, maxsize, max_inflight,
+                  metrics_port + 1 + i if metrics_port else None)
+            for i in range(shards)
+        ]
+        self.dedup = deduper_from_env()
+        # answer — answer_callback_query клієнта фронту: відкинуті натискання теж отримують відповідь;
+        # notice(chat_id) — «занадто часто». Стану користувачів фронт не бачить (він у воркерах),
+        # тож exempt тут немає: FLOOD_LIMITS для message у шардованому режимі — із запасом на альбоми.
+        self.flood = flood_from_env(answer=answer, notice=notice)
+        self.recorder = recorder_from_env()
+
+        self.registry = Registry()
+        self.webhook_latency = self.registry.histogram(
+            "shard_webhook_request_seconds", "Webhook HTTP request handling time", ("status",))
+        self.registry.gauge("shard_backlog", "Updates queued or unacked per worker",
+                            lambda: {str(s.index): len(s) for s in self.shards}, ("shard",))
+        self.registry.counter_value("shard_processed_total", "Updates acknowledged per worker",
+                                    lambda: {str(s.index): s.processed for s in self.shards}, ("shard",))
+        self.registry.counter_value("shard_restarts_total", "Worker process restarts",
+                                    lambda: {str(s.index): s.restarts for s in self.shards}, ("shard",))
+        self.registry.counter_value("shard_rejected_total", "Updates rejected because the shard queue was full",
+                                    lambda: {str(s.index): s.rejected for s in self.shards}, ("shard",))
+        self.registry.counter_value("bot_updates_deduplicated_total", "Redelivered updates dropped by update_id",
+                                    lambda: self.dedup.dropped)
+        if self.flood is not None:
+            self.registry.counter_value("bot_flood_dropped_total", "Inbound updates dropped by the flood limiter",
+                                        lambda: dict(self.flood.dropped), ("type", "reason"))
+
+    def route(self, raw: bytes) -> int:
+        """-> HTTP-статус для webhook: 200 / 400 (не апдейт) / 503 (шард переповнений)."""
+        status, shard, update_id = self.admit(raw)
+        if shard is None:
+            return status
+        if shard.submit(raw):
+            return 200
+        # Telegram повторить доставку — повтор не має відсіктись як дубль
+        self.dedup.forget(update_id)
+        return 503
+
+    def admit(self, raw: bytes):
+        """
+        Запис, дедуплікація, флуд-ліміт і вибір шарда -> (статус, шард, update_id);
+        шард None — апдейт уже вирішено (400, повтор, флуд), інакше його треба submit().
+        """
+        if self.recorder is not None:
+            self.recorder.record(raw)
+        try:
+            update = json.loads(raw)
+            update_id = update["update_id"]
+            chat_id = raw_chat_id(update)
+        except (ValueError, KeyError, TypeError):
+            return 400, None, None
+        if self.dedup.seen(update_id):
+            return 200, None, update_id
+        if self.flood is not None and not self.flood.allow_raw(update):
+            return 200, None, update_id
+        return 200, self.shards[jump_hash(chat_id, len(self.shards))], update_id
+
+    def processed(self) -> int:
+        return sum(s.processed for s in self.shards)
+
+    def close(self, timeout=25.0):
+        for shard in self.shards:
+            shard._stop.set()
+        for shard in self.shards:
+            shard.close(timeout)
+        self.dedup.close()
+
+
+def make_app(router: ShardRouter):
+    # Flask імпортується лише фронтом у webhook-режимі: воркери (spawn) перечитують цей модуль
+    from flask import Flask, Response, request
+
+    app = Flask(__name__)
+
+    @app.get("/")
+    def health():
+        return "OK", 200
+
+    @app.post("/webhook")
+    def webhook():
+        started = time.perf_counter()
+        status = router.route(request.get_data())
+        router.webhook_latency.observe(time.perf_counter() - started, str(status))
+        return ("OK" if status == 200 else "Busy" if status == 503 else "Bad Request"), status
+
+    @app.get("/metrics")
+    def metrics():
+        return Response(router.registry.render(), content_type=CONTENT_TYPE)
+
+    return app
+
+
+def poll_forever(router: ShardRouter, token: str, timeout=60):
+    """getUpdates на фронті: offset зсувається лише після того, як апдейт прийняв шард."""
+    from telebot import apihelper
+
+    from tg_client import webhook_conflict
+
+    offset = None
+    while True:
+        try:
+            updates = apihelper.get_updates(token, offset=offset, timeout=timeout, long_polling_timeout=timeout)
+        except Exception as e:
+            if webhook_conflict(e):
+                # вебхук ще стоїть (перехід з webhook) — знімаємо лише тепер
+                apihelper.delete_webhook(token)
+                continue
+            logger.exception("getUpdates failed")
+            time.sleep(3)
+            continue
+        for update in updates:
+            raw = json.dumps(update, ensure_ascii=False).encode("utf-8")
+            _, shard, _ = router.admit(raw)
+            # шард переповнений — чекаємо місця; offset зсувається лише після submit()
+            while shard is not None and not shard.submit(raw):
+                time.sleep(0.05)
+            offset = update["update_id"] + 1
+
+
+# =========================
+# ENTRYPOINT
+# =========================
+if __name__ == "__main__":
+    import sys
+
+    import telebot
+
+    if not BOT_TOKEN:
+        raise RuntimeError("BOT_TOKEN is missing. Set it in environment variables.")
+    from tg_client import client_from_env
+
+    front = telebot.TeleBot(BOT_TOKEN, threaded=False)
+    front_api = client_from_env(front)
+    router = ShardRouter(SHARD_BOT, SHARDS, SHARD_THREADS, SHARD_QUEUE_SIZE, SHARD_INFLIGHT,
+                         int(METRICS_PORT) if METRICS_PORT else None, answer=front_api.answer_callback_query,
+                         notice=lambda chat_id: front_api.send_message(chat_id, FLOOD_NOTICE))
+
+    def _stop(signum, frame):
+        logger.info("shard front: signal %s, draining...", signum)
+        router.close(SHUTDOWN_TIMEOUT)
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    if WEBHOOK_URL:
+        from tg_client import ensure_webhook, webhook_settings_from_env
+
+        ensure_webhook(front, f"{WEBHOOK_URL}/webhook", **webhook_settings_from_env())
+        make_app(router).run(host="0.0.0.0", port=PORT)
+    else:
+        print(f"Starting {SHARD_BOT} in polling mode with {SHARDS} shards...")
+        poll_forever(router, BOT_TOKEN)
@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+"""
+Сховище FSM-станів для обох ботів.
+
+StateStore = обмежений LRU-кеш у памʼяті + бекенд (SQLite у WAL-режимі).
+- читання: кеш -> незбережені зміни -> бекенд (відсутність теж кешується)
+- запис: одразу в кеш, у бекенд — пачками у фоновому потоці (write-behind)
+- TTL: сесії, які не змінювались довше за ttl, вважаються відсутніми
+  і періодично видаляються з бекенду
+
+Для коду ботів є «вигляди», схожі на звичайні dict/set:
+    USER_STATE = STORE.mapping("user_state")
+    PENDING_DIAG = STORE.flags("pending_diag")
+"""
+
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()   # у кеші: «ключа немає» (щоб не ходити в БД повторно)
+_DELETED = object()   # у черзі запису: «ключ треба видалити»
+
+
+# =========================
+# BACKENDS
+# =========================
+class StateBackend:
+    """Інтерфейс бекенду. Значення — вже серіалізовані рядки."""
+
+    def load(self, ns: str, key: str):
+        """-> (value, touched) або None"""
+        raise NotImplementedError
+
+    def save_many(self, rows):
+        """rows: [(ns, key, value | None, touched)], None -> видалити"""
+        raise NotImplementedError
+
+    def expire(self, older_than: float) -> int:
+        raise NotImplementedError
+
+    def count(self) -> int:
+        """Рядків у бекенді — дешево (без сканування), бо читається на кожен scrape метрик."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SQLiteBackend(StateBackend):
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        if path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS state ("
+            " ns TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, touched REAL NOT NULL,"
+            " PRIMARY KEY (ns, key)) WITHOUT ROWID"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS state_touched ON state (touched)")
+        # лічильник рядків ведеться при записі/видаленні; COUNT(*) — лише раз на старті
+        self._rows = self._db.execute("SELECT COUNT(*) FROM state").fetchone()[0]
+
+    def load(self, ns, key):
+        with self._lock:
+            return self._db.execute(
+                "SELECT value, touched FROM state WHERE ns = ? AND key = ?", (ns, key)
+            ).fetchone()
+
+    def save_many(self, rows):
+        upserts = [(ns, key, value, touched) for ns, key, value, touched in rows if value is not None]
+        deletes = [(ns, key) for ns, key, value, _ in rows if value is None]
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                # INSERT OR IGNORE, а для наявних — UPDATE: так видно, скільки рядків додалось
+                inserted = 0
+                for ns, key, value, touched in upserts:
+                    if self._db.execute("INSERT OR IGNORE INTO state (ns, key, value, touched) VALUES (?, ?, ?, ?)",
+                                        (ns, key, value, touched)).rowcount:
+                        inserted += 1
+                    else:
+                        self._db.execute("UPDATE state SET value = ?, touched = ? WHERE ns = ? AND key = ?",
+                                         (value, touched, ns, key))
+                deleted = 0
+                if deletes:
+                    deleted = self._db.executemany("DELETE FROM state WHERE ns = ? AND key = ?", deletes).rowcount
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            self._rows += inserted - deleted
+
+    def expire(self, older_than):
+        with self._lock:
+            removed = self._db.execute("DELETE FROM state WHERE touched < ?", (older_than,)).rowcount
+            self._rows -= removed
+            return removed
+
+    def count(self):
+        return self._rows
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+# =========================
+# STORE
+# =========================
+class StateStore:
+    def __init__(self, backend: StateBackend, cache_size=10000, ttl=7 * 86400,
+                 flush_interval=1.0, flush_batch=500, sweep_interval=600):
+        self.backend = backend
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.sweep_interval = sweep_interval
+
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()   # (ns, key) -> (value | _MISSING, touched)
+        self._dirty = {}              # (ns, key) -> (value | _DELETED, touched)
+        self._flushing = {}           # пачка, яка саме пишеться в бекенд
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+
+        self.hits = 0
+        self.misses = 0
+        self.flushed = 0
+
+        self._thread = threading.Thread(target=self._flusher, name="state-flusher", daemon=True)
+        self._thread.start()
+
+    # ---- базові операції ----
+    def _expired(self, touched, now):
+        return self.ttl and now - touched > self.ttl
+
+    def _remember(self, ck, value, touched):
+        cache = self._cache
+        cache[ck] = (value, touched)
+        cache.move_to_end(ck)
+        if len(cache) > self.cache_size:
+            cache.popitem(last=False)
+
+    def get(self, ns, key, default=None):
+        ck = (ns, key)
+        now = time.time()
+        with self._lock:
+            hit = self._cache.get(ck)
+            if hit is not None:
+                self.hits += 1
+                self._cache.move_to_end(ck)
+                value, touched = hit
+                if value is _MISSING or self._expired(touched, now):
+                    return default
+                return value
+            pending = self._dirty.get(ck) or self._flushing.get(ck)
+            self.misses += 1
+
+        if pending is not None:
+            value, touched = pending
+            value = _MISSING if value is _DELETED else value
+        else:
+            row = self.backend.load(ns, str(key))
+            if row is None:
+                value, touched = _MISSING, now
+            else:
+                value, touched = json.loads(row[0]), row[1]
+
+        with self._lock:
+            # поки читали БД, ключ міг бути записаний іншим потоком
+            if ck not in self._cache:
+                self._remember(ck, value, touched)
+            else:
+                value, touched = self._cache[ck]
+        if value is _MISSING or self._expired(touched, now):
+            return default
+        return value
+
+    def put(self, ns, key, value):
+        ck = (ns, key)
+        now = time.time()
+        with self._lock:
+            self._remember(ck, value, now)
+            self._dirty[ck] = (value, now)
+            backlog = len(self._dirty)
+        if backlog >= self.flush_batch:
+            self._wake.set()
+            if backlog >= 4 * self.flush_batch:
+                # фоновий потік не встигає — пишемо самі, щоб черга не росла
+                self.flush()
+
+    def delete(self, ns, key, default=None):
+        old = self.get(ns, key, _MISSING)
+        if old is _MISSING:
+            return default
+        ck = (ns, key)
+        now = time.time()
+        with self._lock:
+            self._remember(ck, _MISSING, now)
+            self._dirty[ck] = (_DELETED, now)
+        return old
+
+    def contains(self, ns, key) -> bool:
+        return self.get(ns, key, _MISSING) is not _MISSING
+
+    # ---- фонові задачі ----
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                if not self._dirty:
+                    return 0
+                batch, self._dirty = self._dirty, {}
+                self._flushing = batch
+            rows = [
+                (ns, str(key), None if value is _DELETED else json.dumps(value, ensure_ascii=False), touched)
+                for (ns, key), (value, touched) in batch.items()
+            ]
+            try:
+                self.backend.save_many(rows)
+            except Exception:
+                logger.exception("state flush failed, %d rows will be retried", len(rows))
+                with self._lock:
+                    for ck, item in batch.items():
+                        self._dirty.setdefault(ck, item)
+                    self._flushing = {}
+                return 0
+            with self._lock:
+                self._flushing = {}
+            self.flushed += len(rows)
+            return len(rows)
+
+    def sweep(self):
+        if not self.ttl:
+            return 0
+        removed = self.backend.expire(time.time() - self.ttl)
+        if removed:
+            logger.info("state: expired %d idle sessions", removed)
+        return removed
+
+    def _flusher(self):
+        next_sweep = time.monotonic() + self.sweep_interval
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+            if time.monotonic() >= next_sweep:
+                next_sweep = time.monotonic() + self.sweep_interval
+                try:
+                    self.sweep()
+                except Exception:
+                    logger.exception("state sweep failed")
+
+    def size(self) -> int:
+        """Точна кількість рядків: спершу дописує чергу запису."""
+        self.flush()
+        return self.backend.count()
+
+    def rows(self) -> int:
+        """Рядків у бекенді без flush — для метрик; незаписані зміни (до flush_interval) не враховані."""
+        return self.backend.count()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._thread.join(5)
+        self.flush()
+        self.backend.close()
+
+    # ---- вигляди для коду ботів ----
+    def mapping(self, ns: str) -> "StateMap":
+        return StateMap(self, ns)
+
+    def flags(self, ns: str) -> "StateFlags":
+        return StateFlags(self, ns)
+
+
+class StateMap:
+    """dict-подібний вигляд на один простір імен (get / pop / [] / in)."""
+
+    def __init__(self, store: StateStore, ns: str):
+        self.store = store
+        self.ns = ns
+
+    def get(self, key, default=None):
+        return self.store.get(self.ns, key, default)
+
+    def pop(self, key, default=None):
+        return self.store.delete(self.ns, key, default)
+
+    def __getitem__(self, key):
+        value = self.store.get(self.ns, key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.store.put(self.ns, key, value)
+
+    def __delitem__(self, key):
+        if self.store.delete(self.ns, key, _MISSING) is _MISSING:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return self.store.contains(self.ns, key)
+
+
+class StateFlags:
+    """set-подібний вигляд (add / discard / in) — зберігається як ключ -> 1."""
+
+    def __init__(self, store: StateStore, ns: str):
+        self.store = store
+        self.ns = ns
+
+    def add(self, key):
+        self.store.put(self.ns, key, 1)
+
+    def discard(self, key):
+        self.store.delete(self.ns, key)
+
+    def __contains__(self, key):
+        return self.store.contains(self.ns, key)
+
+
+def open_store(path=None) -> StateStore:
+    """
+    Сховище з налаштувань оточення:
+    STATE_DB (файл SQLite; пусто -> в памʼяті процесу), STATE_CACHE_SIZE, STATE_TTL (сек).
+    """
+    if path is None:
+        path = os.getenv("STATE_DB", "").strip() or ":memory:"
+    store = StateStore(
+        SQLiteBackend(path),
+        cache_size=int(os.getenv("STATE_CACHE_SIZE", "10000")),
+        ttl=int(os.getenv("STATE_TTL", str(7 * 86400))),
+    )
+    atexit.register(store.close)
+    return store
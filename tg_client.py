@@ -0,0 +1,508 @@
+# -*- coding: utf-8 -*-
+"""
+Вихідний шар до Telegram Bot API поверх telebot.TeleBot.
+
+- один keep-alive пул зʼєднань (requests.Session) на весь процес
+- глобальний token bucket (~30 повідомлень/с) + bucket на кожен чат (~1/с)
+- черга з пріоритетами: answer_callback_query ніколи не стоїть за розсилками
+- в одному чаті повідомлення йдуть строго по черзі (не більше 1 запиту в польоті)
+- 429 -> чекаємо retry_after і повторюємо; мережеві помилки -> backoff
+- статистика: скільки запит чекав у черзі, скільки було 429 / повторів
+- edit_message_text з тим самим вмістом, що вже показаний, не відправляється
+  (Telegram однаково відповів би "message is not modified")
+
+Виклики не блокують хендлер — повертається concurrent.futures.Future:
+    api = OutboundClient(bot)
+    api.send_message(chat_id, "текст")
+    api.answer_callback_query(call.id)
+"""
+
+import atexit
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import requests
+from telebot import apihelper
+from telebot.apihelper import ApiTelegramException
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_CALLBACK = 0   # answer_callback_query — користувач дивиться на «годинник»
+PRIORITY_USER = 1       # відповіді в чат на дію користувача
+PRIORITY_BULK = 2       # розсилки, сповіщення операторам
+
+_session_lock = threading.Lock()
+_shared_pool = None
+
+
+def install_session(pool_size=32):
+    """Один спільний keep-alive пул для всіх потоків telebot (замість сесії на потік)."""
+    with _session_lock:
+        if apihelper.session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            apihelper.session = session
+        return apihelper.session
+
+
+def shared_pool(workers=8) -> ThreadPoolExecutor:
+    """Один пул потоків відправки на процес: кілька ботів в одному процесі (host.py) ділять його."""
+    global _shared_pool
+    with _session_lock:
+        if _shared_pool is None:
+            _shared_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tg-out")
+        return _shared_pool
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.stamp = time.monotonic()
+        self.paused_until = 0.0
+
+    def delay(self, now) -> float:
+        """Через скільки секунд буде доступний 1 токен (0 — вже є)."""
+        if now < self.paused_until:
+            return self.paused_until - now
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def pause(self, until):
+        self.paused_until = max(self.paused_until, until)
+
+
+def _content_hash(text, kwargs):
+    markup = kwargs.get("reply_markup")
+    if markup is not None and not isinstance(markup, str):
+        markup = markup.to_json()
+    return hash((text, kwargs.get("parse_mode"), markup))
+
+
+class EditCache:
+    """
+    (chat_id, message_id) -> хеш останнього показаного тексту + клавіатури, LRU.
+    Записується в момент постановки в чергу, тож повторний тап іде повз API,
+    навіть якщо попереднє редагування ще не відправлене.
+    """
+
+    def __init__(self, capacity=10000):
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def unchanged(self, key, digest) -> bool:
+        """True — у повідомленні вже цей вміст; інакше запамʼятовує digest."""
+        with self._lock:
+            if self._items.get(key) == digest:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return True
+            self.misses += 1
+            self._remember(key, digest)
+            return False
+
+    def remember(self, key, digest):
+        with self._lock:
+            self._remember(key, digest)
+
+    def _remember(self, key, digest):
+        self._items[key] = digest
+        self._items.move_to_end(key)
+        if len(self._items) > self.capacity:
+            self._items.popitem(last=False)
+
+    def forget(self, key, digest):
+        """Редагування не вдалося — вміст повідомлення невідомий (якщо його ще не перезаписали)."""
+        with self._lock:
+            if self._items.get(key) == digest:
+                del self._items[key]
+
+    def __len__(self):
+        return len(self._items)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class _Job:
+    __slots__ = ("method", "args", "kwargs", "chat_id", "priority", "seq",
+                 "future", "enqueued", "attempts")
+
+    def __init__(self, method, args, kwargs, chat_id, priority, seq):
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.chat_id = chat_id
+        self.priority = priority
+        self.seq = seq
+        self.future = Future()
+        self.enqueued = time.monotonic()
+        self.attempts = 0
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class _ClientMethods:
+    """
+    Публічні методи поверх call(): спільні для OutboundClient і async-клієнта
+    (async_engine.py). call() повертає обʼєкт з add_done_callback/exception/result —
+    concurrent.futures.Future або asyncio.Task.
+    """
+
+    edits = None
+
+    # ---- публічні методи (ті самі імена, що й у TeleBot) ----
+    def send_message(self, chat_id, text, priority=PRIORITY_USER, **kwargs) -> Future:
+        future = self.call("send_message", (chat_id, text), kwargs, chat_id=chat_id, priority=priority)
+        if self.edits is not None and kwargs.get("reply_markup") is not None:
+            # екран з кнопками потім редагуватимуть — запамʼятовуємо, що в ньому показано
+            digest = _content_hash(text, kwargs)
+            future.add_done_callback(lambda f: self._remember_sent(chat_id, digest, f))
+        return future
+
+    def reply_to(self, message, text, priority=PRIORITY_USER, **kwargs) -> Future:
+        kwargs.setdefault("reply_to_message_id", message.message_id)
+        return self.send_message(message.chat.id, text, priority=priority, **kwargs)
+
+    def edit_message_text(self, text, chat_id=None, message_id=None, priority=PRIORITY_USER, **kwargs) -> Future:
+        """Якщо вміст не змінився — нічого не відправляє, Future одразу готовий з None."""
+        key = digest = None
+        if self.edits is not None and chat_id is not None and message_id is not None:
+            key, digest = (chat_id, message_id), _content_hash(text, kwargs)
+            if self.edits.unchanged(key, digest):
+                return self._done(None)
+        kwargs.update(text=text, chat_id=chat_id, message_id=message_id)
+        future = self.call("edit_message_text", (), kwargs, chat_id=chat_id, priority=priority)
+        if key is not None:
+            future.add_done_callback(lambda f: self._edit_done(key, digest, f))
+        return future
+
+    def answer_callback_query(self, callback_query_id, text=None, **kwargs) -> Future:
+        return self.call("answer_callback_query", (callback_query_id, text), kwargs,
+                         priority=PRIORITY_CALLBACK)
+
+    def _remember_sent(self, chat_id, digest, future):
+        message = None if future.exception() else future.result()
+        message_id = getattr(message, "message_id", None)
+        if message_id is not None:
+            self.edits.remember((chat_id, message_id), digest)
+
+    def _edit_done(self, key, digest, future):
+        error = future.exception()
+        if error is not None and "message is not modified" not in str(error):
+            self.edits.forget(key, digest)
+
+    def _done(self, result):
+        future = Future()
+        future.set_result(result)
+        return future
+
+
+class OutboundClient(_ClientMethods):
+    def __init__(self, bot, global_rate=30.0, chat_rate=1.0, chat_burst=3,
+                 workers=8, max_retries=3, chat_buckets=10000, edit_cache=10000, metrics=None, pool=None):
+        self.bot = bot
+        self.metrics = metrics    # metrics.BotMetrics або None
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.chat_buckets = chat_buckets
+        self.edits = EditCache(edit_cache) if edit_cache else None
+
+        install_session(pool_size=max(workers, 8))
+
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._heap = []           # готові до відправки (priority, seq)
+        self._timers = []         # (коли, seq, chat_id | _Job) — відкладені чати/повтори
+        self._parked = {}         # chat_id -> [_Job], чекають bucket або попередній запит
+        self._timed = set()       # чати, для яких уже стоїть таймер
+        self._inflight = set()    # чати, для яких запит зараз у польоті
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats = {}          # chat_id -> TokenBucket (найстаріші викидаються)
+        self._pending = 0
+        self._running = 0         # зайняті потоки пулу
+        self._workers = workers
+        self._closed = False
+
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.throttled = 0        # скільки разів Telegram відповів 429
+        self.wait_total = 0.0     # сумарний час у черзі, с
+        self.wait_max = 0.0
+
+        # pool=None -> власний пул; інакше спільний (shared_pool), його не закриваємо
+        self._own_pool = pool is None
+        self._pool = pool or ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tg-out")
+        self._thread = threading.Thread(target=self._loop, name="tg-scheduler", daemon=True)
+        self._thread.start()
+
+    def call(self, method, args=(), kwargs=None, chat_id=None, priority=PRIORITY_USER) -> Future:
+        """
+        Будь-який метод TeleBot через чергу: call("send_photo", (chat_id, photo), chat_id=chat_id).
+        chat_id=None -> без лімітів на чат і глобального bucket (напр. answer_callback_query).
+        """
+        job = _Job(method, args, kwargs or {}, chat_id, priority, next(self._seq))
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("OutboundClient is closed")
+            self._pending += 1
+            heapq.heappush(self._heap, job)
+            self._cond.notify()
+        return job.future
+
+    def __len__(self):
+        return self._pending
+
+    def stats(self) -> dict:
+        done = self.sent + self.failed
+        return {
+            "pending": self._pending,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "queue_wait_avg": self.wait_total / done if done else 0.0,
+            "queue_wait_max": self.wait_max,
+            "edits_skipped": self.edits.hits if self.edits is not None else 0,
+            "edit_cache_hit_rate": self.edits.hit_rate if self.edits is not None else 0.0,
+        }
+
+    # ---- планувальник ----
+    def _chat_bucket(self, chat_id):
+        bucket = self._chats.pop(chat_id, None)
+        if bucket is None:
+            bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            if len(self._chats) >= self.chat_buckets:
+                # dict зберігає порядок вставки -> перший = найдавніше активний
+                del self._chats[next(iter(self._chats))]
+        self._chats[chat_id] = bucket
+        return bucket
+
+    def _park(self, job, until=None):
+        self._parked.setdefault(job.chat_id, []).append(job)
+        if until is not None and job.chat_id not in self._timed:
+            self._timed.add(job.chat_id)
+            heapq.heappush(self._timers, (until, next(self._seq), job.chat_id))
+
+    def _unpark(self, chat_id):
+        if chat_id in self._inflight or chat_id in self._timed:
+            return
+        for job in self._parked.pop(chat_id, ()):
+            heapq.heappush(self._heap, job)
+
+    def _loop(self):
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                while self._timers and self._timers[0][0] <= now:
+                    _, _, item = heapq.heappop(self._timers)
+                    if isinstance(item, _Job):
+                        heapq.heappush(self._heap, item)
+                    else:
+                        self._timed.discard(item)
+                        self._unpark(item)
+
+                if not self._heap or self._running >= self._workers:
+                    if self._closed and self._pending == 0:
+                        return
+                    # пул не переповнюємо: інакше пріоритет губиться в черзі executor
+                    timeout = self._timers[0][0] - now if self._timers else None
+                    self._cond.wait(timeout)
+                    continue
+
+                job = heapq.heappop(self._heap)
+                chat_id = job.chat_id
+                if chat_id is not None:
+                    if chat_id in self._inflight or chat_id in self._parked:
+                        # у чаті вже є попередній запит — зберігаємо порядок
+                        self._park(job)
+                        continue
+                    chat_wait = self._chat_bucket(chat_id).delay(now)
+                    if chat_wait > 0:
+                        self._park(job, now + chat_wait)
+                        continue
+                    global_wait = self._global.delay(now)
+                    if global_wait > 0:
+                        heapq.heappush(self._heap, job)
+                        self._cond.wait(global_wait)
+                        continue
+                    self._chats[chat_id].take()
+                    self._global.take()
+                    self._inflight.add(chat_id)
+
+                wait = now - job.enqueued
+                self.wait_total += wait
+                self.wait_max = max(self.wait_max, wait)
+                self._running += 1
+                try:
+                    self._pool.submit(self._run, job)
+                except RuntimeError:
+                    # інтерпретатор завершується і пул уже зупинено (atexit) — досилаємо в цьому потоці
+                    self._run(job)
+
+    def _run(self, job):
+        job.attempts += 1
+        started = time.perf_counter()
+        try:
+            result = getattr(self.bot, job.method)(*job.args, **job.kwargs)
+        except Exception as e:
+            if self.metrics is not None:
+                self.metrics.api_call(job.method, time.perf_counter() - started, e)
+            retry_in = self._retry_delay(job, e)
+            if retry_in is None:
+                self._finish(job, error=e)
+            else:
+                self._retry(job, retry_in)
+            return
+        if self.metrics is not None:
+            self.metrics.api_call(job.method, time.perf_counter() - started)
+        self._finish(job, result=result)
+
+    def _retry_delay(self, job, error):
+        """Через скільки секунд повторити запит, або None — не повторювати."""
+        if isinstance(error, ApiTelegramException):
+            if error.error_code != 429:
+                return None
+            self.throttled += 1
+            if job.attempts > self.max_retries:
+                return None
+            return float((error.result_json or {}).get("parameters", {}).get("retry_after", 1))
+        if isinstance(error, (requests.ConnectionError, requests.Timeout)) and job.attempts <= self.max_retries:
+            return 0.5 * 2 ** (job.attempts - 1)
+        return None
+
+    def _retry(self, job, retry_in):
+        # повтор: чат (або весь бот для запитів без чату) чекає retry_after
+        self.retries += 1
+        with self._cond:
+            self._running -= 1
+            until = time.monotonic() + retry_in
+            if job.chat_id is None:
+                heapq.heappush(self._timers, (until, next(self._seq), job))
+            else:
+                # повтор стає першим у черзі свого чату
+                self._inflight.discard(job.chat_id)
+                self._chat_bucket(job.chat_id).pause(until)
+                self._parked.setdefault(job.chat_id, []).insert(0, job)
+                if job.chat_id not in self._timed:
+                    self._timed.add(job.chat_id)
+                    heapq.heappush(self._timers, (until, next(self._seq), job.chat_id))
+            self._cond.notify()
+
+    def _finish(self, job, result=None, error=None):
+        if error is None:
+            self.sent += 1
+            job.future.set_result(result)
+        else:
+            self.failed += 1
+            logger.warning("telegram %s failed: %s", job.method, error)
+            job.future.set_exception(error)
+        with self._cond:
+            self._pending -= 1
+            self._running -= 1
+            if job.chat_id is not None:
+                self._inflight.discard(job.chat_id)
+                self._unpark(job.chat_id)
+            self._cond.notify()
+
+    def close(self, timeout=10.0):
+        """Дочікується відправки всього, що вже в черзі."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        if self._own_pool:
+            self._pool.shutdown(wait=True)
+
+
+def client_from_env(bot, metrics=None) -> OutboundClient:
+    """
+    TG_GLOBAL_RATE, TG_CHAT_RATE, TG_CHAT_BURST, TG_SEND_WORKERS, TG_EDIT_CACHE (0 -> вимкнено);
+    TG_API_URL — інший сервер Bot API (локальний telegram-bot-api або фейковий у бенчмарках),
+    у форматі apihelper.API_URL: http://host:port/bot{0}/{1}
+    """
+    api_url = os.getenv("TG_API_URL", "").strip()
+    if api_url:
+        apihelper.API_URL = api_url
+    workers = int(os.getenv("TG_SEND_WORKERS", "8"))
+    client = OutboundClient(
+        bot,
+        metrics=metrics,
+        global_rate=float(os.getenv("TG_GLOBAL_RATE", "30")),
+        chat_rate=float(os.getenv("TG_CHAT_RATE", "1")),
+        chat_burst=int(os.getenv("TG_CHAT_BURST", "3")),
+        workers=workers,
+        edit_cache=int(os.getenv("TG_EDIT_CACHE", "10000")),
+        pool=shared_pool(workers),
+    )
+    atexit.register(client.close)
+    return client
+
+
+# ---- вебхук на старті ----
+def webhook_conflict(error) -> bool:
+    """getUpdates -> 409 Conflict: у бота ще стоїть вебхук (перехід webhook -> polling)."""
+    return isinstance(error, ApiTelegramException) and error.error_code == 409
+
+
+def _webhook_matches(info, url, max_connections, allowed_updates) -> bool:
+    if info.url != url:
+        return False
+    if max_connections is not None and (info.max_connections or 40) != max_connections:
+        return False
+    if allowed_updates is not None and sorted(info.allowed_updates or []) != sorted(allowed_updates):
+        return False
+    return True
+
+
+def ensure_webhook(bot, url, max_connections=None, allowed_updates=None) -> bool:
+    """
+    setWebhook лише якщо в Telegram стоїть інший вебхук: рестарт з тими самими URL і
+    налаштуваннями коштує один getWebhookInfo і не знімає вебхук ні на мить.
+    setWebhook сам замінює попередній, тому remove_webhook перед ним не потрібен.
+    -> True, якщо вебхук (пере)встановлено.
+    """
+    try:
+        info = bot.get_webhook_info()
+    except Exception:
+        logger.warning("getWebhookInfo failed, setting the webhook anyway", exc_info=True)
+        info = None
+    if info is not None and _webhook_matches(info, url, max_connections, allowed_updates):
+        logger.info("webhook already set to %s", url)
+        return False
+    bot.set_webhook(url=url, max_connections=max_connections, allowed_updates=allowed_updates)
+    return True
+
+
+def webhook_settings_from_env() -> dict:
+    """WEBHOOK_MAX_CONNECTIONS, WEBHOOK_ALLOWED_UPDATES (через кому); пусто -> за замовчуванням Telegram"""
+    max_connections = os.getenv("WEBHOOK_MAX_CONNECTIONS", "").strip()
+    allowed_updates = os.getenv("WEBHOOK_ALLOWED_UPDATES", "").strip()
+    return {
+        "max_connections": int(max_connections) if max_connections else None,
+        "allowed_updates": [u.strip() for u in allowed_updates.split(",") if u.strip()] if allowed_updates else None,
+    }
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Черга вхідних апдейтів + пул воркерів.
+
+- webhook лише кладе апдейт у чергу і одразу відповідає 200
+- різні чати обробляються паралельно, один чат — строго по черзі
+- черга обмежена: коли повна, put() повертає False (webhook віддає 503)
+- close() дочікується, поки воркери доопрацюють усе, що вже в черзі
+"""
+
+import logging
+import signal
+import sys
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+def update_chat_id(update):
+    """Ключ серіалізації: id чату (або користувача), якого стосується апдейт."""
+    for field in ("message", "edited_message", "channel_post", "edited_channel_post"):
+        msg = getattr(update, field, None)
+        if msg is not None:
+            return msg.chat.id
+
+    call = getattr(update, "callback_query", None)
+    if call is not None:
+        if call.message is not None:
+            return call.message.chat.id
+        return call.from_user.id
+
+    for field in ("inline_query", "chosen_inline_result", "shipping_query",
+                  "pre_checkout_query", "my_chat_member", "chat_member", "chat_join_request"):
+        obj = getattr(update, field, None)
+        if obj is not None:
+            user = getattr(obj, "from_user", None)
+            if user is not None:
+                return user.id
+            chat = getattr(obj, "chat", None)
+            if chat is not None:
+                return chat.id
+
+    return update.update_id
+
+
+class UpdateQueue:
+    """
+    Обмежена черга з «доріжками» по чатах.
+
+    Кожен чат має свою FIFO-доріжку. У `_ready` лежать ключі чатів, які
+    можна брати в роботу; поки апдейт чату обробляється, його ключа в
+    `_ready` немає — тому наступний апдейт того ж чату не стартує раніше.
+    """
+
+    def __init__(self, handler, workers=4, maxsize=1000, key=update_chat_id, name="updates"):
+        self.handler = handler
+        self.maxsize = maxsize
+        self.key = key
+        self.name = name
+
+        self._cond = threading.Condition()
+        self._lanes = {}        # key -> deque апдейтів (голова — в обробці або наступна)
+        self._ready = deque()   # ключі, готові до обробки
+        self._size = 0
+        self._closed = False
+
+        self.accepted = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+
+        self._threads = []
+        for i in range(workers):
+            t = threading.Thread(target=self._worker, name=f"{name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def __len__(self):
+        return self._size
+
+    def put(self, update) -> bool:
+        key = self.key(update)
+        with self._cond:
+            if self._closed or self._size >= self.maxsize:
+                self.rejected += 1
+                return False
+            lane = self._lanes.get(key)
+            if lane is None:
+                self._lanes[key] = deque((update,))
+                self._ready.append(key)
+                self._cond.notify()
+            else:
+                lane.append(update)
+            self._size += 1
+            self.accepted += 1
+        return True
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._ready and not self._closed:
+                    self._cond.wait()
+                if not self._ready:
+                    return
+                key = self._ready.popleft()
+                update = self._lanes[key][0]
+
+            try:
+                self.handler(update)
+            except Exception:
+                self.failed += 1
+                logger.exception("update %s failed", getattr(update, "update_id", "?"))
+
+            with self._cond:
+                lane = self._lanes[key]
+                lane.popleft()
+                if lane:
+                    self._ready.append(key)
+                    self._cond.notify()
+                else:
+                    del self._lanes[key]
+                self._size -= 1
+                self.processed += 1
+                if self._size == 0:
+                    self._cond.notify_all()
+
+    def join(self, timeout=None) -> bool:
+        """Чекає, поки черга спорожніє. True — якщо встигли."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._size == 0, timeout)
+
+    def close(self, timeout=None) -> bool:
+        """Перестає приймати нові апдейти і доопрацьовує ті, що вже в черзі."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        drained = self.join(timeout)
+        if drained:
+            for t in self._threads:
+                t.join(timeout)
+        else:
+            logger.warning("%s: shutdown with %d updates left in queue", self.name, self._size)
+        return drained
+
+
+def run_handlers_inline(bot):
+    """Хендлери TeleBot виконуються в потоці, що викликав process_new_updates (воркері черги)."""
+    if bot.threaded:
+        bot.threaded = False
+        # без join: воркери telebot прокидаються раз на 0.5 с і виходять самі (daemon),
+        # а worker_pool.close() тримав би старт бота ці пів секунди
+        for worker in bot.worker_pool.workers:
+            worker.stop()
+
+
+def drain_on_signal(queue: UpdateQueue, timeout=25.0):
+    """SIGTERM/SIGINT -> дочекатися черги і вийти (Render дає ~30с на зупинку)."""
+    def _stop(signum, frame):
+        logger.info("%s: signal %s, draining %d updates...", queue.name, signum, len(queue))
+        queue.close(timeout)
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)